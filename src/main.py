@@ -31,7 +31,7 @@ def create_app():
 
     # Import models to ensure they are registered
     from src.models.user import User
-    from src.models.kommo_account import KommoAccount, PipelineMapping, StageMapping, CustomFieldMapping, SyncLog
+    from src.models.kommo_account import KommoAccount, PipelineMapping, StageMapping, CustomFieldMapping, SyncLog, MasterConfigSnapshot, AppliedConfigState, SyncJob, SyncStatusEntry, SyncCheckpoint, AccountPacingState
 
     # Habilitar CORS para todas as rotas
     CORS(app)
@@ -51,14 +51,11 @@ def create_app():
     with app.app_context():
         db.create_all()
         
-        # Inicializar status global da sincronização
-        from src.routes.sync import update_global_status
-        update_global_status(
-            status='idle',
-            progress=0,
-            operation='Sistema inicializado',
-            is_running=False
-        )
+        # Status e jobs de sincronização ficam no banco (compartilhados entre os workers);
+        # os que estavam rodando em um processo que parou não vão terminar
+        from src.routes.sync import sync_jobs, sync_status
+        sync_jobs.recover_interrupted()
+        sync_status.recover_interrupted()
 
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
@@ -114,3 +114,104 @@ class SyncLog(db.Model):
     def __repr__(self):
         return f'<SyncLog group:{self.sync_group_id} {self.sync_type} - {self.status}>'
 
+
+class MasterConfigSnapshot(db.Model):
+    """Snapshot comprimido da configuração extraída de uma conta mestre"""
+    __tablename__ = 'master_config_snapshots'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    master_account_id = db.Column(db.Integer, db.ForeignKey('kommo_accounts.id'), nullable=False, index=True)
+    config_data = db.Column(db.LargeBinary, nullable=False)  # JSON comprimido com zlib
+    config_hash = db.Column(db.String(64), nullable=False)  # sha256 da configuração completa
+    section_hashes = db.Column(db.Text, nullable=False)  # JSON {seção: sha256}
+    probe_hash = db.Column(db.String(64))  # sha256 da lista de pipelines (sonda barata)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # Relacionamento
+    master_account = db.relationship('KommoAccount', backref='config_snapshots')
+    
+    def __repr__(self):
+        return f'<MasterConfigSnapshot master:{self.master_account_id} {self.config_hash[:8]}>'
+
+class AppliedConfigState(db.Model):
+    """Última configuração da master aplicada com sucesso em uma conta escrava (base da sincronização incremental)"""
+    __tablename__ = 'applied_config_states'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sync_group_id = db.Column(db.Integer, db.ForeignKey('sync_groups.id'), nullable=True)
+    slave_account_id = db.Column(db.Integer, db.ForeignKey('kommo_accounts.id'), nullable=False)
+    config_data = db.Column(db.LargeBinary, nullable=False)  # JSON comprimido com zlib
+    config_hash = db.Column(db.String(64), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('sync_group_id', 'slave_account_id'),)
+    
+    def __repr__(self):
+        return f'<AppliedConfigState group:{self.sync_group_id} slave:{self.slave_account_id}>'
+
+class SyncJob(db.Model):
+    """Sincronização executada em segundo plano pelo SyncJobEngine"""
+    __tablename__ = 'sync_jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    job_type = db.Column(db.String(50), nullable=False)  # 'sync', 'group_sync', 'groups_sync', 'roles', 'account_sync'
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # 'queued', 'running', 'completed', 'failed', 'cancelled'
+    params = db.Column(db.Text)  # JSON com os parâmetros do disparo
+    progress = db.Column(db.Float, default=0)
+    current_operation = db.Column(db.Text)
+    result = db.Column(db.Text)  # JSON da resposta da sincronização
+    error = db.Column(db.Text)
+    cancel_requested = db.Column(db.Boolean, default=False)
+    worker = db.Column(db.String(100))  # host:pid do processo que executa o job
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<SyncJob {self.id} {self.job_type} - {self.status}>'
+
+class SyncStatusEntry(db.Model):
+    """Status de uma sincronização (um por job), compartilhado entre os workers do servidor"""
+    __tablename__ = 'sync_status_entries'
+    
+    key = db.Column(db.String(64), primary_key=True)  # id do job ou 'inline' para sincronizações fora de jobs
+    job_id = db.Column(db.String(32))
+    is_running = db.Column(db.Boolean, default=False, index=True)
+    data = db.Column(db.Text, nullable=False)  # JSON com o status (progresso, operação, resultados...)
+    worker = db.Column(db.String(100))  # host:pid do processo que atualizou por último
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    def __repr__(self):
+        return f'<SyncStatusEntry {self.key} running:{self.is_running}>'
+
+class SyncCheckpoint(db.Model):
+    """Progresso de uma sincronização completa em uma escrava (fases e lotes concluídos), para retomar após falhas"""
+    __tablename__ = 'sync_checkpoints'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sync_group_id = db.Column(db.Integer, db.ForeignKey('sync_groups.id'), nullable=True)
+    slave_account_id = db.Column(db.Integer, db.ForeignKey('kommo_accounts.id'), nullable=False)
+    config_hash = db.Column(db.String(64), nullable=False)  # configuração da master que estava sendo aplicada
+    completed_phases = db.Column(db.Text, nullable=False, default='[]')  # JSON ['pipelines', 'custom_field_groups', ...]
+    completed_items = db.Column(db.Text, nullable=False, default='{}')  # JSON {operação: [ids concluídos]}
+    mappings = db.Column(db.Text, nullable=False, default='{}')  # JSON dos mapeamentos master -> escrava produzidos
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('sync_group_id', 'slave_account_id'),)
+    
+    def __repr__(self):
+        return f'<SyncCheckpoint group:{self.sync_group_id} slave:{self.slave_account_id}>'
+
+class AccountPacingState(db.Model):
+    """Ritmo (tamanho de lote e delay) ajustado automaticamente para uma conta Kommo"""
+    __tablename__ = 'account_pacing_states'
+    
+    subdomain = db.Column(db.String(100), primary_key=True)
+    batch_size = db.Column(db.Integer, nullable=False)
+    delay = db.Column(db.Float, nullable=False, default=0.0)  # segundos entre lotes
+    latency_baseline = db.Column(db.Float)  # latência de referência (s) das respostas em lotes saudáveis
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<AccountPacingState {self.subdomain} lote:{self.batch_size} delay:{self.delay}>'
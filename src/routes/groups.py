@@ -333,11 +333,10 @@ def sync_group(group_id):
         # Verificar se o grupo existe
         group = SyncGroup.query.get_or_404(group_id)
         
-        # Importar função de sincronização (vamos atualizar esta parte)
-        from src.routes.sync import trigger_group_sync
+        # Importar função de sincronização (executada em segundo plano pelo motor de jobs)
+        from src.routes.sync import submit_sync_job, trigger_group_sync
         
-        result = trigger_group_sync(group_id, sync_type, data.get('batch_config', {}))
-        return result
+        return submit_sync_job('group_sync', trigger_group_sync, group_id, sync_type, data.get('batch_config', {}))
         
     except Exception as e:
         logger.error(f"Erro ao sincronizar grupo {group_id}: {e}")
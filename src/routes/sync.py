@@ -1,45 +1,127 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context, url_for
 from datetime import datetime
 import logging
 from src.database import db
 from src.models.kommo_account import KommoAccount, SyncLog, SyncGroup
 from src.services.kommo_api import KommoAPIService, KommoSyncService
+from src.services.http_pool import close_idle_sessions
+from src.services.config_snapshots import AppliedConfigStore, MasterConfigSnapshotStore
+from src.services.sync_checkpoints import SyncCheckpointStore
+from src.services.sync_run import SyncRunCoordinator
+from src.services.slave_fanout import SlaveAccountRef, fan_out_slaves
+from src.services.job_engine import SyncJobEngine, current_cancel_event, current_job
+from src.services.sync_status import DEFAULT_STATUS, INLINE_STATUS_KEY, SyncStatusRegistry
+from src.services.job_events import format_sse, job_events, status_delta
 
 sync_bp = Blueprint('sync', __name__)
 logger = logging.getLogger(__name__)
 
-# Estado global da sincronização
-global_sync_status = {
-    'is_running': False,
-    'sync_type': None,
-    'current_status': 'idle',
-    'progress': 0,
-    'current_operation': '-',
-    'current_batch': '-',
-    'estimated_time': '-',
-    'start_time': None,
-    'total_items': 0,
-    'processed_items': 0,
-    'accounts_processed': 0,
-    'total_accounts': 0,
-    'results': {}
-}
+# Snapshots da configuração das contas mestre, compartilhados entre as rotas
+master_snapshots = MasterConfigSnapshotStore()
+# Última configuração aplicada em cada escrava (base da sincronização incremental)
+applied_configs = AppliedConfigStore()
+# Checkpoints das sincronizações completas (retomada de execuções interrompidas)
+sync_checkpoints = SyncCheckpointStore()
+# Sincronizações executadas em segundo plano (fora da thread da requisição)
+sync_jobs = SyncJobEngine()
+
+# Status das sincronizações (por job), compartilhado entre os workers pelo banco
+sync_status = SyncStatusRegistry()
+
+def record_applied_config(sync_group_id, slave_account_id, master_config, results):
+    """Guarda a configuração aplicada se a sincronização completa terminou sem erros"""
+    summary = results.get('summary', {})
+    if results.get('general_error') or summary.get('interrupted') or summary.get('total_errors', 1) > 0:
+        return
+    try:
+        applied_configs.save(sync_group_id, slave_account_id, master_config)
+    except Exception as e:
+        logger.warning(f"⚠️ Não foi possível salvar a configuração aplicada na conta {slave_account_id}: {e}")
+        db.session.rollback()
+
+def new_sync_run(batch_config):
+    """Coordenador de uma execução: a configuração de cada master é obtida uma única vez"""
+    return SyncRunCoordinator(
+        master_snapshots,
+        max_age=batch_config.get('snapshot_max_age'),
+        force_refresh=batch_config.get('refresh_master', False)
+    )
+
+def collect_slave_outcomes(sync_results, outcomes):
+    """Agrega os resultados do fan-out das escravas em sync_results (na ordem das contas)"""
+    for slave_account, account_results, error in outcomes:
+        if error is not None:
+            sync_results['accounts_failed'] += 1
+            sync_results['details'].append({'subdomain': slave_account.subdomain, 'error': str(error)})
+        elif account_results is not None:
+            sync_results['accounts_processed'] += 1
+            sync_results['details'].append(account_results)
+        else:
+            # Não executada: stop_on_error após falha em outra escrava
+            sync_results['details'].append({'subdomain': slave_account.subdomain, 'skipped': True})
+
+def submit_sync_job(job_type, target, *args):
+    """Enfileira target(*args) como job e responde 202 com o id do job
+    
+    Com "wait": true no corpo a sincronização roda na própria requisição (comportamento antigo).
+    """
+    data = request.get_json(silent=True) or {}
+    if data.get('wait', False):
+        return target(*args)
+    
+    job = sync_jobs.submit(current_app._get_current_object(), job_type, target, args,
+                           params={'args': list(args), 'request': data})
+    return jsonify({
+        'success': True,
+        'message': 'Sincronização enfileirada',
+        'job_id': job['id'],
+        'status_url': url_for('sync.get_sync_job', job_id=job['id']),
+        'job': job
+    }), 202
+
+def current_status_key():
+    """Chave do status da sincronização atual: o id do job ou INLINE_STATUS_KEY fora de um job"""
+    job = current_job()
+    return job.job_id if job is not None else INLINE_STATUS_KEY
+
+def current_sync_status():
+    """Status da sincronização atual"""
+    return sync_status.get(current_status_key()) or dict(DEFAULT_STATUS)
+
+def publish_job_progress(progress):
+    """Envia o progresso do KommoSyncService (progress_callback) para os clientes SSE do job atual"""
+    job = current_job()
+    if job is not None:
+        # Alguns pontos da sincronização enviam só uma mensagem de texto
+        payload = dict(progress) if isinstance(progress, dict) else {'operation': str(progress)}
+        job_events.publish(job.job_id, 'progress', payload)
 
 def update_global_status(status=None, progress=None, operation=None, batch=None, **kwargs):
-    """Atualiza o status global da sincronização"""
+    """Atualiza o status da sincronização atual (gravado por job e visível para todos os workers)"""
+    fields = {}
     if status is not None:
-        global_sync_status['current_status'] = status
+        fields['current_status'] = status
     if progress is not None:
-        global_sync_status['progress'] = progress
+        fields['progress'] = progress
     if operation is not None:
-        global_sync_status['current_operation'] = operation
+        fields['current_operation'] = operation
     if batch is not None:
-        global_sync_status['current_batch'] = batch
+        fields['current_batch'] = batch
     
     # Atualizar outros campos se fornecidos
     for key, value in kwargs.items():
-        if key in global_sync_status:
-            global_sync_status[key] = value
+        if key in DEFAULT_STATUS:
+            fields[key] = value
+    
+    job = current_job()
+    sync_status.update(current_status_key(), job_id=job.job_id if job is not None else None, **fields)
+    if job is not None and fields:
+        job_events.publish(job.job_id, 'status', fields)
+    
+    # Progresso do job em execução (se a sincronização roda em segundo plano)
+    if job is not None and ('progress' in fields or 'current_operation' in fields):
+        job.report_progress(fields.get('progress'), fields.get('current_operation'),
+                            force=fields.get('current_status') in ('completed', 'failed', 'error'))
 
 @sync_bp.route('/accounts', methods=['GET'])
 def get_accounts():
@@ -152,11 +234,16 @@ def add_account():
         db.session.rollback()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def trigger_group_sync(group_id, sync_type='full', batch_config=None):
-    """Função para sincronizar um grupo específico"""
+def trigger_group_sync(group_id, sync_type='full', batch_config=None, run=None):
+    """Função para sincronizar um grupo específico
+    
+    run: SyncRunCoordinator compartilhado quando vários grupos são sincronizados no mesmo disparo
+    """
     try:
         if batch_config is None:
             batch_config = {}
+        if run is None:
+            run = new_sync_run(batch_config)
         
         # Obter o grupo
         group = SyncGroup.query.get(group_id)
@@ -178,7 +265,7 @@ def trigger_group_sync(group_id, sync_type='full', batch_config=None):
         
         # Configurações de lote
         batch_size = batch_config.get('batch_size', 10)
-        batch_delay = batch_config.get('batch_delay', 2.0)
+        batch_delay = batch_config.get('batch_delay', 0.0)
         max_concurrent = batch_config.get('max_concurrent', 3)
         
         logger.info(f"🚀 Iniciando sincronização do grupo '{group.name}' - {sync_type} com lotes de {batch_size} itens")
@@ -207,7 +294,8 @@ def trigger_group_sync(group_id, sync_type='full', batch_config=None):
         try:
             # Inicializar serviço da conta mestre
             master_api = KommoAPIService(master_account.subdomain, master_account.refresh_token)
-            sync_service = KommoSyncService(master_api, batch_size=batch_size, delay_between_batches=batch_delay)
+            sync_service = KommoSyncService(master_api, batch_size=batch_size, delay_between_batches=batch_delay,
+                                            cancel_event=current_cancel_event())
             
             # Testar conexão da conta mestre
             if not master_api.test_connection():
@@ -220,12 +308,17 @@ def trigger_group_sync(group_id, sync_type='full', batch_config=None):
                 total_accounts=len(slave_accounts)
             )
             
-            # Extrair configurações da conta mestre
-            master_config = sync_service.extract_master_configuration()
+            # Extrair configurações da conta mestre (uma vez por execução, ou do snapshot recente)
+            master_config, snapshot_info = run.get_master_config(sync_service, master_account.id)
+            
+            # Valores usados nas threads das escravas (sem acessar objetos ORM da sessão desta requisição)
+            group_name = group.name
+            master_account_id = master_account.id
             
             # Callback para progresso
             def progress_callback(progress):
-                logger.info(f"📦 Progresso grupo {group.name}: {progress['operation']} - {progress['percentage']:.1f}%")
+                logger.info(f"📦 Progresso grupo {group_name}: {progress['operation']} - {progress['percentage']:.1f}%")
+                publish_job_progress(progress)
             
             # Resultados da sincronização
             sync_results = {
@@ -238,78 +331,105 @@ def trigger_group_sync(group_id, sync_type='full', batch_config=None):
                     'batch_delay': batch_delay,
                     'max_concurrent': max_concurrent
                 },
+                'master_snapshot': {key: value for key, value in snapshot_info.items() if key != 'extraction_timings'},
                 'details': []
             }
+            if 'extraction_timings' in snapshot_info:
+                # Tempo (s) de cada seção da extração da master (ausente se a configuração veio de um snapshot)
+                sync_results['extraction_timings'] = snapshot_info['extraction_timings']
             
-            # Sincronizar cada conta escrava do grupo
-            for i, slave_account in enumerate(slave_accounts):
-                try:
-                    # Atualizar progresso
-                    account_progress = ((i + 1) / len(slave_accounts)) * 100
-                    update_global_status(
-                        status='processing',
-                        progress=account_progress,
-                        operation=f'Processando conta {slave_account.subdomain}',
-                        accounts_processed=i,
-                        total_accounts=len(slave_accounts)
+            # Testar a conexão de todas as contas escravas de uma vez (event loop único)
+            connection_status = sync_service.check_slave_connections(
+                [(slave.subdomain, slave.refresh_token) for slave in slave_accounts],
+                max_concurrency=max_concurrent
+            )
+            
+            # Sincronizar as contas escravas do grupo (até max_concurrent ao mesmo tempo)
+            def sync_slave(slave_account):
+                """Sincroniza uma conta escrava - executado em uma thread do fan-out, com app context próprio"""
+                logger.info(f"📊 Processando conta {slave_account.subdomain} do grupo {group_name}")
+                
+                # Inicializar API da conta escrava
+                slave_api = KommoAPIService(slave_account.subdomain, slave_account.refresh_token)
+                
+                # Testar conexão (resultado do teste em paralelo feito antes do fan-out)
+                if not connection_status.get(slave_account.subdomain, False):
+                    raise Exception(f"Falha na conexão com a conta {slave_account.subdomain}")
+                
+                # Serviço próprio por escrava: o estado da execução não é compartilhado entre threads
+                slave_sync_service = KommoSyncService(master_api, batch_size=batch_size, delay_between_batches=batch_delay,
+                                                      cancel_event=current_cancel_event(),
+                                                      adaptive_pacing=batch_config.get('adaptive_pacing', True))
+                mappings = {'pipelines': {}, 'stages': {}, 'custom_fields': {}, 'roles': {}}
+                
+                def slave_progress(progress):
+                    progress_callback({**progress, 'subdomain': slave_account.subdomain})
+                account_results = {'subdomain': slave_account.subdomain}
+                
+                # Sincronizar baseado no tipo solicitado
+                if sync_type == 'full':
+                    previous_config = (applied_configs.load(group_id, slave_account.id)
+                                       if batch_config.get('incremental', False) else None)
+                    all_results = slave_sync_service.sync_all_to_slave(
+                        slave_api, master_config, slave_progress,
+                        group_id, slave_account.id,
+                        previous_config=previous_config,
+                        checkpoints=sync_checkpoints if batch_config.get('resume', True) else None
                     )
-                    
-                    logger.info(f"📊 Processando conta {i + 1}/{len(slave_accounts)}: {slave_account.subdomain}")
-                    
-                    # Inicializar API da conta escrava
-                    slave_api = KommoAPIService(slave_account.subdomain, slave_account.refresh_token)
-                    
-                    # Testar conexão
-                    if not slave_api.test_connection():
-                        raise Exception(f"Falha na conexão com a conta {slave_account.subdomain}")
-                    
-                    mappings = {'pipelines': {}, 'stages': {}, 'custom_fields': {}, 'roles': {}}
-                    account_results = {'subdomain': slave_account.subdomain}
-                    
-                    # Sincronizar baseado no tipo solicitado
-                    if sync_type == 'full':
-                        all_results = sync_service.sync_all_to_slave(
-                            slave_api, master_config, progress_callback,
-                            group.id, slave_account.id
+                    record_applied_config(group_id, slave_account.id, master_config, all_results)
+                    account_results.update(all_results)
+                else:
+                    # Sincronização específica
+                    if sync_type in ['pipelines']:
+                        pipeline_results = slave_sync_service.sync_pipelines_to_slave(
+                            slave_api, master_config, mappings, slave_progress, 
+                            group_id, slave_account.id
                         )
-                        account_results.update(all_results)
-                    else:
-                        # Sincronização específica
-                        if sync_type in ['pipelines']:
-                            pipeline_results = sync_service.sync_pipelines_to_slave(
-                                slave_api, master_config, mappings, progress_callback, 
-                                group.id, slave_account.id
-                            )
-                            account_results['pipelines'] = pipeline_results
-                        
-                        if sync_type in ['custom_fields', 'required_statuses', 'field_groups']:
-                            custom_fields_results = sync_service.sync_custom_fields_to_slave(
-                                slave_api, master_config, mappings, progress_callback,
-                                group.id, slave_account.id
-                            )
-                            account_results['custom_fields'] = custom_fields_results
-                        
-                        if sync_type in ['roles']:
-                            # Usar a nova função que carrega mapeamentos automaticamente
-                            roles_results = sync_service.sync_roles_to_slave_new(
-                                master_account_id=master_account.id,
-                                slave_account_id=slave_account.id,
-                                sync_group_id=group.id,
-                                progress_callback=progress_callback
-                            )
-                            account_results['roles'] = roles_results
+                        account_results['pipelines'] = pipeline_results
                     
-                    sync_results['accounts_processed'] += 1
-                    sync_results['details'].append(account_results)
+                    if sync_type in ['custom_fields', 'required_statuses', 'field_groups']:
+                        custom_fields_results = slave_sync_service.sync_custom_fields_to_slave(
+                            slave_api, master_config, mappings, slave_progress,
+                            group_id, slave_account.id
+                        )
+                        account_results['custom_fields'] = custom_fields_results
                     
-                except Exception as e:
-                    error_msg = f"Erro ao sincronizar conta {slave_account.subdomain}: {e}"
-                    logger.error(error_msg)
-                    sync_results['accounts_failed'] += 1
-                    sync_results['details'].append({
-                        'subdomain': slave_account.subdomain,
-                        'error': str(e)
-                    })
+                    if sync_type in ['roles']:
+                        # Usar a nova função que carrega mapeamentos automaticamente
+                        roles_results = slave_sync_service.sync_roles_to_slave_new(
+                            master_account_id=master_account_id,
+                            slave_account_id=slave_account.id,
+                            sync_group_id=group_id,
+                            progress_callback=slave_progress
+                        )
+                        account_results['roles'] = roles_results
+                
+                # Retries de erros transitórios na conta escrava
+                account_results['api_retries'] = slave_api.retry_stats.as_dict()
+                return account_results
+            
+            def slave_done(done, total):
+                update_global_status(
+                    status='processing',
+                    progress=(done / total) * 100,
+                    operation=f'{done}/{total} contas do grupo {group_name} processadas',
+                    accounts_processed=done,
+                    total_accounts=total
+                )
+            
+            # Job cancelado: nenhuma escrava nova é iniciada
+            cancel_event = current_cancel_event()
+            stop_requested = cancel_event.is_set if cancel_event is not None else None
+            
+            outcomes = fan_out_slaves(
+                current_app._get_current_object(),
+                [SlaveAccountRef.from_model(slave) for slave in slave_accounts],
+                sync_slave, max_concurrent, on_complete=slave_done,
+                should_stop=stop_requested
+            )
+            collect_slave_outcomes(sync_results, outcomes)
+            
+            sync_results['master_api_retries'] = master_api.retry_stats.as_dict()
             
             # Atualizar log de sincronização
             sync_log.status = 'completed'
@@ -320,6 +440,9 @@ def trigger_group_sync(group_id, sync_type='full', batch_config=None):
             
             db.session.commit()
             
+            # Liberar conexões HTTP ociosas de contas que não foram usadas recentemente
+            close_idle_sessions()
+            
             # Atualizar status global - conclusão
             update_global_status(
                 status='completed',
@@ -372,23 +495,70 @@ def trigger_group_sync_endpoint(group_id):
         sync_type = data.get('sync_type', 'full')
         batch_config = data.get('batch_config', {})
         
-        return trigger_group_sync(group_id, sync_type, batch_config)
+        return submit_sync_job('group_sync', trigger_group_sync, group_id, sync_type, batch_config)
         
     except Exception as e:
         logger.error(f"Erro no endpoint de sincronização do grupo {group_id}: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@sync_bp.route('/groups/trigger', methods=['POST'])
+def trigger_groups_sync_endpoint():
+    """Sincroniza vários grupos no mesmo disparo - cada conta mestre é extraída uma única vez"""
+    try:
+        data = request.get_json() or {}
+        sync_type = data.get('sync_type', 'full')
+        batch_config = data.get('batch_config', {})
+        group_ids = data.get('group_ids') or [group.id for group in SyncGroup.query.filter_by(is_active=True).all()]
+        if not group_ids:
+            return jsonify({'success': False, 'error': 'Nenhum grupo para sincronizar'}), 400
+        
+        return submit_sync_job('groups_sync', run_groups_sync, group_ids, sync_type, batch_config)
+        
+    except Exception as e:
+        logger.error(f"Erro na sincronização de grupos: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+def run_groups_sync(group_ids, sync_type='full', batch_config=None):
+    """Sincroniza os grupos em sequência, compartilhando a extração de cada conta mestre"""
+    if batch_config is None:
+        batch_config = {}
+    run = new_sync_run(batch_config)
+    logger.info(f"🚀 [{run.run_id}] Sincronizando {len(group_ids)} grupos - {sync_type}")
+    
+    cancel_event = current_cancel_event()
+    groups_results = []
+    for group_id in group_ids:
+        if cancel_event is not None and cancel_event.is_set():
+            groups_results.append({'group_id': group_id, 'success': False, 'error': 'Cancelado'})
+            continue
+        response = trigger_group_sync(group_id, sync_type, batch_config, run=run)
+        response, status_code = response if isinstance(response, tuple) else (response, response.status_code)
+        groups_results.append({'group_id': group_id, 'status_code': status_code, **(response.get_json() or {})})
+    
+    return jsonify({
+        'success': all(result.get('success') for result in groups_results),
+        'run': run.stats(),
+        'groups': groups_results
+    })
+
 @sync_bp.route('/trigger', methods=['POST'])
 def trigger_sync():
     """Aciona a sincronização manual das configurações - COM SUPORTE A LOTES"""
+    data = request.get_json() or {}
+    sync_type = data.get('sync_type', 'full')  # 'pipelines', 'custom_fields', 'required_statuses', 'roles', 'full'
+    return submit_sync_job('sync', run_sync, sync_type, data.get('batch_config', {}))
+
+def run_sync(sync_type='full', batch_config=None, stop_on_error=False):
+    """Sincroniza a conta mestre com todas as escravas (até max_concurrent escravas ao mesmo tempo)
+    
+    stop_on_error: não inicia novas escravas depois da primeira falha
+    """
     try:
-        data = request.get_json() or {}
-        sync_type = data.get('sync_type', 'full')  # 'pipelines', 'custom_fields', 'required_statuses', 'roles', 'full'
-        
         # Configurações de lote (com valores padrão)
-        batch_config = data.get('batch_config', {})
+        if batch_config is None:
+            batch_config = {}
         batch_size = batch_config.get('batch_size', 10)
-        batch_delay = batch_config.get('batch_delay', 2.0)
+        batch_delay = batch_config.get('batch_delay', 0.0)
         max_concurrent = batch_config.get('max_concurrent', 3)
         
         logger.info(f"🚀 Iniciando sincronização {sync_type} com lotes de {batch_size} itens, {batch_delay}s de delay")
@@ -430,14 +600,15 @@ def trigger_sync():
         try:
             # Inicializar serviço da conta mestre com configurações de lote
             master_api = KommoAPIService(master_account.subdomain, master_account.refresh_token)
-            sync_service = KommoSyncService(master_api, batch_size=batch_size, delay_between_batches=batch_delay)
+            sync_service = KommoSyncService(master_api, batch_size=batch_size, delay_between_batches=batch_delay,
+                                            cancel_event=current_cancel_event())
             
             # Testar conexão da conta mestre
             if not master_api.test_connection():
                 return jsonify({'success': False, 'error': 'Falha na conexão com a conta mestre'}), 400
             
-            # Extrair configurações da conta mestre
-            master_config = sync_service.extract_master_configuration()
+            # Extrair configurações da conta mestre (uma vez por execução, ou do snapshot recente)
+            master_config, snapshot_info = new_sync_run(batch_config).get_master_config(sync_service, master_account.id)
             
             # Callback para monitorar progresso
             progress_data = {'current_account': 0, 'total_accounts': len(slave_accounts)}
@@ -445,6 +616,7 @@ def trigger_sync():
             def progress_callback(progress):
                 logger.info(f"📦 Progresso: {progress['operation']} - {progress['percentage']:.1f}% "
                            f"(lote {progress.get('current_batch', '?')}/{progress.get('total_batches', '?')})")
+                publish_job_progress(progress)
             
             # Atualizar status global para preparação
             update_global_status(
@@ -462,81 +634,109 @@ def trigger_sync():
                     'batch_delay': batch_delay,
                     'max_concurrent': max_concurrent
                 },
+                'master_snapshot': {key: value for key, value in snapshot_info.items() if key != 'extraction_timings'},
                 'details': []
             }
+            if 'extraction_timings' in snapshot_info:
+                # Tempo (s) de cada seção da extração da master (ausente se a configuração veio de um snapshot)
+                sync_results['extraction_timings'] = snapshot_info['extraction_timings']
             
-            # Sincronizar cada conta escrava
-            for slave_account in slave_accounts:
-                try:
-                    # Atualizar progresso da conta atual
-                    progress_data['current_account'] += 1
-                    logger.info(f"📊 Processando conta {progress_data['current_account']}/{progress_data['total_accounts']}: {slave_account.subdomain}")
-                    
-                    # Atualizar status global - processando conta
-                    account_progress = (progress_data['current_account'] / progress_data['total_accounts']) * 100
-                    update_global_status(
-                        status='processing',
-                        progress=account_progress,
-                        operation=f'Processando conta {slave_account.subdomain}',
-                        accounts_processed=progress_data['current_account'] - 1,
-                        total_accounts=progress_data['total_accounts']
+            # Testar a conexão de todas as contas escravas de uma vez (event loop único)
+            connection_status = sync_service.check_slave_connections(
+                [(slave.subdomain, slave.refresh_token) for slave in slave_accounts],
+                max_concurrency=max_concurrent
+            )
+            
+            master_account_id = master_account.id
+            
+            # Sincronizar as contas escravas (até max_concurrent ao mesmo tempo)
+            def sync_slave(slave_account):
+                """Sincroniza uma conta escrava - executado em uma thread do fan-out, com app context próprio"""
+                logger.info(f"📊 Processando conta {slave_account.subdomain}")
+                
+                # Inicializar API da conta escrava
+                slave_api = KommoAPIService(slave_account.subdomain, slave_account.refresh_token)
+                
+                # Testar conexão (resultado do teste em paralelo feito antes do fan-out)
+                if not connection_status.get(slave_account.subdomain, False):
+                    raise Exception(f"Falha na conexão com a conta {slave_account.subdomain}")
+                
+                # Serviço próprio por escrava: o estado da execução não é compartilhado entre threads
+                slave_sync_service = KommoSyncService(master_api, batch_size=batch_size, delay_between_batches=batch_delay,
+                                                      cancel_event=current_cancel_event(),
+                                                      adaptive_pacing=batch_config.get('adaptive_pacing', True))
+                mappings = {'pipelines': {}, 'stages': {}, 'custom_fields': {}, 'roles': {}}
+                
+                def slave_progress(progress):
+                    progress_callback({**progress, 'subdomain': slave_account.subdomain})
+                account_results = {'subdomain': slave_account.subdomain}
+                
+                # Sincronizar baseado no tipo solicitado
+                if sync_type == 'full':
+                    # Sincronização completa usando o método otimizado
+                    previous_config = (applied_configs.load(slave_account.sync_group_id, slave_account.id)
+                                       if batch_config.get('incremental', False) else None)
+                    all_results = slave_sync_service.sync_all_to_slave(
+                        slave_api, master_config, slave_progress,
+                        slave_account.sync_group_id, slave_account.id,
+                        previous_config=previous_config,
+                        checkpoints=sync_checkpoints if batch_config.get('resume', True) else None
                     )
+                    record_applied_config(slave_account.sync_group_id, slave_account.id, master_config, all_results)
+                    account_results.update(all_results)
+                else:
+                    # Sincronização específica
+                    if sync_type in ['pipelines']:
+                        pipeline_results = slave_sync_service.sync_pipelines_to_slave(slave_api, master_config, mappings, slave_progress)
+                        account_results['pipelines'] = pipeline_results
                     
-                    # Inicializar API da conta escrava
-                    slave_api = KommoAPIService(slave_account.subdomain, slave_account.refresh_token)
-                    
-                    # Testar conexão
-                    if not slave_api.test_connection():
-                        raise Exception(f"Falha na conexão com a conta {slave_account.subdomain}")
-                    
-                    mappings = {'pipelines': {}, 'stages': {}, 'custom_fields': {}, 'roles': {}}
-                    account_results = {'subdomain': slave_account.subdomain}
-                    
-                    # Sincronizar baseado no tipo solicitado
-                    if sync_type == 'full':
-                        # Sincronização completa usando o método otimizado
-                        all_results = sync_service.sync_all_to_slave(
-                            slave_api, master_config, progress_callback,
-                            account.id, slave_account.id  # Assumindo que account é o grupo aqui
+                    if sync_type in ['custom_fields', 'required_statuses', 'field_groups']:
+                        custom_fields_results = slave_sync_service.sync_custom_fields_to_slave(
+                            slave_api, master_config, mappings, slave_progress,
+                            slave_account.sync_group_id, slave_account.id
                         )
-                        account_results.update(all_results)
-                    else:
-                        # Sincronização específica
-                        if sync_type in ['pipelines']:
-                            pipeline_results = sync_service.sync_pipelines_to_slave(slave_api, master_config, mappings, progress_callback)
-                            account_results['pipelines'] = pipeline_results
-                        
-                        if sync_type in ['custom_fields', 'required_statuses', 'field_groups']:
-                            custom_fields_results = sync_service.sync_custom_fields_to_slave(
-                                slave_api, master_config, mappings, progress_callback,
-                                account.id, slave_account.id  # Assumindo que account é o grupo aqui
-                            )
-                            account_results['custom_fields'] = custom_fields_results
-                        
-                        if sync_type in ['roles']:
-                            # Usar a nova função que carrega mapeamentos automaticamente
-                            roles_results = sync_service.sync_roles_to_slave_new(
-                                master_account_id=master_account.id,
-                                slave_account_id=slave_account.id,
-                                sync_group_id=slave_account.sync_group_id or 1,  # Usar o grupo da conta slave
-                                progress_callback=progress_callback
-                            )
-                            account_results['roles'] = roles_results
+                        account_results['custom_fields'] = custom_fields_results
                     
-                    # Note: required_statuses é sincronizado junto com custom_fields
-                    # pois eles fazem parte da configuração dos campos personalizados
-                    
-                    sync_results['accounts_processed'] += 1
-                    sync_results['details'].append(account_results)
-                    
-                except Exception as e:
-                    error_msg = f"Erro ao sincronizar conta {slave_account.subdomain}: {e}"
-                    logger.error(error_msg)
-                    sync_results['accounts_failed'] += 1
-                    sync_results['details'].append({
-                        'subdomain': slave_account.subdomain,
-                        'error': str(e)
-                    })
+                    if sync_type in ['roles']:
+                        # Usar a nova função que carrega mapeamentos automaticamente
+                        roles_results = slave_sync_service.sync_roles_to_slave_new(
+                            master_account_id=master_account_id,
+                            slave_account_id=slave_account.id,
+                            sync_group_id=slave_account.sync_group_id or 1,  # Usar o grupo da conta slave
+                            progress_callback=slave_progress
+                        )
+                        account_results['roles'] = roles_results
+                
+                # Note: required_statuses é sincronizado junto com custom_fields
+                # pois eles fazem parte da configuração dos campos personalizados
+                
+                # Retries de erros transitórios na conta escrava
+                account_results['api_retries'] = slave_api.retry_stats.as_dict()
+                return account_results
+            
+            def slave_done(done, total):
+                progress_data['current_account'] = done
+                update_global_status(
+                    status='processing',
+                    progress=(done / total) * 100,
+                    operation=f'{done}/{total} contas processadas',
+                    accounts_processed=done,
+                    total_accounts=total
+                )
+            
+            # Job cancelado: nenhuma escrava nova é iniciada
+            cancel_event = current_cancel_event()
+            stop_requested = cancel_event.is_set if cancel_event is not None else None
+            
+            outcomes = fan_out_slaves(
+                current_app._get_current_object(),
+                [SlaveAccountRef.from_model(slave) for slave in slave_accounts],
+                sync_slave, max_concurrent, on_complete=slave_done, stop_on_error=stop_on_error,
+                should_stop=stop_requested
+            )
+            collect_slave_outcomes(sync_results, outcomes)
+            
+            sync_results['master_api_retries'] = master_api.retry_stats.as_dict()
             
             # Atualizar log de sincronização
             sync_log.status = 'completed'
@@ -552,6 +752,9 @@ def trigger_sync():
             
             db.session.commit()
             
+            # Liberar conexões HTTP ociosas de contas que não foram usadas recentemente
+            close_idle_sessions()
+            
             # Atualizar status global - conclusão
             update_global_status(
                 status='completed',
@@ -672,23 +875,36 @@ def get_sync_logs():
 def get_sync_status():
     """Obtém o status atual do sistema de sincronização"""
     try:
-        # Retornar status global em tempo real
+        # Status da sincronização em andamento mais recente (de qualquer worker)
+        status = sync_status.current()
+        job_id = request.args.get('job_id')
+        if job_id:
+            status = sync_status.get(job_id)
+            if status is None:
+                return jsonify({'success': False, 'error': 'Status não encontrado'}), 404
+        
         return jsonify({
             'success': True,
             'status': {
-                'current_status': global_sync_status['current_status'],
-                'progress': global_sync_status['progress'],
-                'current_operation': global_sync_status['current_operation'],
-                'current_batch': global_sync_status['current_batch'],
-                'estimated_time': global_sync_status['estimated_time'],
-                'sync_type': global_sync_status['sync_type'],
-                'is_running': global_sync_status['is_running'],
-                'accounts_processed': global_sync_status['accounts_processed'],
-                'total_accounts': global_sync_status['total_accounts'],
-                'processed_items': global_sync_status['processed_items'],
-                'total_items': global_sync_status['total_items'],
-                'results': global_sync_status['results']
-            }
+                'current_status': status['current_status'],
+                'progress': status['progress'],
+                'current_operation': status['current_operation'],
+                'current_batch': status['current_batch'],
+                'estimated_time': status['estimated_time'],
+                'sync_type': status['sync_type'],
+                'is_running': status['is_running'],
+                'accounts_processed': status['accounts_processed'],
+                'total_accounts': status['total_accounts'],
+                'processed_items': status['processed_items'],
+                'total_items': status['total_items'],
+                'results': status['results'],
+                'job_id': status.get('job_id')
+            },
+            # Todas as sincronizações em andamento (jobs simultâneos)
+            'running': [
+                {key: running_status.get(key) for key in ('job_id', 'sync_type', 'current_status', 'progress', 'current_operation')}
+                for running_status in sync_status.running()
+            ]
         })
         
     except Exception as e:
@@ -1003,16 +1219,20 @@ def trigger_multi_account_sync():
         continue_on_error = data.get('continue_on_error', True)
         
         # Configurações de lote
-        batch_config = data.get('batch_config', {})
-        batch_size = batch_config.get('batch_size', 10)
-        batch_delay = batch_config.get('batch_delay', 2.0)
+        batch_config = dict(data.get('batch_config', {}))
+        if not parallel:
+            batch_config['max_concurrent'] = 1
         max_concurrent = batch_config.get('max_concurrent', 3)
         
-        logger.info(f"🚀 Iniciando sincronização múltipla: paralelo={parallel}, lotes={batch_size}")
+        logger.info(f"🚀 Iniciando sincronização múltipla: paralelo={parallel} ({max_concurrent} contas por vez), "
+                    f"lotes={batch_config.get('batch_size', 10)}")
         
-        # TODO: Implementar lógica de sincronização múltipla
-        # Por agora, redirecionar para o endpoint padrão
-        return trigger_sync()
+        return submit_sync_job(
+            'sync', run_sync,
+            'full' if sync_type == 'multi_account' else sync_type,
+            batch_config,
+            not continue_on_error
+        )
         
     except Exception as e:
         logger.error(f"Erro na sincronização múltipla: {e}")
@@ -1025,6 +1245,9 @@ def stop_sync():
     try:
         logger.info("🛑 Solicitação de parada de sincronização recebida")
         
+        # Cancelar jobs na fila e em execução
+        cancelled_jobs = sync_jobs.cancel_all()
+        
         # Atualizar status global
         update_global_status(
             status='stopping',
@@ -1034,7 +1257,8 @@ def stop_sync():
         
         return jsonify({
             'success': True,
-            'message': 'Solicitação de parada enviada'
+            'message': 'Solicitação de parada enviada',
+            'cancelled_jobs': cancelled_jobs
         })
         
     except Exception as e:
@@ -1042,8 +1266,117 @@ def stop_sync():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+@sync_bp.route('/jobs', methods=['GET'])
+def list_sync_jobs():
+    """Lista os jobs de sincronização mais recentes"""
+    try:
+        status = request.args.get('status')
+        limit = request.args.get('limit', 50, type=int)
+        jobs = sync_jobs.list(status=status, limit=limit)
+        return jsonify({'success': True, 'jobs': jobs, 'total': len(jobs)})
+        
+    except Exception as e:
+        logger.error(f"Erro ao listar jobs: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@sync_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_sync_job(job_id):
+    """Estado, progresso e resultado de um job de sincronização"""
+    try:
+        job = sync_jobs.get(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job não encontrado'}), 404
+        return jsonify({'success': True, 'job': job})
+        
+    except Exception as e:
+        logger.error(f"Erro ao buscar job {job_id}: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+@sync_bp.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_sync_job_events(job_id):
+    """Server-Sent Events com o progresso de um job (deltas de status, progresso dos lotes e o resultado final)"""
+    # Lido antes do snapshot: nenhum evento publicado depois dele é perdido
+    published_id = job_events.last_id(job_id)
+    job = sync_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job não encontrado'}), 404
+    
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id', 0))
+    try:
+        last_event_id = int(last_event_id)
+    except (TypeError, ValueError):
+        last_event_id = 0
+    
+    def generate():
+        # Sem Last-Event-ID o snapshot já cobre os eventos publicados até aqui
+        after_id = last_event_id or published_id
+        status = sync_status.get(job_id) or dict(DEFAULT_STATUS)
+        yield 'retry: 3000\n\n'
+        yield format_sse({'job': job, 'status': status}, event='snapshot')
+        if job['status'] in ('completed', 'failed', 'cancelled'):
+            yield format_sse(job, event='done')
+            return
+        
+        while True:
+            if job_events.is_local(job_id):
+                # Job roda neste processo: eventos chegam na hora, sem consultar o banco
+                events = job_events.wait(job_id, after_id, timeout=15)
+                if not events:
+                    yield ': ping\n\n'
+                for event_id, event, data in events:
+                    after_id = event_id
+                    yield format_sse(data, event=event, event_id=event_id)
+                    if event == 'done':
+                        return
+            else:
+                # Job em outro worker (ou ainda na fila): acompanhar pelo status gravado no banco
+                db.session.expire_all()
+                current_job_state = sync_jobs.get(job_id)
+                if current_job_state is None:
+                    return
+                current_status = sync_status.get(job_id)
+                delta = status_delta(status, current_status) if current_status else {}
+                if delta:
+                    status = current_status
+                    yield format_sse(delta, event='status')
+                if current_job_state['status'] in ('completed', 'failed', 'cancelled'):
+                    yield format_sse(current_job_state, event='done')
+                    return
+                if not delta:
+                    yield ': ping\n\n'
+                job_events.wait(job_id, after_id, timeout=1)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Nginx: não bufferizar o stream
+    })
+
+
+@sync_bp.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_sync_job(job_id):
+    """Cancela um job de sincronização (na fila ou em execução)"""
+    try:
+        job = sync_jobs.cancel(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job não encontrado'}), 404
+        return jsonify({'success': True, 'message': 'Cancelamento solicitado', 'job': job})
+        
+    except Exception as e:
+        logger.error(f"Erro ao cancelar job {job_id}: {e}")
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 @sync_bp.route('/roles', methods=['POST'])
 def sync_roles_only():
+    """Sincroniza somente as roles em segundo plano (ver run_roles_sync)"""
+    data = request.get_json(silent=True) or {}
+    return submit_sync_job('roles', run_roles_sync, data.get('master_account_id'),
+                           data.get('slave_account_ids', []), data.get('batch_config', {}))
+
+def run_roles_sync(master_account_id=None, slave_account_ids=None, batch_config=None):
     """
     Sincroniza somente as roles (funções/permissões) entre as contas
     
@@ -1057,9 +1390,8 @@ def sync_roles_only():
     Isso resolve problemas de "Status not found" causados por mapeamentos desatualizados.
     """
     try:
-        data = request.get_json() or {}
-        master_account_id = data.get('master_account_id')
-        slave_account_ids = data.get('slave_account_ids', [])
+        slave_account_ids = slave_account_ids or []
+        batch_config = batch_config or {}
         
         # Se não especificar contas, buscar todas as contas
         if not master_account_id:
@@ -1097,7 +1429,7 @@ def sync_roles_only():
         logger.info(f"🔐 Iniciando sincronização de roles - Master: {master_account_id}, Slaves: {slave_account_ids}")
         
         # Verificar se já há sincronização em andamento
-        if global_sync_status['is_running']:
+        if sync_status.running(exclude=current_status_key()):
             return jsonify({
                 'success': False, 
                 'error': 'Já existe uma sincronização em andamento'
@@ -1128,12 +1460,12 @@ def sync_roles_only():
             }), 500
         
         # Configurações de lote
-        batch_config = data.get('batch_config', {})
         batch_size = batch_config.get('batch_size', 5)
-        batch_delay = batch_config.get('batch_delay', 1.0)
+        batch_delay = batch_config.get('batch_delay', 0.0)
         
         # Inicializar serviço de sincronização
-        sync_service = KommoSyncService(master_api, batch_size=batch_size, delay_between_batches=batch_delay)
+        sync_service = KommoSyncService(master_api, batch_size=batch_size, delay_between_batches=batch_delay,
+                                        cancel_event=current_cancel_event())
         
         # Extrair configuração de roles da master
         update_global_status(
@@ -1143,8 +1475,10 @@ def sync_roles_only():
         )
         
         master_config = {'roles': []}
+        fresh_snapshot = master_snapshots.get_fresh(master_account.id, batch_config.get('snapshot_max_age'))
         try:
-            roles = master_api.get_roles()
+            # Snapshot recente da master já tem as roles no mesmo formato
+            roles = fresh_snapshot[0]['roles'] if fresh_snapshot else master_api.get_roles()
             for role in roles:
                 role_data = {
                     'id': role['id'],
@@ -1187,7 +1521,9 @@ def sync_roles_only():
         
         # Função de callback para progresso
         def progress_callback(progress_data):
-            current_progress = 10 + (global_sync_status['accounts_processed'] * 80 // len(slave_account_ids))
+            publish_job_progress(progress_data or {})
+            accounts_processed = current_sync_status()['accounts_processed']
+            current_progress = 10 + (accounts_processed * 80 // len(slave_account_ids))
             if progress_data:
                 batch_progress = (progress_data.get('percentage', 0) * 80) // (100 * len(slave_account_ids))
                 current_progress += batch_progress
@@ -1195,7 +1531,7 @@ def sync_roles_only():
             update_global_status(
                 progress=min(current_progress, 95),
                 current_operation=f"Sincronizando roles - {progress_data.get('operation', 'processando')}",
-                current_batch=f"Conta {global_sync_status['accounts_processed'] + 1}/{len(slave_account_ids)}"
+                current_batch=f"Conta {accounts_processed + 1}/{len(slave_account_ids)}"
             )
         
         # Sincronizar para cada conta slave
@@ -1355,11 +1691,15 @@ def sync_roles_only():
 
 @sync_bp.route('/account/<account_id>', methods=['POST'])
 def sync_single_account(account_id):
+    """Sincroniza uma única conta específica em segundo plano"""
+    data = request.get_json(silent=True) or {}
+    return submit_sync_job('account_sync', run_single_account_sync, account_id,
+                           data.get('sync_type', 'full'), data.get('batch_config', {}))
+
+def run_single_account_sync(account_id, sync_type='full', batch_config=None):
     """Sincroniza uma única conta específica"""
     try:
-        data = request.get_json() or {}
-        sync_type = data.get('sync_type', 'full')
-        batch_config = data.get('batch_config', {})
+        batch_config = batch_config or {}
         
         logger.info(f"🚀 Iniciando sincronização {sync_type} da conta {account_id}")
         
@@ -1394,7 +1734,7 @@ def sync_single_account(account_id):
             slave_api.test_connection()
             
             # Criar serviço de sincronização
-            sync_service = KommoSyncService(master_api, [slave_api])
+            sync_service = KommoSyncService(master_api, [slave_api], cancel_event=current_cancel_event())
             
             # Executar sincronização baseada no tipo
             if sync_type == 'full':
@@ -1417,7 +1757,10 @@ def sync_single_account(account_id):
                     logger.info(f"📋 Prosseguindo com sincronização de roles mesmo assim...")
                 
                 # Agora sincronizar roles com mapeamentos atualizados
-                master_config = sync_service.extract_master_configuration()
+                master_config, _ = master_snapshots.get_or_extract(
+                    sync_service, master_account.id,
+                    max_age=batch_config.get('snapshot_max_age')
+                )
                 
                 # CARREGAR MAPEAMENTOS ATUALIZADOS DO BANCO após sincronização de pipelines
                 logger.info(f"📖 Carregando mapeamentos atualizados do banco de dados...")
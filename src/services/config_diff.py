@@ -0,0 +1,117 @@
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from src.services.config_snapshots import content_hash
+
+logger = logging.getLogger(__name__)
+
+
+class EntityDiff:
+    """
+    Diferença de uma coleção (pipelines, grupos, campos ou roles) entre duas configurações.
+
+    changed_ids: IDs da master que foram criados, alterados ou dependem de algo alterado
+    removed_names: nomes que existiam na configuração anterior e não existem mais
+    """
+
+    def __init__(self, changed_ids: Optional[Set] = None, removed_names: Optional[Set[str]] = None):
+        self.changed_ids = set(changed_ids or ())
+        self.removed_names = set(removed_names or ())
+
+    def __bool__(self) -> bool:
+        return bool(self.changed_ids or self.removed_names)
+
+    def select(self, items: Iterable[Dict]) -> List[Dict]:
+        """Apenas os itens da master que precisam ser aplicados"""
+        return [item for item in items if item.get('id') in self.changed_ids]
+
+    def allows_delete(self, name: str) -> bool:
+        return name in self.removed_names
+
+    def as_dict(self) -> Dict:
+        return {'changed': len(self.changed_ids), 'removed': sorted(self.removed_names)}
+
+
+def _diff_by_id(previous: List[Dict], current: List[Dict]) -> EntityDiff:
+    previous_by_id = {item.get('id'): content_hash(item) for item in previous}
+    changed = {item.get('id') for item in current if previous_by_id.get(item.get('id')) != content_hash(item)}
+    current_names = {item.get('name') for item in current}
+    removed = {item.get('name') for item in previous if item.get('name') not in current_names}
+    return EntityDiff(changed, removed)
+
+
+def _stage_ids(pipeline: Dict) -> Set:
+    return {stage.get('id') for stage in pipeline.get('stages', [])}
+
+
+class ConfigDiff:
+    """Diferença entre a configuração aplicada por último em uma escrava e a configuração atual da master"""
+
+    def __init__(self, previous: Dict, current: Dict, entity_types: List[str]):
+        self.pipelines = _diff_by_id(previous.get('pipelines', []), current.get('pipelines', []))
+
+        # Estágios afetados: de pipelines alterados (por estágio) e de pipelines removidos
+        previous_pipelines = {p.get('id'): p for p in previous.get('pipelines', [])}
+        current_pipeline_ids = {p.get('id') for p in current.get('pipelines', [])}
+        self.changed_stage_ids = set()
+        for pipeline in current.get('pipelines', []):
+            if pipeline.get('id') not in self.pipelines.changed_ids:
+                continue
+            old_stages = {s.get('id'): content_hash(s) for s in previous_pipelines.get(pipeline.get('id'), {}).get('stages', [])}
+            new_stages = {s.get('id'): content_hash(s) for s in pipeline.get('stages', [])}
+            self.changed_stage_ids |= {stage_id for stage_id in set(old_stages) | set(new_stages)
+                                       if old_stages.get(stage_id) != new_stages.get(stage_id)}
+        for pipeline_id, pipeline in previous_pipelines.items():
+            if pipeline_id not in current_pipeline_ids:
+                self.changed_stage_ids |= _stage_ids(pipeline)
+
+        self.custom_field_groups = {}
+        self.custom_fields = {}
+        for entity_type in entity_types:
+            groups = _diff_by_id(previous.get('custom_field_groups', {}).get(entity_type, []),
+                                 current.get('custom_field_groups', {}).get(entity_type, []))
+            fields = _diff_by_id(previous.get('custom_fields', {}).get(entity_type, []),
+                                 current.get('custom_fields', {}).get(entity_type, []))
+            # Dependentes: campos cujo grupo ou required_statuses apontam para algo alterado
+            for field in current.get('custom_fields', {}).get(entity_type, []):
+                if field.get('group_id') in groups.changed_ids or self._references_changed_stage(field):
+                    fields.changed_ids.add(field.get('id'))
+            self.custom_field_groups[entity_type] = groups
+            self.custom_fields[entity_type] = fields
+
+        self.task_types_changed = content_hash(previous.get('task_types', {})) != content_hash(current.get('task_types', {}))
+
+        # As permissões das roles referenciam pipelines e estágios: qualquer mudança neles marca todas as roles
+        self.roles = _diff_by_id(previous.get('roles', []), current.get('roles', []))
+        if self.pipelines:
+            self.roles.changed_ids |= {role.get('id') for role in current.get('roles', [])}
+
+    def _references_changed_stage(self, field: Dict) -> bool:
+        for required_status in field.get('required_statuses') or []:
+            if (required_status.get('status_id') in self.changed_stage_ids
+                    or required_status.get('pipeline_id') in self.pipelines.changed_ids):
+                return True
+        return False
+
+    def is_empty(self) -> bool:
+        return not (self.pipelines or self.task_types_changed or self.roles
+                    or any(self.custom_field_groups.values()) or any(self.custom_fields.values()))
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'pipelines': self.pipelines.as_dict(),
+            'changed_stages': len(self.changed_stage_ids),
+            'custom_field_groups': {entity: diff.as_dict() for entity, diff in self.custom_field_groups.items()},
+            'custom_fields': {entity: diff.as_dict() for entity, diff in self.custom_fields.items()},
+            'task_types_changed': self.task_types_changed,
+            'roles': self.roles.as_dict()
+        }
+
+
+def diff_master_configs(previous: Dict, current: Dict, entity_types: List[str]) -> ConfigDiff:
+    """Compara a última configuração aplicada com a atual da master"""
+    diff = ConfigDiff(previous, current, entity_types)
+    logger.info(f"🧮 Diferença da master: {diff.pipelines.as_dict()['changed']} pipelines, "
+                f"{len(diff.changed_stage_ids)} estágios, "
+                f"{sum(len(d.changed_ids) for d in diff.custom_fields.values())} campos alterados")
+    return diff
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import logging
+import os
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.database import db
+from src.models.kommo_account import AppliedConfigState, MasterConfigSnapshot
+
+logger = logging.getLogger(__name__)
+
+# Snapshots mais novos que isso são reutilizados sem nenhuma chamada à API. Por padrão (0) nenhum é
+# reutilizado inteiro: só quando o chamador pede (snapshot_max_age) ou KOMMO_SNAPSHOT_MAX_AGE é definido
+DEFAULT_MAX_AGE = float(os.getenv('KOMMO_SNAPSHOT_MAX_AGE', '0'))
+# Até essa idade a seção de pipelines pode ser reaproveitada se a sonda não mudou
+# (a sonda não enxerga descrições de estágios, então depois disso tudo é extraído de novo)
+DEFAULT_PROBE_MAX_AGE = float(os.getenv('KOMMO_SNAPSHOT_PROBE_MAX_AGE', '3600'))
+DEFAULT_KEEP = int(os.getenv('KOMMO_SNAPSHOT_KEEP', '5'))
+# Depois desse tempo a sincronização incremental volta a ser completa, corrigindo alterações
+# feitas manualmente nas escravas (que o diff da master não enxerga)
+DEFAULT_APPLIED_MAX_AGE = float(os.getenv('KOMMO_APPLIED_STATE_MAX_AGE', '86400'))
+
+
+def content_hash(data: Any) -> str:
+    """sha256 de uma estrutura JSON, independente da ordem das chaves"""
+    encoded = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def _strip_links(data: Any) -> Any:
+    if isinstance(data, dict):
+        return {key: _strip_links(value) for key, value in data.items() if key != '_links'}
+    if isinstance(data, list):
+        return [_strip_links(item) for item in data]
+    return data
+
+
+def compress_config(config: Dict) -> bytes:
+    return zlib.compress(json.dumps(config, ensure_ascii=False).encode('utf-8'))
+
+
+def decompress_config(data: bytes) -> Dict:
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+class MasterConfigSnapshotStore:
+    """
+    Guarda a configuração extraída de cada conta mestre no banco, comprimida e com
+    hash por seção, para que sincronizações próximas não repitam a extração inteira.
+    """
+
+    def __init__(self, max_age: float = DEFAULT_MAX_AGE, probe_max_age: float = DEFAULT_PROBE_MAX_AGE,
+                 keep: int = DEFAULT_KEEP):
+        self.max_age = max_age
+        self.probe_max_age = probe_max_age
+        self.keep = keep
+
+    def latest(self, master_account_id: int) -> Optional[MasterConfigSnapshot]:
+        """Snapshot mais recente de uma conta mestre"""
+        return (MasterConfigSnapshot.query
+                .filter_by(master_account_id=master_account_id)
+                .order_by(MasterConfigSnapshot.created_at.desc(), MasterConfigSnapshot.id.desc())
+                .first())
+
+    @staticmethod
+    def load(snapshot: MasterConfigSnapshot) -> Dict:
+        return decompress_config(snapshot.config_data)
+
+    @staticmethod
+    def age_seconds(snapshot: MasterConfigSnapshot) -> float:
+        return (datetime.utcnow() - snapshot.created_at).total_seconds()
+
+    @staticmethod
+    def probe_pipelines(sync_service) -> Optional[str]:
+        """Hash da lista de pipelines da master (uma única requisição, sem cache)"""
+        try:
+            pipelines = sync_service.master_api.get_pipelines(use_cache=False)
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao sondar pipelines da master, extraindo tudo: {e}")
+            return None
+        return content_hash(_strip_links(pipelines))
+
+    def get_fresh(self, master_account_id: int, max_age: Optional[float] = None,
+                  snapshot: Optional[MasterConfigSnapshot] = None) -> Optional[Tuple[Dict, int]]:
+        """Configuração do último snapshot se ele for mais novo que max_age, senão None"""
+        max_age = self.max_age if max_age is None else float(max_age)
+        if max_age <= 0:
+            return None
+        snapshot = snapshot or self.latest(master_account_id)
+        if snapshot is None:
+            return None
+        age = self.age_seconds(snapshot)
+        if age > max_age:
+            return None
+        logger.info(f"📦 Reutilizando snapshot {snapshot.id} da master (idade {age:.0f}s)")
+        return self.load(snapshot), snapshot.id
+
+    def get_or_extract(self, sync_service, master_account_id: int, max_age: Optional[float] = None,
+                       force_refresh: bool = False) -> Tuple[Dict, Dict]:
+        """
+        Retorna a configuração da master, reaproveitando o snapshot salvo quando possível.
+
+        - snapshot mais novo que max_age: usado sem chamadas à API
+        - sonda de pipelines inalterada: apenas a seção de pipelines é reaproveitada
+        - caso contrário: extração completa
+
+        Returns:
+            Tupla (configuração, informações sobre o snapshot usado/gravado)
+        """
+        latest = None if force_refresh else self.latest(master_account_id)
+
+        fresh = self.get_fresh(master_account_id, max_age, snapshot=latest) if latest is not None else None
+        if fresh is not None:
+            return fresh[0], self._info(latest, 'snapshot', list(json.loads(latest.section_hashes)))
+
+        probe_hash = self.probe_pipelines(sync_service)
+        reuse_sections = {}
+        if (latest is not None and probe_hash is not None and latest.probe_hash == probe_hash
+                and self.age_seconds(latest) <= self.probe_max_age):
+            reuse_sections['pipelines'] = sync_service.master_config_sections(self.load(latest))['pipelines']
+            logger.info(f"📦 Pipelines da master inalterados desde o snapshot {latest.id}, reaproveitando")
+
+        config = sync_service.extract_master_configuration(reuse_sections=reuse_sections)
+        snapshot = self.save(sync_service, master_account_id, config, probe_hash)
+        source = 'partial' if reuse_sections else 'extracted'
+        return config, self._info(snapshot, source, list(reuse_sections))
+
+    def save(self, sync_service, master_account_id: int, config: Dict,
+             probe_hash: Optional[str] = None) -> MasterConfigSnapshot:
+        """Grava a configuração; se for idêntica ao último snapshot, apenas renova a data dele"""
+        section_hashes = {name: content_hash(section)
+                          for name, section in sync_service.master_config_sections(config).items()}
+        config_hash = content_hash(section_hashes)
+
+        latest = self.latest(master_account_id)
+        if latest is not None and latest.config_hash == config_hash:
+            latest.created_at = datetime.utcnow()
+            latest.probe_hash = probe_hash
+            db.session.commit()
+            return latest
+
+        snapshot = MasterConfigSnapshot(
+            master_account_id=master_account_id,
+            config_data=compress_config(config),
+            config_hash=config_hash,
+            section_hashes=json.dumps(section_hashes, sort_keys=True),
+            probe_hash=probe_hash
+        )
+        db.session.add(snapshot)
+        db.session.commit()
+
+        changed = self.changed_sections(latest, snapshot) if latest is not None else list(section_hashes)
+        logger.info(f"💾 Snapshot {snapshot.id} da master gravado ({len(snapshot.config_data)} bytes, "
+                    f"seções alteradas: {', '.join(changed) or 'nenhuma'})")
+        self._prune(master_account_id)
+        return snapshot
+
+    @staticmethod
+    def changed_sections(old: MasterConfigSnapshot, new: MasterConfigSnapshot) -> List[str]:
+        """Seções cujo hash difere entre dois snapshots"""
+        old_hashes = json.loads(old.section_hashes)
+        new_hashes = json.loads(new.section_hashes)
+        return sorted(name for name in set(old_hashes) | set(new_hashes)
+                      if old_hashes.get(name) != new_hashes.get(name))
+
+    def _prune(self, master_account_id: int):
+        stale = (MasterConfigSnapshot.query
+                 .filter_by(master_account_id=master_account_id)
+                 .order_by(MasterConfigSnapshot.created_at.desc(), MasterConfigSnapshot.id.desc())
+                 .offset(self.keep)
+                 .all())
+        for snapshot in stale:
+            db.session.delete(snapshot)
+        if stale:
+            db.session.commit()
+
+    def _info(self, snapshot: MasterConfigSnapshot, source: str, reused_sections: List[str]) -> Dict:
+        return {
+            'snapshot_id': snapshot.id,
+            'source': source,
+            'config_hash': snapshot.config_hash,
+            'age_seconds': round(self.age_seconds(snapshot), 1),
+            'reused_sections': reused_sections
+        }
+
+
+class AppliedConfigStore:
+    """Última configuração da master aplicada sem erros em cada conta escrava"""
+
+    def __init__(self, max_age: float = DEFAULT_APPLIED_MAX_AGE):
+        self.max_age = max_age
+
+    def load(self, sync_group_id: Optional[int], slave_account_id: int) -> Optional[Dict]:
+        """Configuração aplicada por último, ou None se não existir ou estiver velha demais"""
+        state = AppliedConfigState.query.filter_by(sync_group_id=sync_group_id,
+                                                   slave_account_id=slave_account_id).first()
+        if state is None:
+            return None
+        if (datetime.utcnow() - state.applied_at).total_seconds() > self.max_age:
+            logger.info(f"⌛ Configuração aplicada na conta {slave_account_id} expirou, sincronização completa")
+            return None
+        return decompress_config(state.config_data)
+
+    def save(self, sync_group_id: Optional[int], slave_account_id: int, config: Dict):
+        state = AppliedConfigState.query.filter_by(sync_group_id=sync_group_id,
+                                                   slave_account_id=slave_account_id).first()
+        if state is None:
+            state = AppliedConfigState(sync_group_id=sync_group_id, slave_account_id=slave_account_id)
+            db.session.add(state)
+        state.config_data = compress_config(config)
+        state.config_hash = content_hash(config)
+        state.applied_at = datetime.utcnow()
+        db.session.commit()
+
+    def clear(self, sync_group_id: Optional[int], slave_account_id: int):
+        AppliedConfigState.query.filter_by(sync_group_id=sync_group_id,
+                                           slave_account_id=slave_account_id).delete()
+        db.session.commit()
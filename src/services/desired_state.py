@@ -0,0 +1,244 @@
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from src.services.sync_run import FrozenDict, freeze_config
+
+logger = logging.getLogger(__name__)
+
+# Cores oficiais da documentação do Kommo (COM #)
+KOMMO_STAGE_COLORS = [
+    '#fffeb2', '#fffd7f', '#fff000', '#ffeab2', '#ffdc7f', '#ffce5a',
+    '#ffdbdb', '#ffc8c8', '#ff8f92', '#d6eaff', '#c1e0ff', '#98cbff',
+    '#ebffb1', '#deff81', '#87f2c0', '#f9deff', '#f3beff', '#ccc8f9',
+    '#eb93ff', '#f2f3f4', '#e6e8ea'
+]
+_KOMMO_STAGE_COLORS_LOWER = {color.lower() for color in KOMMO_STAGE_COLORS}
+
+# Tipos de campo aceitos pela API do Kommo (conforme documentação oficial)
+SUPPORTED_FIELD_TYPES = {
+    'text', 'numeric', 'checkbox', 'select', 'multiselect', 'date', 'date_time',
+    'url', 'textarea', 'radiobutton', 'streetaddress', 'smart_address',
+    'legal_entity', 'price', 'monetary', 'category', 'file', 'multitext',
+    'tracking_data', 'linked_entity', 'chained_list'
+}
+
+# Tipos problemáticos que devem ser convertidos
+FIELD_TYPE_CONVERSIONS = {
+    'birthday_date': 'date',  # birthday_date não existe, usar date
+    'birthday': 'date',       # birthday não é suportado, usar date
+    'datetime': 'date_time',  # datetime deve ser date_time
+}
+
+# Campos padrão do sistema que não devem ser sincronizados
+SYSTEM_FIELD_CODES = ['PHONE', 'EMAIL', 'POSITION', 'WEB', 'IM', 'ADDRESS']
+
+ENUM_FIELD_TYPES = ('select', 'multiselect', 'radiobutton')
+
+# Padrões de nome de estágios especiais (entrada, ganho, perdido)
+SPECIAL_STAGE_PATTERNS = [
+    'incoming leads', 'incoming', 'etapa de leads de entrada', 'leads de entrada', 'entrada',
+    'venda ganha', 'fechado - ganho', 'closed - won', 'won', 'successful', 'sucesso',
+    'venda perdida', 'fechado - perdido', 'closed - lost', 'lost', 'unsuccessful', 'fracasso'
+]
+
+
+def get_valid_kommo_color(master_color: Optional[str], fallback_index: int) -> str:
+    """Retorna uma cor válida do Kommo baseada na cor da master ou fallback inteligente"""
+    # Se a cor da master é válida, usar ela
+    if master_color and master_color.lower() in _KOMMO_STAGE_COLORS_LOWER:
+        return master_color
+
+    # Se não é válida, tentar mapear para cor similar
+    if master_color:
+        master_color_lower = master_color.lower()
+
+        # Mapear cores azuis para cores azuis válidas do Kommo
+        if any(blue_hint in master_color_lower for blue_hint in ['blue', 'azul']) or master_color_lower in ['#0000ff', '#0066ff', '#4169e1']:
+            return '#98cbff'  # Azul forte do Kommo
+
+        # Mapear cores verdes para cores verdes válidas do Kommo
+        if any(green_hint in master_color_lower for green_hint in ['green', 'verde']) or master_color_lower in ['#00ff00', '#008000', '#32cd32']:
+            return '#87f2c0'  # Verde forte do Kommo
+
+        # Mapear cores vermelhas/rosas para cores vermelhas válidas do Kommo
+        if any(red_hint in master_color_lower for red_hint in ['red', 'vermelho', '#ff0000', '#dc143c', '#b22222']):
+            return '#ff8f92'  # Rosa forte do Kommo
+
+        # Mapear cores roxas para cores roxas válidas do Kommo
+        if any(purple_hint in master_color_lower for purple_hint in ['purple', 'roxo', '#800080', '#9932cc', '#8a2be2']):
+            return '#eb93ff'  # Magenta do Kommo
+
+        # Mapear cores amarelas para cores amarelas válidas do Kommo
+        if any(yellow_hint in master_color_lower for yellow_hint in ['yellow', 'amarelo', '#ffff00', '#ffd700', '#fff8dc']):
+            return '#fff000'  # Amarelo forte do Kommo
+
+        # Mapear cores laranjas para cores laranjas válidas do Kommo
+        if any(orange_hint in master_color_lower for orange_hint in ['orange', 'laranja', '#ffa500', '#ff8c00', '#ff7f50']):
+            return '#ffce5a'  # Laranja forte do Kommo
+
+    # Se nenhum mapeamento específico, usar fallback por índice
+    return KOMMO_STAGE_COLORS[fallback_index % len(KOMMO_STAGE_COLORS)]
+
+
+def should_ignore_stage(stage: Dict) -> bool:
+    """
+    Verifica se um estágio deve ser completamente ignorado durante a sincronização.
+    Estágios especiais do sistema (Won=142, Lost=143) são gerenciados automaticamente pelo Kommo.
+    """
+    stage_id = stage.get('id')
+    stage_type = stage.get('type', 0)
+    stage_name = stage.get('name', '').lower()
+
+    # REGRA 1: Ignorar por ID direto (MAIS IMPORTANTE)
+    if stage_id in [142, 143]:
+        logger.debug(f"🚫 Ignorando estágio por ID especial: {stage_id} - '{stage_name}'")
+        return True
+
+    # REGRA 2: Ignorar estágios type=1 (incoming leads) - criados automaticamente
+    if stage_type == 1:
+        logger.debug(f"🚫 Ignorando estágio type=1: '{stage_name}' - criado automaticamente pelo Kommo")
+        return True
+
+    # REGRA 3: Ignorar por nome (padrões conhecidos de estágios especiais)
+    for pattern in SPECIAL_STAGE_PATTERNS:
+        if pattern in stage_name:
+            logger.debug(f"🚫 Ignorando estágio por padrão de nome: '{pattern}' em '{stage_name}'")
+            return True
+
+    return False
+
+
+def compile_stage_payloads(master_pipeline: Dict) -> List[Tuple[Dict, Dict]]:
+    """Pares (estágio da master, dados para a escrava) sem IDs, ignorando estágios especiais"""
+    payloads = []
+    for i, master_stage in enumerate(master_pipeline.get('stages', [])):
+        if should_ignore_stage(master_stage):
+            continue
+
+        stage_data = {
+            'name': master_stage['name'],
+            'sort': max(1, min(10000, master_stage.get('sort', i + 1))),  # Garantir range válido
+            'type': master_stage.get('type', 0)
+        }
+        if master_stage.get('descriptions'):
+            stage_data['descriptions'] = master_stage['descriptions']
+        # Fallback de cor pelo índice entre os estágios realmente processados
+        stage_data['color'] = get_valid_kommo_color(master_stage.get('color'), len(payloads))
+        payloads.append((master_stage, stage_data))
+    return payloads
+
+
+def compile_pipeline_payload(master_pipeline: Dict, stage_payloads: List[Tuple[Dict, Dict]]) -> Dict:
+    """Dados de criação de um pipeline na escrava, já com seus estágios"""
+    return {
+        'name': master_pipeline['name'],
+        'sort': max(1, min(10000, master_pipeline.get('sort', 1))),
+        'is_main': master_pipeline.get('is_main', False),
+        'is_unsorted_on': master_pipeline.get('is_unsorted_on', True),
+        '_embedded': {'statuses': [stage_data for _, stage_data in stage_payloads]}
+    }
+
+
+def compile_field_template(master_field: Dict) -> Optional[Dict]:
+    """
+    Dados de um campo personalizado que não dependem da escrava (tipo validado, código, enums).
+    group_id e required_statuses são resolvidos por escrava. Retorna None para campos do sistema.
+    """
+    field_code = master_field.get('code') or ''
+    if field_code and field_code.upper() in SYSTEM_FIELD_CODES:
+        return None
+
+    field_type = FIELD_TYPE_CONVERSIONS.get(master_field['type'], master_field['type'])
+    if field_type not in SUPPORTED_FIELD_TYPES:
+        logger.warning(f"Tipo de campo '{field_type}' não suportado pela API do Kommo para campo '{master_field['name']}'. Convertendo para 'text'.")
+        field_type = 'text'  # Fallback para tipo texto
+
+    field_data = {
+        'name': master_field['name'],
+        'type': field_type,
+        'sort': master_field.get('sort', 0),
+        'is_required': master_field.get('is_required', False)
+    }
+    if field_code:
+        field_data['code'] = field_code
+
+    # Campos monetários requerem o parâmetro 'currency'
+    if field_type == 'monetary':
+        field_data['currency'] = master_field.get('currency', 'USD')
+
+    # Só adicionar enums para campos que realmente suportam (sem IDs da master)
+    if field_type in ENUM_FIELD_TYPES and master_field.get('enums'):
+        clean_enums = []
+        for enum_item in master_field['enums']:
+            if isinstance(enum_item, dict):
+                clean_enums.append({'value': enum_item.get('value', ''), 'sort': enum_item.get('sort', 0)})
+            else:
+                clean_enums.append({'value': str(enum_item), 'sort': 0})
+        if clean_enums:
+            field_data['enums'] = clean_enums
+
+    return field_data
+
+
+class DesiredState:
+    """
+    Payloads da configuração da master que são iguais para todas as escravas.
+
+    Compilados uma vez e reutilizados no loop das escravas; os dicionários são somente
+    leitura - use dict(template) para montar os dados de uma escrava.
+    """
+
+    def __init__(self, master_config: Dict, entity_types: List[str]):
+        self.stage_payloads = {}
+        self.pipeline_payloads = {}
+        for master_pipeline in master_config.get('pipelines', []):
+            stage_payloads = compile_stage_payloads(master_pipeline)
+            self.stage_payloads[master_pipeline['id']] = freeze_config(stage_payloads)
+            self.pipeline_payloads[master_pipeline['id']] = freeze_config(
+                compile_pipeline_payload(master_pipeline, stage_payloads)
+            )
+
+        self.field_templates = {}
+        for entity_type in entity_types:
+            self.field_templates[entity_type] = {
+                master_field['id']: freeze_config(compile_field_template(master_field))
+                for master_field in master_config.get('custom_fields', {}).get(entity_type, [])
+            }
+
+    def stages_for(self, master_pipeline: Dict) -> List[Tuple[Dict, Dict]]:
+        payloads = self.stage_payloads.get(master_pipeline['id'])
+        return payloads if payloads is not None else compile_stage_payloads(master_pipeline)
+
+
+_compiled: 'OrderedDict[int, Tuple[Dict, DesiredState]]' = OrderedDict()
+_compiled_lock = threading.Lock()
+_MAX_COMPILED = 8
+
+
+def get_desired_state(master_config: Dict, entity_types: List[str]) -> DesiredState:
+    """
+    DesiredState de uma configuração da master.
+
+    Configurações congeladas (FrozenDict, entregues pelo SyncRunCoordinator) não mudam, então
+    a compilação é feita uma vez e compartilhada por todos os grupos e escravas da execução.
+    """
+    if not isinstance(master_config, FrozenDict):
+        return DesiredState(master_config, entity_types)
+
+    key = id(master_config)
+    with _compiled_lock:
+        entry = _compiled.get(key)
+        if entry is not None and entry[0] is master_config:
+            _compiled.move_to_end(key)
+            return entry[1]
+
+    state = DesiredState(master_config, entity_types)
+    logger.debug(f"🧩 Payloads da master compilados: {len(state.pipeline_payloads)} pipelines, "
+                 f"{sum(len(t) for t in state.field_templates.values())} campos")
+    with _compiled_lock:
+        _compiled[key] = (master_config, state)
+        while len(_compiled) > _MAX_COMPILED:
+            _compiled.popitem(last=False)
+    return state
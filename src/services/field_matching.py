@@ -0,0 +1,197 @@
+import math
+import re
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Diferença máxima de tamanho entre nomes para contar como "parcialmente similares" (ex.: popo -> popopa)
+PARTIAL_MAX_LENGTH_DIFF = 3
+PARTIAL_MIN_LENGTH = 3
+# Similaridade posicional mínima para a última estratégia de busca
+SIMILARITY_THRESHOLD = 0.7
+
+_NON_ALNUM = re.compile(r'[^a-zA-Z0-9]')
+
+
+def normalize_field_name(name: str) -> str:
+    """Nome sem espaços/acentos/caracteres especiais, em minúsculas"""
+    return _NON_ALNUM.sub('', name.lower())
+
+
+def string_similarity(s1: str, s2: str) -> float:
+    """Fração de posições com o mesmo caractere (em relação ao nome mais longo)"""
+    s1, s2 = s1.lower(), s2.lower()
+    if len(s1) == 0 or len(s2) == 0:
+        return 0
+    common = sum(1 for a, b in zip(s1, s2) if a == b)
+    return common / max(len(s1), len(s2))
+
+
+def types_compatible(slave_type: str, field_type: str, master_type: str) -> bool:
+    """Se um campo da escrava do tipo slave_type pode corresponder ao campo da master"""
+    return (slave_type == field_type or
+            (slave_type == 'date' and master_type == 'birthday') or
+            (slave_type == 'date_time' and master_type == 'datetime'))
+
+
+class CustomFieldMatchIndex:
+    """
+    Índice dos campos personalizados de uma entidade, montado uma vez por sincronização.
+
+    Responde às mesmas estratégias de busca (na mesma ordem de prioridade) que antes eram
+    varreduras lineares sobre todos os campos para cada campo da master:
+
+    1. código
+    2. nome exato
+    3. nome sem diferença de maiúsculas/espaços nas pontas, ou um nome contido no outro
+       (até 3 caracteres de diferença)
+    4. tipo compatível + nome normalizado (só letras e números)
+    5. tipo compatível + similaridade posicional >= 70%
+
+    Cada estratégia usa um dicionário (ou, na 3 e na 5, um conjunto pequeno de candidatos), e
+    dentro de uma estratégia vence o primeiro campo na ordem da lista - como nas varreduras.
+    """
+
+    def __init__(self, fields: List[Dict]):
+        self.fields = fields
+        self._by_code: Dict[str, int] = {}
+        self._by_name: Dict[str, int] = {}
+        self._by_casefold: Dict[str, int] = {}
+        # Trechos de cada nome com pelo menos (tamanho - 3) caracteres -> primeiro campo que os contém
+        self._by_fragment: Dict[str, int] = {}
+        self._by_normalized: Dict[str, List[int]] = defaultdict(list)
+        # Tamanho do nome -> campos (para a similaridade posicional)
+        self._by_length: Dict[int, List[int]] = defaultdict(list)
+        self._by_stripped_length: Dict[int, List[int]] = defaultdict(list)
+        self._lowered: List[str] = []
+        self._stripped: List[str] = []
+
+        for index, field in enumerate(fields):
+            name = field.get('name') or ''
+            lowered = name.lower()
+            stripped = lowered.strip()
+            self._lowered.append(lowered)
+            self._stripped.append(stripped)
+
+            if field.get('code'):
+                self._by_code.setdefault(field['code'], index)
+            self._by_name.setdefault(name, index)
+            self._by_casefold.setdefault(stripped, index)
+            if len(stripped) >= PARTIAL_MIN_LENGTH:
+                for fragment in self._fragments(stripped):
+                    if fragment not in self._by_fragment or self._by_fragment[fragment] > index:
+                        self._by_fragment[fragment] = index
+            self._by_normalized[normalize_field_name(name)].append(index)
+            self._by_length[len(lowered)].append(index)
+            self._by_stripped_length[len(stripped)].append(index)
+
+    @staticmethod
+    def _fragments(text: str):
+        """Trechos de text que podem ser "o nome contido" numa comparação parcial"""
+        shortest = max(PARTIAL_MIN_LENGTH, len(text) - PARTIAL_MAX_LENGTH_DIFF)
+        for size in range(shortest, len(text) + 1):
+            for start in range(len(text) - size + 1):
+                yield text[start:start + size]
+
+    def by_code(self, code: Optional[str]) -> Optional[Dict]:
+        index = self._by_code.get(code) if code else None
+        return self.fields[index] if index is not None else None
+
+    def by_name(self, name: str) -> Optional[Dict]:
+        index = self._by_name.get(name)
+        return self.fields[index] if index is not None else None
+
+    def by_similar_name(self, name: str) -> Tuple[Optional[Dict], bool]:
+        """
+        Estratégia 3: (campo, parcial). Primeiro campo com o mesmo nome ignorando maiúsculas e
+        espaços nas pontas, ou cujo nome contém/está contido no nome buscado.
+        """
+        wanted = name.lower().strip()
+        candidates = []
+        if wanted in self._by_casefold:
+            candidates.append(self._by_casefold[wanted])
+        if len(wanted) >= PARTIAL_MIN_LENGTH:
+            # Campos cujo nome contém o nome buscado
+            if wanted in self._by_fragment:
+                candidates.append(self._by_fragment[wanted])
+            # Campos cujo nome está contido no nome buscado
+            for fragment in self._fragments(wanted):
+                if fragment in self._by_casefold:
+                    candidates.append(self._by_casefold[fragment])
+        if not candidates:
+            return None, False
+        index = min(candidates)
+        return self.fields[index], self._stripped[index] != wanted
+
+    def by_normalized_name(self, name: str, compatible: Callable[[Dict], bool]) -> Optional[Dict]:
+        """Estratégia 4: mesmo nome normalizado (mais de 2 caracteres) e tipo compatível"""
+        normalized = normalize_field_name(name)
+        if len(normalized) <= 2:
+            return None
+        for index in self._by_normalized.get(normalized, []):
+            if compatible(self.fields[index]):
+                return self.fields[index]
+        return None
+
+    def by_similarity(self, name: str, compatible: Optional[Callable[[Dict], bool]] = None,
+                      strip: bool = False, min_length: int = PARTIAL_MIN_LENGTH) -> Tuple[Optional[Dict], float]:
+        """
+        Estratégia 5: primeiro campo (nome com min_length+ caracteres e tipo compatível) com
+        similaridade posicional >= 70%. Só nomes de tamanho entre 70% e 1/0,7 do buscado podem
+        chegar lá, então apenas esses tamanhos são comparados.
+        """
+        wanted = name.lower().strip() if strip else name.lower()
+        if not wanted:
+            return None, 0
+        names = self._stripped if strip else self._lowered
+        buckets = self._by_stripped_length if strip else self._by_length
+        # Limites folgados em 1 caractere (arredondamento); a similaridade é conferida abaixo
+        shortest = max(1, math.floor(len(wanted) * SIMILARITY_THRESHOLD) - 1)
+        longest = math.ceil(len(wanted) / SIMILARITY_THRESHOLD) + 1
+        candidates = sorted(index for size in range(shortest, longest + 1) for index in buckets.get(size, []))
+        for index in candidates:
+            if len(self.fields[index].get('name') or '') < min_length:
+                continue
+            if compatible is not None and not compatible(self.fields[index]):
+                continue
+            similarity = string_similarity(names[index], wanted)
+            if similarity >= SIMILARITY_THRESHOLD:
+                return self.fields[index], similarity
+        return None, 0
+
+    def match(self, name: str, code: Optional[str], compatible: Callable[[Dict], bool]) -> Tuple[Optional[Dict], str]:
+        """Campo correspondente pelas 5 estratégias em ordem; retorna (campo, descrição da estratégia)"""
+        field = self.by_code(code)
+        if field is not None:
+            return field, f"código '{code}'"
+
+        field = self.by_name(name)
+        if field is not None:
+            return field, f"nome exato '{name}'"
+
+        field, partial = self.by_similar_name(name)
+        if field is not None:
+            return field, (f"nome parcialmente similar '{field['name']}'" if partial
+                           else f"nome similar '{field['name']}'")
+
+        field = self.by_normalized_name(name, compatible)
+        if field is not None:
+            return field, f"tipo+nome normalizado '{field['name']}'"
+
+        field, similarity = self.by_similarity(name, compatible)
+        if field is not None:
+            return field, f"alta similaridade ({similarity:.0%}) '{field['name']}'"
+
+        return None, ''
+
+    def has_counterpart(self, name: str, code: Optional[str]) -> bool:
+        """
+        Se um campo (da escrava) tem correspondente neste índice (da master): mesmo nome, mesmo
+        código, nome similar/parcial ou similaridade >= 70% - sem exigir tipo compatível.
+        """
+        if name in self._by_name or (code and code in self._by_code):
+            return True
+        if self.by_similar_name(name)[0] is not None:
+            return True
+        if len(name.lower().strip()) < PARTIAL_MIN_LENGTH:
+            return False
+        return self.by_similarity(name, strip=True, min_length=0)[0] is not None
@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Configurações padrão do pool (podem ser sobrescritas por variáveis de ambiente)
+DEFAULT_POOL_SIZE = int(os.getenv('KOMMO_HTTP_POOL_SIZE', '10'))
+DEFAULT_CONNECT_TIMEOUT = float(os.getenv('KOMMO_HTTP_CONNECT_TIMEOUT', '10'))
+DEFAULT_READ_TIMEOUT = float(os.getenv('KOMMO_HTTP_READ_TIMEOUT', '60'))
+DEFAULT_IDLE_TIMEOUT = float(os.getenv('KOMMO_HTTP_IDLE_TIMEOUT', '300'))
+
+
+class KommoSessionPool:
+    """
+    Pool de sessões HTTP keep-alive, uma por subdomínio do Kommo.
+
+    Cada subdomínio recebe um único requests.Session compartilhado entre threads,
+    com um HTTPAdapter dimensionado por pool_size. Assim as milhares de chamadas
+    de uma sincronização reaproveitam as conexões TCP/TLS já abertas.
+
+    Cada requisição usa a sessão dentro de session(): o relógio de ociosidade é atualizado a
+    cada uso e uma sessão com requisições em andamento nunca é fechada (close_idle a mantém;
+    configure a fecha quando a última requisição termina).
+    """
+
+    def __init__(self, pool_size: int = DEFAULT_POOL_SIZE,
+                 connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+                 read_timeout: float = DEFAULT_READ_TIMEOUT,
+                 idle_timeout: float = DEFAULT_IDLE_TIMEOUT):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self._sessions: Dict[str, requests.Session] = {}
+        self._last_used: Dict[str, float] = {}
+        # Requisições em andamento por sessão (id) e sessões substituídas que fecham ao ficar livres
+        self._in_use: Dict[int, int] = {}
+        self._retired: Dict[int, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def timeout(self) -> Tuple[float, float]:
+        """Timeout (connect, read) usado em todas as requisições"""
+        return (self.connect_timeout, self.read_timeout)
+
+    def configure(self, pool_size: Optional[int] = None, connect_timeout: Optional[float] = None,
+                  read_timeout: Optional[float] = None, idle_timeout: Optional[float] = None):
+        """Altera a configuração do pool. Sessões já abertas são recriadas no próximo uso."""
+        with self._lock:
+            if pool_size is not None:
+                self.pool_size = pool_size
+            if connect_timeout is not None:
+                self.connect_timeout = connect_timeout
+            if read_timeout is not None:
+                self.read_timeout = read_timeout
+            if idle_timeout is not None:
+                self.idle_timeout = idle_timeout
+            sessions = []
+            for session in self._sessions.values():
+                if self._in_use.get(id(session)):
+                    self._retired[id(session)] = session
+                else:
+                    sessions.append(session)
+            self._sessions.clear()
+            self._last_used.clear()
+        for session in sessions:
+            session.close()
+
+    def _create_session(self) -> requests.Session:
+        session = requests.Session()
+        # max_retries=0: o tratamento de retry é feito pelo KommoAPIService
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({'Connection': 'keep-alive'})
+        return session
+
+    def _session_for(self, subdomain: str) -> requests.Session:
+        """Sessão do subdomínio, criando-a se necessário (chamado com o lock)"""
+        session = self._sessions.get(subdomain)
+        if session is None:
+            session = self._create_session()
+            self._sessions[subdomain] = session
+            logger.debug(f"🔌 Nova sessão HTTP criada para {subdomain} (pool_size={self.pool_size})")
+        self._last_used[subdomain] = time.monotonic()
+        return session
+
+    def get_session(self, subdomain: str) -> requests.Session:
+        """Retorna a sessão compartilhada do subdomínio, criando-a se necessário"""
+        with self._lock:
+            return self._session_for(subdomain)
+
+    @contextmanager
+    def session(self, subdomain: str) -> Iterator[requests.Session]:
+        """Sessão do subdomínio marcada como em uso durante o bloco (uma requisição)"""
+        with self._lock:
+            session = self._session_for(subdomain)
+            self._in_use[id(session)] = self._in_use.get(id(session), 0) + 1
+        try:
+            yield session
+        finally:
+            retired = None
+            with self._lock:
+                remaining = self._in_use.get(id(session), 1) - 1
+                if remaining:
+                    self._in_use[id(session)] = remaining
+                else:
+                    self._in_use.pop(id(session), None)
+                    retired = self._retired.pop(id(session), None)
+                if self._sessions.get(subdomain) is session:
+                    self._last_used[subdomain] = time.monotonic()
+            if retired is not None:
+                retired.close()
+
+    def close_idle(self, max_idle_seconds: Optional[float] = None) -> int:
+        """Fecha as sessões sem uso há mais de max_idle_seconds. Retorna quantas foram fechadas."""
+        max_idle = self.idle_timeout if max_idle_seconds is None else max_idle_seconds
+        now = time.monotonic()
+        to_close = []
+        with self._lock:
+            for subdomain, last_used in list(self._last_used.items()):
+                if now - last_used >= max_idle and not self._in_use.get(id(self._sessions[subdomain])):
+                    to_close.append(self._sessions.pop(subdomain))
+                    del self._last_used[subdomain]
+        for session in to_close:
+            session.close()
+        if to_close:
+            logger.info(f"🔌 {len(to_close)} sessões HTTP ociosas fechadas")
+        return len(to_close)
+
+    def close_all(self):
+        """Fecha todas as sessões abertas (exceto as com requisições em andamento)"""
+        self.close_idle(max_idle_seconds=0)
+
+
+# Pool compartilhado por todo o processo
+session_pool = KommoSessionPool()
+
+
+def get_session(subdomain: str) -> requests.Session:
+    """Atalho para obter a sessão do pool compartilhado"""
+    return session_pool.get_session(subdomain)
+
+
+def close_idle_sessions(max_idle_seconds: Optional[float] = None) -> int:
+    """Atalho para fechar sessões ociosas do pool compartilhado"""
+    return session_pool.close_idle(max_idle_seconds)
@@ -0,0 +1,298 @@
+import contextvars
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.database import db
+from src.models.kommo_account import SyncJob
+from src.services.job_events import job_events
+
+logger = logging.getLogger(__name__)
+
+# Sincronizações executadas ao mesmo tempo; as demais ficam na fila
+DEFAULT_JOB_WORKERS = int(os.getenv('KOMMO_JOB_WORKERS', '2'))
+# Intervalo mínimo (s) entre gravações do progresso de um job no banco
+PROGRESS_WRITE_INTERVAL = float(os.getenv('KOMMO_JOB_PROGRESS_INTERVAL', '1.0'))
+
+FINISHED_STATUSES = ('completed', 'failed', 'cancelled')
+
+_current_job: contextvars.ContextVar = contextvars.ContextVar('current_sync_job', default=None)
+
+
+def worker_id() -> str:
+    """Identificação do processo atual (host:pid) - cada worker do gunicorn tem a sua"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def worker_is_alive(worker: Optional[str]) -> bool:
+    """Se o processo dono de um job/status ainda existe (processos de outros hosts são considerados vivos)"""
+    if not worker or ':' not in worker:
+        return False
+    host, pid = worker.rsplit(':', 1)
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, ValueError):
+        return True
+    return True
+
+
+class JobHandle:
+    """Estado em memória de um job em execução: cancelamento e progresso"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.cancel_event = threading.Event()
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def report_progress(self, progress: Optional[float] = None, operation: Optional[str] = None, force: bool = False):
+        """Grava o progresso no banco (no máximo a cada PROGRESS_WRITE_INTERVAL segundos)"""
+        values = {}
+        if progress is not None:
+            values['progress'] = float(progress)
+        if operation is not None:
+            values['current_operation'] = str(operation)
+        if not values:
+            return
+
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._last_write < PROGRESS_WRITE_INTERVAL:
+                return
+            self._last_write = now
+
+        # Conexão própria: não interfere na sessão (e nas transações) da sincronização
+        table = SyncJob.__table__
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.update().where(table.c.id == self.job_id).values(**values))
+                # Cancelamento pedido por outro worker (a requisição pode ter caído em outro processo)
+                cancel_requested = connection.execute(
+                    db.select(table.c.cancel_requested).where(table.c.id == self.job_id)
+                ).scalar()
+            if cancel_requested and not self.cancelled:
+                logger.info(f"🛑 Cancelamento do job {self.job_id} recebido de outro worker")
+                self.cancel_event.set()
+        except Exception as e:
+            logger.debug(f"Não foi possível gravar o progresso do job {self.job_id}: {e}")
+
+
+def current_job() -> Optional[JobHandle]:
+    """Job em execução no contexto atual (None fora de um job)"""
+    return _current_job.get()
+
+
+def current_cancel_event() -> Optional[threading.Event]:
+    """Evento de cancelamento do job atual, para repassar ao KommoSyncService"""
+    job = current_job()
+    return job.cancel_event if job else None
+
+
+def _response_payload(response: Any) -> Tuple[Dict, int]:
+    """Converte o retorno de uma rota (Response ou (Response, status)) em (json, status)"""
+    status_code = None
+    if isinstance(response, tuple):
+        response, status_code = response[0], response[1]
+    if hasattr(response, 'get_json'):
+        payload = response.get_json(silent=True) or {}
+        status_code = status_code or response.status_code
+    else:
+        payload = response if isinstance(response, dict) else {'result': response}
+    return payload, status_code or 200
+
+
+def job_to_dict(job: SyncJob) -> Dict:
+    return {
+        'id': job.id,
+        'job_type': job.job_type,
+        'status': job.status,
+        'params': json.loads(job.params) if job.params else {},
+        'progress': job.progress or 0,
+        'current_operation': job.current_operation,
+        'result': json.loads(job.result) if job.result else None,
+        'error': job.error,
+        'cancel_requested': bool(job.cancel_requested),
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'completed_at': job.completed_at.isoformat() if job.completed_at else None
+    }
+
+
+class SyncJobEngine:
+    """
+    Executa sincronizações fora da thread da requisição HTTP.
+
+    submit() grava o job como 'queued' e o entrega a um pool limitado de workers; cada job
+    roda com um app context próprio e recebe tudo o que precisa nos argumentos (não há
+    requisição HTTP no worker). Estado, progresso e resultado ficam na tabela sync_jobs.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or DEFAULT_JOB_WORKERS
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._handles: Dict[str, JobHandle] = {}
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='sync-job')
+            return self._executor
+
+    def recover_interrupted(self) -> List[str]:
+        """Marca como falhos os jobs na fila ou rodando cujo processo (worker) não existe mais"""
+        jobs = [job for job in SyncJob.query.filter(SyncJob.status.in_(['queued', 'running'])).all()
+                if not worker_is_alive(job.worker)]
+        for job in jobs:
+            job.status = 'failed'
+            job.error = 'Interrompido: o servidor foi reiniciado durante a execução'
+            job.completed_at = datetime.utcnow()
+        if jobs:
+            db.session.commit()
+            logger.warning(f"⚠️ {len(jobs)} jobs de sincronização interrompidos por reinício marcados como falhos")
+        return [job.id for job in jobs]
+
+    def submit(self, app, job_type: str, target: Callable, args: Tuple = (), params: Optional[Dict] = None) -> Dict:
+        """
+        Enfileira target(*args) e retorna o job criado.
+
+        Args:
+            app: aplicação Flask (current_app._get_current_object())
+            params: parâmetros gravados no job (para consulta)
+        """
+        job = SyncJob(id=uuid.uuid4().hex, job_type=job_type, status='queued',
+                      params=json.dumps(params or {}, default=str), progress=0,
+                      current_operation='Aguardando na fila', worker=worker_id())
+        db.session.add(job)
+        db.session.commit()
+
+        handle = JobHandle(job.id)
+        with self._lock:
+            self._handles[job.id] = handle
+            # Futures de jobs já finalizados não são mais necessários
+            self._futures = {job_id: future for job_id, future in self._futures.items() if not future.done()}
+        future = self._get_executor().submit(self._run, app, handle, target, args)
+        with self._lock:
+            self._futures[job.id] = future
+
+        logger.info(f"📥 Job {job.id} ({job_type}) enfileirado")
+        return job_to_dict(job)
+
+    def _run(self, app, handle: JobHandle, target: Callable, args: Tuple):
+        token = _current_job.set(handle)
+        try:
+            with app.app_context():
+                try:
+                    job = db.session.get(SyncJob, handle.job_id)
+                    if job is None:
+                        return
+                    if handle.cancelled or job.cancel_requested or job.status == 'cancelled':
+                        self._finish(job, 'cancelled', error='Cancelado antes de iniciar')
+                        return
+
+                    job.status = 'running'
+                    job.worker = worker_id()
+                    job.started_at = datetime.utcnow()
+                    job.current_operation = 'Iniciando'
+                    db.session.commit()
+                    job_events.publish(handle.job_id, 'job', {'status': 'running', 'started_at': job.started_at.isoformat()})
+                    logger.info(f"▶️ Job {handle.job_id} ({job.job_type}) iniciado")
+
+                    try:
+                        payload, status_code = _response_payload(target(*args))
+                    except Exception as e:
+                        logger.error(f"Erro no job {handle.job_id}: {e}")
+                        db.session.rollback()
+                        payload, status_code = {'success': False, 'error': str(e)}, 500
+
+                    job = db.session.get(SyncJob, handle.job_id)
+                    if handle.cancelled:
+                        status = 'cancelled'
+                    elif payload.get('success', status_code < 400) and status_code < 400:
+                        status = 'completed'
+                    else:
+                        status = 'failed'
+                    self._finish(job, status, result=payload, error=payload.get('error'))
+                finally:
+                    db.session.remove()
+        finally:
+            _current_job.reset(token)
+            with self._lock:
+                self._handles.pop(handle.job_id, None)
+
+    def _finish(self, job: SyncJob, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        job.status = status
+        job.completed_at = datetime.utcnow()
+        if status == 'completed':
+            job.progress = 100
+        if result is not None:
+            job.result = json.dumps(result, default=str)
+        if error:
+            job.error = str(error)
+        db.session.commit()
+        job_events.publish(job.id, 'done', job_to_dict(job))
+        logger.info(f"🏁 Job {job.id} finalizado: {status}")
+
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancela um job: na fila ele não chega a rodar; em execução a sincronização para no próximo ponto de verificação"""
+        job = db.session.get(SyncJob, job_id)
+        if job is None:
+            return None
+        if job.status in FINISHED_STATUSES:
+            return job_to_dict(job)
+
+        job.cancel_requested = True
+        if job.status == 'queued':
+            job.status = 'cancelled'
+            job.completed_at = datetime.utcnow()
+        db.session.commit()
+
+        with self._lock:
+            handle = self._handles.get(job_id)
+        if handle:
+            handle.cancel_event.set()
+        logger.info(f"🛑 Cancelamento solicitado para o job {job_id}")
+        return job_to_dict(job)
+
+    def cancel_all(self) -> List[str]:
+        """Cancela todos os jobs na fila ou em execução"""
+        job_ids = [job.id for job in SyncJob.query.filter(SyncJob.status.in_(['queued', 'running'])).all()]
+        for job_id in job_ids:
+            self.cancel(job_id)
+        return job_ids
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = db.session.get(SyncJob, job_id)
+        return job_to_dict(job) if job else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        query = SyncJob.query
+        if status:
+            query = query.filter_by(status=status)
+        return [job_to_dict(job) for job in query.order_by(SyncJob.created_at.desc()).limit(limit).all()]
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> bool:
+        """Aguarda o fim de um job submetido por este processo"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is None:
+            job = db.session.get(SyncJob, job_id)
+            return job is not None and job.status in FINISHED_STATUSES
+        future.result(timeout=timeout)
+        return True
@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Eventos guardados por job (para clientes que reconectam com Last-Event-ID)
+EVENTS_PER_JOB = int(os.getenv('KOMMO_JOB_EVENTS_BUFFER', '200'))
+# Jobs finalizados cujos eventos continuam em memória
+FINISHED_JOBS_KEPT = int(os.getenv('KOMMO_JOB_EVENTS_FINISHED_KEPT', '50'))
+
+
+class _JobStream:
+    def __init__(self):
+        self.events: deque = deque(maxlen=EVENTS_PER_JOB)
+        self.next_id = 1
+        self.finished = False
+
+
+class JobEventBus:
+    """
+    Eventos de progresso dos jobs executados neste processo.
+
+    publish() é chamado pelas threads da sincronização; as conexões SSE esperam na
+    Condition e recebem só os eventos novos (deltas), sem consultar o banco.
+    """
+
+    def __init__(self):
+        self._streams: 'OrderedDict[str, _JobStream]' = OrderedDict()
+        self._condition = threading.Condition()
+
+    def publish(self, job_id: str, event: str, data: Dict):
+        with self._condition:
+            stream = self._streams.get(job_id)
+            if stream is None:
+                stream = self._streams[job_id] = _JobStream()
+            stream.events.append((stream.next_id, event, data))
+            stream.next_id += 1
+            if event == 'done':
+                stream.finished = True
+                self._prune()
+            self._condition.notify_all()
+
+    def _prune(self):
+        finished = [job_id for job_id, stream in self._streams.items() if stream.finished]
+        for job_id in finished[:max(0, len(finished) - FINISHED_JOBS_KEPT)]:
+            del self._streams[job_id]
+
+    def is_local(self, job_id: str) -> bool:
+        """Se o job publicou eventos neste processo"""
+        with self._condition:
+            return job_id in self._streams
+
+    def last_id(self, job_id: str) -> int:
+        """Id do último evento publicado pelo job (0 se nenhum)"""
+        with self._condition:
+            stream = self._streams.get(job_id)
+            return stream.next_id - 1 if stream else 0
+
+    def wait(self, job_id: str, after_id: int = 0, timeout: float = 15.0) -> List[Tuple[int, str, Dict]]:
+        """Eventos do job com id > after_id; espera até timeout segundos se ainda não houver"""
+        def pending():
+            stream = self._streams.get(job_id)
+            return [item for item in stream.events if item[0] > after_id] if stream else []
+
+        with self._condition:
+            events = pending()
+            if not events:
+                self._condition.wait(timeout)
+                events = pending()
+            return events
+
+
+def format_sse(data: Dict, event: Optional[str] = None, event_id: Optional[int] = None) -> str:
+    """Mensagem no formato text/event-stream"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def status_delta(previous: Dict, current: Dict) -> Dict:
+    """Campos do status que mudaram"""
+    return {key: value for key, value in current.items() if previous.get(key) != value}
+
+
+job_events = JobEventBus()
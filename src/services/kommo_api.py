@@ -1,26 +1,201 @@
+import os
 import requests
 import time
-import re
 import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Callable
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Any, Callable, Iterator
 import logging
+from flask import current_app, has_app_context
 
 logger = logging.getLogger(__name__)
 
 # Imports para salvamento no banco
 from src.database import db
 from src.models.kommo_account import PipelineMapping, StageMapping, CustomFieldMapping
+from src.services.http_pool import session_pool
+from src.services.rate_limiter import get_rate_limiter
+from src.services.pacing import AdaptivePacer, get_pacer, pacers
+from src.services.phase_scheduler import DEFAULT_PHASE_WORKERS, Phase, run_phases
+from src.services.response_cache import ResponseCache, is_cache_miss
+from src.services.single_flight import SingleFlight
+from src.services.retry_policy import RetryPolicy, RetryStats, DEFAULT_RETRY_POLICY, retry_reason, select_retry_policy
+from src.services.config_diff import ConfigDiff, diff_master_configs
+from src.services.field_matching import CustomFieldMatchIndex, types_compatible
+from src.services.slave_topology import SlaveTopology
+from src.services.sync_checkpoints import SharedMappings, SlaveSyncCheckpoint, SyncCheckpointStore, checkpoint_key
+from src.services.desired_state import (SYSTEM_FIELD_CODES, compile_field_template, compile_stage_payloads,
+                                        get_desired_state, should_ignore_stage)
+
+
+def build_task_types_form_data(task_types_data: List[Dict], types_to_delete: Optional[List[int]] = None) -> str:
+    """Monta o form data do endpoint AJAX /ajax/tasks/types (ACTION=ALL_EDIT)"""
+    form_parts = []
+    
+    # Adicionar novos tipos
+    for i, task_type in enumerate(task_types_data):
+        form_parts.append(f"add[{i}][sort]={task_type.get('sort', i)}")
+        form_parts.append(f"add[{i}][icon_id]={task_type.get('icon_id', 0)}")
+        form_parts.append(f"add[{i}][color]={task_type.get('color', '568FFA')}")
+        form_parts.append(f"add[{i}][name]={task_type.get('name', '')}")
+    
+    # Adicionar tipos para deletar
+    if types_to_delete:
+        for type_id in types_to_delete:
+            form_parts.append(f"delete[]={type_id}")
+    
+    # Adicionar action
+    form_parts.append("ACTION=ALL_EDIT")
+    
+    return "&".join(form_parts)
+
 
 class KommoAPIService:
     """Serviço para interagir com a API do Kommo usando refresh_token diretamente nos headers"""
     
-    def __init__(self, subdomain: str, refresh_token: str):
+    # O Kommo pagina as listagens em 50 itens por padrão e aceita no máximo 250 por página
+    MAX_PAGE_LIMIT = 250
+    # Máximo de itens por POST/PATCH em lote nos endpoints de campos personalizados e estágios
+    CUSTOM_FIELDS_BATCH_LIMIT = 50
+    STAGES_BATCH_LIMIT = 50
+    # Buscas de estágios simultâneas em get_pipelines(with_descriptions=True)
+    STAGE_FETCH_WORKERS = int(os.getenv('KOMMO_STAGE_FETCH_WORKERS', '4'))
+    
+    def __init__(self, subdomain: str, refresh_token: str, retry_policy: Optional[RetryPolicy] = None,
+                 endpoint_retry_policies: Optional[Dict[str, RetryPolicy]] = None):
         self.subdomain = subdomain
         self.refresh_token = refresh_token
         self.base_url = f"https://{subdomain}.kommo.com/api/v4"
+        # Sessão keep-alive compartilhada por todas as instâncias do mesmo subdomínio; obtida do pool
+        # a cada requisição (ver session), salvo se uma sessão própria for atribuída
+        self._session: Optional[requests.Session] = None
+        self.timeout = session_pool.timeout
+        # Token bucket compartilhado por conta - todas as chamadas consomem um token
+        self.rate_limiter = get_rate_limiter(subdomain)
+        # Ritmo adaptativo da conta (alimentado com o status e a latência de cada resposta)
+        self.pacer = get_pacer(subdomain)
+        # Política de retry padrão + sobrescritas por endpoint.
+        # Chaves no formato '/leads/pipelines' ou 'POST /leads/custom_fields' (prefixo mais longo vence)
+        self.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+        self.endpoint_retry_policies = endpoint_retry_policies or {}
+        self.retry_stats = RetryStats()
+        # Cache de respostas GET desta conta (invalidado pelas escritas feitas por esta instância)
+        self.cache = ResponseCache()
+        # GETs idênticos em andamento ao mesmo tempo (várias threads) viram uma única requisição
+        self.single_flight = SingleFlight()
+        # Descoberto em tempo de execução (ver update_pipeline_stages)
+        self.bulk_stage_update_supported = True
+    
+    def invalidate_cache(self, prefix: Optional[str] = None) -> int:
+        """Descarta o cache de respostas (inteiro ou apenas os endpoints sob `prefix`)"""
+        return self.cache.clear(prefix)
+    
+    def _cached_call(self, method: str, endpoint: str, params: Optional[Dict], use_cache: bool,
+                     send: Callable[[], Any]) -> Any:
+        """Leitura via cache e single-flight para GET; escritas invalidam as entradas afetadas"""
+        if method.upper() == 'GET':
+            if use_cache:
+                cached = self.cache.get(endpoint, params)
+                if not is_cache_miss(cached):
+                    logger.debug(f"💾 Cache hit: GET {endpoint}")
+                    return cached
+            # A geração entra na chave: depois de uma escrita, novas leituras não se juntam
+            # a uma requisição iniciada antes dela
+            generation = self.cache.generation
+            flight_key = (ResponseCache.make_key(endpoint, params), generation)
+            result, shared = self.single_flight.do(flight_key, send)
+            if use_cache and not shared:
+                self.cache.set(endpoint, params, result, generation=generation)
+            return result
+        
+        try:
+            return send()
+        finally:
+            # Invalidar mesmo em caso de erro: a escrita pode ter sido aplicada parcialmente
+            self.cache.invalidate_for_write(endpoint)
     
-    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None, params: Optional[Dict] = None) -> Dict:
+    def _get_retry_policy(self, method: str, endpoint: str) -> RetryPolicy:
+        """Retorna a política de retry do endpoint (sobrescrita mais específica) ou a padrão"""
+        return select_retry_policy(self.retry_policy, self.endpoint_retry_policies, method, endpoint)
+    
+    @property
+    def session(self) -> requests.Session:
+        """Sessão HTTP usada nas requisições (a do pool do subdomínio, se nenhuma foi atribuída)"""
+        return self._session if self._session is not None else session_pool.get_session(self.subdomain)
+    
+    @session.setter
+    def session(self, session: requests.Session):
+        self._session = session
+    
+    def _request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Uma requisição HTTP, com a sessão do pool marcada como em uso enquanto ela dura"""
+        if self._session is not None:
+            return self._session.request(method, url, timeout=self.timeout, **kwargs)
+        with session_pool.session(self.subdomain) as session:
+            return session.request(method, url, timeout=self.timeout, **kwargs)
+    
+    def _send_with_retry(self, method: str, url: str, endpoint: str, **kwargs) -> requests.Response:
+        """
+        Envia a requisição respeitando rate limit e política de retry.
+        
+        Falhas transitórias (429, 5xx, timeouts, conexões resetadas) são repetidas com
+        backoff exponencial até max_attempts; falhas permanentes retornam/lançam na hora.
+        """
+        policy = self._get_retry_policy(method, endpoint)
+        attempt = 1
+        
+        while True:
+            self.rate_limiter.acquire()
+            self.retry_stats.record_request()
+            started = time.monotonic()
+            try:
+                response = self._request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                self.pacer.record_failure()
+                if policy.should_retry(attempt, method, exception=e):
+                    delay = policy.backoff(attempt)
+                    self.retry_stats.record_retry(retry_reason(exception=e))
+                    logger.warning(f"🔁 Falha transitória em {method} {url} ({type(e).__name__}). "
+                                   f"Tentativa {attempt}/{policy.max_attempts}, aguardando {delay:.1f}s...")
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+                if policy.classify(method, exception=e) == 'transient':
+                    self.retry_stats.record_gave_up()
+                raise
+            
+            logger.debug(f"Status da resposta: {response.status_code}")
+            self.pacer.record_response(response.status_code, time.monotonic() - started)
+            
+            if policy.should_retry(attempt, method, status_code=response.status_code):
+                retry_after = None
+                if response.headers.get('Retry-After', '').isdigit():
+                    retry_after = int(response.headers['Retry-After'])
+                delay = policy.backoff(attempt, retry_after)
+                self.retry_stats.record_retry(retry_reason(status_code=response.status_code))
+                if response.status_code == 429:
+                    logger.warning(f"Rate limit atingido. Aguardando {delay:.1f} segundos...")
+                    # Pausar o bucket da conta para que todas as threads aguardem juntas
+                    self.rate_limiter.pause(delay)
+                else:
+                    logger.warning(f"🔁 HTTP {response.status_code} em {method} {url}. "
+                                   f"Tentativa {attempt}/{policy.max_attempts}, aguardando {delay:.1f}s...")
+                    time.sleep(delay)
+                attempt += 1
+                continue
+            
+            if policy.classify(method, status_code=response.status_code) == 'transient':
+                # Esgotou as tentativas para um erro transitório
+                self.retry_stats.record_gave_up()
+            return response
+    
+    def _make_request(self, method: str, endpoint: str, data: Optional[Dict] = None, params: Optional[Dict] = None,
+                      use_cache: bool = True) -> Dict:
+        """Faz uma requisição para a API do Kommo (GETs passam pelo cache de respostas)"""
+        return self._cached_call(method, endpoint, params, use_cache,
+                                 lambda: self._send_request(method, endpoint, data, params))
+    
+    def _send_request(self, method: str, endpoint: str, data: Optional[Dict] = None, params: Optional[Dict] = None) -> Dict:
         """Faz uma requisição para a API do Kommo usando refresh_token diretamente nos headers"""
         url = f"{self.base_url}/{endpoint.lstrip('/')}"
         
@@ -34,16 +209,7 @@ class KommoAPIService:
         logger.debug(f"Usando refresh_token: {self.refresh_token[:20]}...")
         
         try:
-            response = requests.request(method, url, json=data, params=params, headers=headers)
-            
-            logger.debug(f"Status da resposta: {response.status_code}")
-            
-            # Tratamento de rate limiting
-            if response.status_code == 429:
-                retry_after = int(response.headers.get('Retry-After', 60))
-                logger.warning(f"Rate limit atingido. Aguardando {retry_after} segundos...")
-                time.sleep(retry_after)
-                return self._make_request(method, endpoint, data, params)
+            response = self._send_with_retry(method, url, endpoint, json=data, params=params, headers=headers)
             
             # Log detalhado em caso de erro
             if not response.ok:
@@ -76,21 +242,31 @@ class KommoAPIService:
             logger.error(f"Conteúdo da resposta: '{response.text}'")
             raise
     
-    def get_pipelines(self, with_descriptions: bool = False) -> List[Dict]:
-        """Obtém todos os pipelines da conta"""
-        response = self._make_request('GET', '/leads/pipelines')
+    def get_pipelines(self, with_descriptions: bool = False, max_workers: int = STAGE_FETCH_WORKERS,
+                      use_cache: bool = True) -> List[Dict]:
+        """
+        Obtém todos os pipelines da conta.
+        
+        Com with_descriptions=True os estágios de cada pipeline (com descrições) são buscados
+        uma única vez, em paralelo (limitado por max_workers e pelo rate limiter da conta),
+        e gravados em pipeline['_embedded']['statuses'].
+        """
+        response = self._make_request('GET', '/leads/pipelines', use_cache=use_cache)
         pipelines = response.get('_embedded', {}).get('pipelines', [])
         
         # Se solicitado, buscar descrições dos stages para cada pipeline
-        if with_descriptions:
+        if with_descriptions and pipelines:
             logger.info(f"🔍 Buscando descrições para {len(pipelines)} pipelines...")
-            for pipeline in pipelines:
-                pipeline_id = pipeline['id']
+            workers = max(1, min(max_workers, len(pipelines)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                stages_per_pipeline = list(executor.map(
+                    lambda pipeline: self.get_pipeline_stages(pipeline['id'], with_descriptions=True), pipelines
+                ))
+            
+            for pipeline, stages_with_descriptions in zip(pipelines, stages_per_pipeline):
                 pipeline_name = pipeline['name']
-                logger.debug(f"🔍 Buscando descrições para pipeline '{pipeline_name}' (ID: {pipeline_id})")
-                stages_with_descriptions = self.get_pipeline_stages(pipeline_id, with_descriptions=True)
                 # Atualizar os stages do pipeline com as descrições
-                pipeline['_embedded']['statuses'] = stages_with_descriptions
+                pipeline.setdefault('_embedded', {})['statuses'] = stages_with_descriptions
                 
                 # Log das descrições encontradas
                 for stage in stages_with_descriptions:
@@ -152,14 +328,107 @@ class KommoAPIService:
         """Deleta um estágio de pipeline"""
         return self._make_request('DELETE', f'/leads/pipelines/{pipeline_id}/statuses/{stage_id}')
     
+    def create_pipeline_stages(self, pipeline_id: int, stages_data: List[Dict]) -> List[Dict]:
+        """Cria vários estágios em um pipeline com uma única requisição. Retorna os estágios criados."""
+        response = self._make_request('POST', f'/leads/pipelines/{pipeline_id}/statuses', data=stages_data)
+        return self._extract_embedded(response, 'statuses')
+    
+    def update_pipeline_stages(self, pipeline_id: int, stages_data: List[Dict]) -> List[Dict]:
+        """
+        Atualiza vários estágios com um PATCH na coleção (cada item precisa do 'id').
+        
+        Nem todas as contas aceitam o PATCH em lote; se a API responder 404/405 isso é
+        lembrado na instância e as próximas chamadas atualizam estágio por estágio.
+        """
+        if self.bulk_stage_update_supported:
+            try:
+                response = self._make_request('PATCH', f'/leads/pipelines/{pipeline_id}/statuses', data=stages_data)
+                return self._extract_embedded(response, 'statuses')
+            except requests.exceptions.HTTPError as e:
+                status_code = getattr(e.response, 'status_code', None)
+                if status_code not in (404, 405):
+                    raise
+                logger.info(f"ℹ️ PATCH em lote de estágios não suportado em {self.subdomain} - usando atualização individual")
+                self.bulk_stage_update_supported = False
+        
+        return [self.update_pipeline_stage(pipeline_id, stage['id'], {k: v for k, v in stage.items() if k != 'id'})
+                for stage in stages_data]
+    
+    @staticmethod
+    def _extract_embedded(response: Any, embedded_key: str) -> List[Dict]:
+        """Extrai os itens de uma página de listagem (suporta as estruturas alternativas da API)"""
+        if isinstance(response, list):
+            return response
+        items = response.get('_embedded', {}).get(embedded_key)
+        if items is None:
+            items = response.get(embedded_key, [])
+        return items or []
+    
+    def _iter_collection(self, endpoint: str, embedded_key: str, params: Optional[Dict] = None,
+                         limit: int = MAX_PAGE_LIMIT, prefetch: bool = False) -> Iterator[Dict]:
+        """
+        Percorre todas as páginas de uma listagem da API v4, seguindo _links.next.
+        
+        Args:
+            endpoint: Endpoint da listagem (ex: '/leads/custom_fields')
+            embedded_key: Chave dos itens dentro de _embedded
+            params: Parâmetros extras da query
+            limit: Itens por página (máximo 250)
+            prefetch: Busca a próxima página em paralelo enquanto a atual é consumida
+        """
+        limit = max(1, min(int(limit), self.MAX_PAGE_LIMIT))
+        base_params = dict(params or {})
+        
+        def fetch(page: int) -> Any:
+            return self._make_request('GET', endpoint, params={**base_params, 'page': page, 'limit': limit})
+        
+        executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            page = 1
+            response = fetch(page)
+            while True:
+                items = self._extract_embedded(response, embedded_key)
+                has_next = bool(items) and isinstance(response, dict) and bool(response.get('_links', {}).get('next'))
+                
+                next_page = executor.submit(fetch, page + 1) if (has_next and executor) else None
+                
+                for item in items:
+                    yield item
+                
+                if not has_next:
+                    break
+                page += 1
+                response = next_page.result() if next_page else fetch(page)
+            
+            if page > 1:
+                logger.debug(f"📄 {endpoint}: {page} páginas lidas (limit={limit})")
+        finally:
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+    
+    def iter_custom_fields(self, entity_type: str, limit: int = MAX_PAGE_LIMIT, prefetch: bool = False) -> Iterator[Dict]:
+        """Itera sobre todos os campos personalizados de uma entidade, página por página"""
+        # Parâmetros para obter informações completas dos campos (required_statuses e enums)
+        params = {'with': 'required_statuses,enums'}
+        return self._iter_collection(f'/{entity_type}/custom_fields', 'custom_fields', params, limit, prefetch)
+    
+    def iter_custom_field_groups(self, entity_type: str, limit: int = MAX_PAGE_LIMIT,
+                                 prefetch: bool = False) -> Iterator[Dict]:
+        """Itera sobre todos os grupos de campos personalizados de uma entidade"""
+        return self._iter_collection(f'/{entity_type}/custom_fields/groups', 'custom_field_groups',
+                                     limit=limit, prefetch=prefetch)
+    
+    def iter_users(self, limit: int = MAX_PAGE_LIMIT, prefetch: bool = False) -> Iterator[Dict]:
+        """Itera sobre todos os usuários da conta"""
+        return self._iter_collection('/users', 'users', limit=limit, prefetch=prefetch)
+    
+    def iter_roles(self, limit: int = MAX_PAGE_LIMIT, prefetch: bool = False) -> Iterator[Dict]:
+        """Itera sobre todas as roles da conta"""
+        return self._iter_collection('/roles', 'roles', limit=limit, prefetch=prefetch)
+    
     def get_custom_fields(self, entity_type: str) -> List[Dict]:
         """Obtém todos os campos personalizados para uma entidade (leads, contacts, companies)"""
-        # Adicionar parâmetros para obter informações completas dos campos
-        params = {
-            'with': 'required_statuses,enums'  # Tentar obter required_statuses e enums
-        }
-        response = self._make_request('GET', f'/{entity_type}/custom_fields', params=params)
-        fields = response.get('_embedded', {}).get('custom_fields', [])
+        fields = list(self.iter_custom_fields(entity_type, prefetch=True))
         
         # Log para debug
         logger.debug(f"Obtidos {len(fields)} campos para {entity_type}")
@@ -173,24 +442,15 @@ class KommoAPIService:
         """Obtém todos os grupos de campos personalizados para uma entidade"""
         try:
             # A API do Kommo para grupos pode usar diferentes endpoints
-            # Tentar primeiro o endpoint padrão
-            response = self._make_request('GET', f'/{entity_type}/custom_fields/groups')
-            logger.debug(f"Resposta bruta da API para grupos de {entity_type}: {response}")
-            
-            # Tentar diferentes estruturas de resposta
-            groups = response.get('_embedded', {}).get('custom_field_groups', [])
-            if not groups:
-                # Tentar estrutura alternativa
-                groups = response.get('custom_field_groups', [])
-            if not groups:
-                # Se ainda não encontrou, verificar se é uma lista direta
-                if isinstance(response, list):
-                    groups = response
+            # Tentar primeiro o endpoint padrão (todas as páginas; estruturas alternativas
+            # de resposta são tratadas em _extract_embedded)
+            groups = list(self.iter_custom_field_groups(entity_type))
+            response = {'_embedded': {'custom_field_groups': groups}}
             if not groups:
                 # Tentar endpoint alternativo se o primeiro não retornou nada
                 logger.warning(f"Nenhum grupo encontrado no endpoint padrão para {entity_type}, tentando endpoint alternativo...")
                 response = self._make_request('GET', f'/api/v4/{entity_type}/custom_fields/groups')
-                groups = response.get('_embedded', {}).get('custom_field_groups', [])
+                groups = self._extract_embedded(response, 'custom_field_groups')
             
             logger.info(f"Encontrados {len(groups)} grupos de campos para {entity_type}")
             if groups:
@@ -224,6 +484,16 @@ class KommoAPIService:
         """Atualiza um campo personalizado existente"""
         return self._make_request('PATCH', f'/{entity_type}/custom_fields/{field_id}', data=field_data)
     
+    def create_custom_fields(self, entity_type: str, fields_data: List[Dict]) -> List[Dict]:
+        """Cria vários campos em uma única requisição (máximo CUSTOM_FIELDS_BATCH_LIMIT). Retorna os campos criados."""
+        response = self._make_request('POST', f'/{entity_type}/custom_fields', data=fields_data)
+        return self._extract_embedded(response, 'custom_fields')
+    
+    def update_custom_fields(self, entity_type: str, fields_data: List[Dict]) -> List[Dict]:
+        """Atualiza vários campos em uma única requisição (cada item precisa do 'id')"""
+        response = self._make_request('PATCH', f'/{entity_type}/custom_fields', data=fields_data)
+        return self._extract_embedded(response, 'custom_fields')
+    
     def delete_custom_field(self, entity_type: str, field_id: int) -> Dict:
         """Deleta um campo personalizado"""
         return self._make_request('DELETE', f'/{entity_type}/custom_fields/{field_id}')
@@ -235,8 +505,7 @@ class KommoAPIService:
     # Funções para trabalhar com usuários e roles
     def get_users(self) -> List[Dict]:
         """Obtém todos os usuários da conta"""
-        response = self._make_request('GET', '/users')
-        return response.get('_embedded', {}).get('users', [])
+        return list(self.iter_users())
     
     def get_user(self, user_id: int) -> Dict:
         """Obtém informações de um usuário específico"""
@@ -244,8 +513,7 @@ class KommoAPIService:
     
     def get_roles(self) -> List[Dict]:
         """Obtém todas as roles (funções/permissões) da conta"""
-        response = self._make_request('GET', '/roles')
-        return response.get('_embedded', {}).get('roles', [])
+        return list(self.iter_roles())
     
     def get_role(self, role_id: int) -> Dict:
         """Obtém informações de uma role específica"""
@@ -282,13 +550,19 @@ class KommoAPIService:
     def test_connection(self) -> bool:
         """Testa se a conexão com a API está funcionando"""
         try:
-            self._make_request('GET', '/account')
+            self._make_request('GET', '/account', use_cache=False)
             return True
         except Exception as e:
             logger.error(f"Falha no teste de conexão: {e}")
             return False
     
-    def _make_ajax_request(self, method: str, endpoint: str, data: Optional[Dict] = None, form_data: Optional[str] = None) -> Dict:
+    def _make_ajax_request(self, method: str, endpoint: str, data: Optional[Dict] = None, form_data: Optional[str] = None,
+                           use_cache: bool = True) -> Dict:
+        """Faz uma requisição AJAX (GETs passam pelo cache de respostas)"""
+        return self._cached_call(method, endpoint, None, use_cache,
+                                 lambda: self._send_ajax_request(method, endpoint, data, form_data))
+    
+    def _send_ajax_request(self, method: str, endpoint: str, data: Optional[Dict] = None, form_data: Optional[str] = None) -> Dict:
         """Faz uma requisição AJAX para endpoints específicos que não usam a API v4"""
         url = f"https://{self.subdomain}.kommo.com{endpoint}"
         
@@ -308,18 +582,12 @@ class KommoAPIService:
         
         try:
             if form_data:
-                response = requests.request(method, url, data=data, headers=headers)
+                response = self._send_with_retry(method, url, endpoint, data=data, headers=headers)
             else:
-                response = requests.request(method, url, json=data, headers=headers)
+                response = self._send_with_retry(method, url, endpoint, json=data, headers=headers)
             
             logger.debug(f"Status da resposta AJAX: {response.status_code}")
             
-            if response.status_code == 429:
-                retry_after = int(response.headers.get('Retry-After', 60))
-                logger.warning(f"Rate limit atingido. Aguardando {retry_after} segundos...")
-                time.sleep(retry_after)
-                return self._make_ajax_request(method, endpoint, data, form_data)
-            
             if not response.ok:
                 logger.error(f"Erro HTTP {response.status_code} para {url}")
                 logger.error(f"Resposta: {response.text}")
@@ -340,25 +608,7 @@ class KommoAPIService:
         """Atualiza os tipos de tarefas usando form data"""
         logger.debug(f"Atualizando task types para {self.subdomain}")
         
-        # Construir form data
-        form_parts = []
-        
-        # Adicionar novos tipos
-        for i, task_type in enumerate(task_types_data):
-            form_parts.append(f"add[{i}][sort]={task_type.get('sort', i)}")
-            form_parts.append(f"add[{i}][icon_id]={task_type.get('icon_id', 0)}")
-            form_parts.append(f"add[{i}][color]={task_type.get('color', '568FFA')}")
-            form_parts.append(f"add[{i}][name]={task_type.get('name', '')}")
-        
-        # Adicionar tipos para deletar
-        if types_to_delete:
-            for type_id in types_to_delete:
-                form_parts.append(f"delete[]={type_id}")
-        
-        # Adicionar action
-        form_parts.append("ACTION=ALL_EDIT")
-        
-        form_data = "&".join(form_parts)
+        form_data = build_task_types_form_data(task_types_data, types_to_delete)
         logger.debug(f"Form data: {form_data}")
         
         return self._make_ajax_request('POST', '/ajax/tasks/types', form_data=form_data)
@@ -366,20 +616,79 @@ class KommoAPIService:
 class KommoSyncService:
     """Serviço principal para sincronização entre contas Kommo"""
     
-    def __init__(self, master_api: KommoAPIService, batch_size: int = 10, delay_between_batches: float = 2.0):
+    # Seções da extração da master executadas ao mesmo tempo
+    EXTRACTION_WORKERS = int(os.getenv('KOMMO_EXTRACTION_WORKERS', '4'))
+    
+    def __init__(self, master_api: KommoAPIService, batch_size: int = 10, delay_between_batches: float = 0.0,
+                 cancel_event: Optional[threading.Event] = None, adaptive_pacing: bool = False,
+                 phase_workers: int = DEFAULT_PHASE_WORKERS):
         self.master_api = master_api
         self.entity_types = ['leads', 'contacts', 'companies']
         self.batch_size = batch_size  # Quantos itens processar por lote
-        self.delay_between_batches = delay_between_batches  # Delay em segundos entre lotes
-        self._stop_sync = False  # Flag para parar sincronização
-        
+        # Delay opcional entre lotes - o ritmo das chamadas já é controlado pelo rate limiter de cada conta
+        self.delay_between_batches = delay_between_batches
+        self._stop_requested = False  # Flag para parar sincronização
+        # Cancelamento externo (ex.: job em segundo plano) - não é zerado no início de cada sincronização
+        self.cancel_event = cancel_event
+        self.last_extraction_timings: Dict[str, float] = {}  # Tempo (s) de cada seção da última extração
+        # Checkpoint da sincronização completa em andamento (ver sync_all_to_slave)
+        self._checkpoint: Optional[SlaveSyncCheckpoint] = None
+        # Tamanho de lote e delay ajustados por conta (AIMD) - batch_size/delay_between_batches
+        # passam a ser apenas o ponto de partida de contas sem histórico
+        self.adaptive_pacing = adaptive_pacing
+        # Fases independentes de sync_all_to_slave executadas ao mesmo tempo (1 = sequencial)
+        self.phase_workers = phase_workers
+        # Dentro de sync_all_to_slave as fases não zeram a flag de parada (ver _reset_stop_flag)
+        self._in_full_sync = False
+        # Pipelines/estágios de cada escrava (por subdomínio) para validar required_statuses
+        self._topologies: Dict[str, SlaveTopology] = {}
+        
+    @property
+    def _stop_sync(self) -> bool:
+        return self._stop_requested or (self.cancel_event is not None and self.cancel_event.is_set())
+    
+    @_stop_sync.setter
+    def _stop_sync(self, value: bool):
+        self._stop_requested = value
+    
+    def _reset_stop_flag(self):
+        """
+        Zera a flag de parada no início de uma sincronização avulsa. Nas fases de sync_all_to_slave
+        (que rodam ao mesmo tempo) não: uma fase começando apagaria um stop_sync() pedido durante outra.
+        """
+        if not self._in_full_sync:
+            self._stop_sync = False
+    
     def stop_sync(self):
         """Para a sincronização em andamento"""
         self._stop_sync = True
         logger.info("🛑 Solicitação de parada da sincronização recebida")
     
+    def check_slave_connections(self, slave_accounts: List[Any], max_concurrency: int = 10) -> Dict[str, bool]:
+        """
+        Testa a conexão de várias contas escravas de uma vez.
+        
+        Usa o cliente assíncrono (um único event loop, sem uma thread por conta).
+        
+        Args:
+            slave_accounts: Lista de (subdomain, refresh_token)
+            max_concurrency: Número máximo de contas testadas ao mesmo tempo
+            
+        Returns:
+            Dicionário {subdomain: conexão_ok}
+        """
+        from src.services.kommo_api_async import run_for_accounts
+        
+        if not slave_accounts:
+            return {}
+        
+        logger.info(f"⚡ Testando conexão de {len(slave_accounts)} contas em paralelo...")
+        results = run_for_accounts(slave_accounts, lambda api: api.test_connection(), max_concurrency)
+        return {subdomain: result is True for (subdomain, _), result in zip(slave_accounts, results)}
+    
     def _process_in_batches(self, items: List[Any], process_func: Callable, operation_name: str, 
-                           results: Dict, progress_callback: Optional[Callable] = None) -> Dict:
+                           results: Dict, progress_callback: Optional[Callable] = None,
+                           pacer: Optional[AdaptivePacer] = None) -> Dict:
         """
         Processa uma lista de itens em lotes com delay entre eles
         
@@ -389,7 +698,13 @@ class KommoSyncService:
             operation_name: Nome da operação para logs
             results: Dicionário de resultados para atualizar
             progress_callback: Função opcional para callback de progresso
+            pacer: Ritmo adaptativo da conta escrava (ver _pacer_for). Quando informado, tamanho
+                   do lote e delay vêm dele e são reajustados ao fim de cada lote.
         """
+        # Retomada: itens concluídos em uma execução anterior não são processados de novo
+        if self._checkpoint is not None:
+            items = self._checkpoint.skip_completed(operation_name, items)
+        
         total_items = len(items)
         processed = 0
         
@@ -398,22 +713,30 @@ class KommoSyncService:
             return results
             
         logger.info(f"📦 Iniciando processamento em lotes: {total_items} {operation_name}")
-        logger.info(f"⚙️ Configuração: {self.batch_size} itens por lote, {self.delay_between_batches}s de delay")
+        if pacer is not None:
+            logger.info(f"⚙️ Ritmo adaptativo: {pacer.batch_size} itens por lote, {pacer.delay:.2f}s de delay (inicial)")
+        else:
+            logger.info(f"⚙️ Configuração: {self.batch_size} itens por lote, {self.delay_between_batches}s de delay")
         
-        # Dividir em lotes
-        for i in range(0, total_items, self.batch_size):
+        # Dividir em lotes (com ritmo adaptativo o tamanho pode mudar a cada lote)
+        i = 0
+        batch_num = 0
+        while i < total_items:
             if self._stop_sync:
                 logger.warning(f"🛑 Sincronização interrompida pelo usuário em {operation_name}")
                 break
-                
-            batch = items[i:i + self.batch_size]
-            batch_num = (i // self.batch_size) + 1
-            total_batches = (total_items + self.batch_size - 1) // self.batch_size
+            
+            batch_size = pacer.batch_size if pacer is not None else self.batch_size
+            batch = items[i:i + batch_size]
+            batch_num += 1
+            total_batches = batch_num + (total_items - i - len(batch) + batch_size - 1) // batch_size
             
             logger.info(f"📦 Processando lote {batch_num}/{total_batches} ({len(batch)} itens)")
             
             # Processar itens do lote atual
             batch_results = {'success': 0, 'errors': 0}
+            completed_keys = []
+            pacing_window = pacer.begin_batch() if pacer is not None else None
             for item in batch:
                 if self._stop_sync:
                     break
@@ -422,12 +745,22 @@ class KommoSyncService:
                     process_func(item, results)
                     batch_results['success'] += 1
                     processed += 1
+                    completed_keys.append(checkpoint_key(item))
                 except Exception as e:
                     logger.error(f"Erro ao processar item em {operation_name}: {e}")
                     batch_results['errors'] += 1
                     if 'errors' not in results:
                         results['errors'] = []
                     results['errors'].append(str(e))
+            i += len(batch)
+            
+            # Reajustar o ritmo da conta com o que aconteceu neste lote
+            if pacer is not None:
+                pacer.end_batch(pacing_window, batch_results['success'] + batch_results['errors'], batch_results['errors'])
+            
+            # Gravar os itens concluídos do lote (e os mapeamentos produzidos por eles)
+            if self._checkpoint is not None:
+                self._checkpoint.complete_items(operation_name, completed_keys)
             
             # Callback de progresso
             if progress_callback:
@@ -445,15 +778,51 @@ class KommoSyncService:
             logger.info(f"✅ Lote {batch_num} concluído: {batch_results['success']} sucessos, {batch_results['errors']} erros")
             
             # Delay entre lotes (exceto no último)
-            if i + self.batch_size < total_items and not self._stop_sync:
-                logger.info(f"⏳ Aguardando {self.delay_between_batches}s antes do próximo lote...")
-                time.sleep(self.delay_between_batches)
+            delay = pacer.delay if pacer is not None else self.delay_between_batches
+            if delay > 0 and i < total_items and not self._stop_sync:
+                logger.info(f"⏳ Aguardando {delay:.2f}s antes do próximo lote...")
+                if self.cancel_event is not None:
+                    self.cancel_event.wait(delay)
+                else:
+                    time.sleep(delay)
+        
+        if pacer is not None:
+            pacers.save(pacer)
         
         logger.info(f"📦 {operation_name} concluído: {processed}/{total_items} itens processados")
         return results
     
-    def extract_master_configuration(self) -> Dict[str, Any]:
-        """Extrai todas as configurações da conta mestre"""
+    def _topology_for(self, slave_api: KommoAPIService) -> SlaveTopology:
+        """Topologia (pipelines/estágios) da escrava, carregada na primeira consulta"""
+        topology = self._topologies.get(slave_api.subdomain)
+        if topology is None:
+            topology = SlaveTopology.load(slave_api)
+            self._topologies[slave_api.subdomain] = topology
+        return topology
+    
+    def _tracked_topology(self, slave_api: KommoAPIService) -> Optional[SlaveTopology]:
+        """Topologia já carregada da escrava (para registrar escritas de pipelines/estágios), sem carregá-la"""
+        return self._topologies.get(slave_api.subdomain)
+    
+    def _pacer_for(self, slave_api: KommoAPIService) -> Optional[AdaptivePacer]:
+        """Ritmo adaptativo da conta escrava (None se desativado nesta sincronização)"""
+        if not self.adaptive_pacing:
+            return None
+        return pacers.restore(slave_api.pacer, self.batch_size, self.delay_between_batches)
+    
+    def extract_master_configuration(self, parallel: bool = True, max_workers: int = EXTRACTION_WORKERS,
+                                     reuse_sections: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Extrai todas as configurações da conta mestre.
+        
+        As seções (pipelines, cada tipo de entidade, roles e task types) são independentes e,
+        com parallel=True, rodam em um pool limitado de threads - o rate limiter da conta
+        continua limitando as requisições. O tempo de cada seção fica em last_extraction_timings.
+        
+        Args:
+            reuse_sections: Seções já conhecidas (ex: de um snapshot) que não precisam ser buscadas,
+                            no formato retornado por master_config_sections()
+        """
         config = {
             'pipelines': [],
             'custom_fields': {},
@@ -462,6 +831,66 @@ class KommoSyncService:
             'roles': []
         }
         
+        sections = [('pipelines', self._extract_pipelines_section)]
+        sections += [(entity_type, lambda entity_type=entity_type: self._extract_entity_section(entity_type))
+                     for entity_type in self.entity_types]
+        sections += [('roles', self._extract_roles_section), ('task_types', self._extract_task_types_section)]
+        
+        reuse_sections = reuse_sections or {}
+        sections = [(name, extractor) for name, extractor in sections if name not in reuse_sections]
+        
+        timings = {}
+        
+        def run_section(name: str, extractor: Callable):
+            section_started = time.monotonic()
+            try:
+                return extractor()
+            finally:
+                timings[name] = round(time.monotonic() - section_started, 3)
+        
+        started_at = time.monotonic()
+        if parallel and max_workers > 1:
+            logger.info(f"⚡ Extraindo {len(sections)} seções da master em paralelo ({max_workers} workers)...")
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = [(name, executor.submit(run_section, name, extractor)) for name, extractor in sections]
+                # result() na ordem das seções: erros de pipelines/campos continuam interrompendo a extração
+                results = {name: future.result() for name, future in futures}
+        else:
+            results = {name: run_section(name, extractor) for name, extractor in sections}
+        timings['total'] = round(time.monotonic() - started_at, 3)
+        results.update(reuse_sections)
+        
+        config['pipelines'] = results['pipelines']
+        for entity_type in self.entity_types:
+            config['custom_field_groups'][entity_type] = results[entity_type]['custom_field_groups']
+            config['custom_fields'][entity_type] = results[entity_type]['custom_fields']
+        config['roles'] = results['roles']
+        config['task_types'] = results['task_types']
+        
+        self.last_extraction_timings = timings
+        logger.info(f"⏱️ Extração da master concluída em {timings['total']:.2f}s: "
+                    + ", ".join(f"{name}={seconds:.2f}s" for name, seconds in timings.items() if name != 'total'))
+        
+        return config
+    
+    def master_config_sections(self, master_config: Dict) -> Dict[str, Any]:
+        """Divide uma configuração extraída nas mesmas seções usadas por extract_master_configuration"""
+        sections = {
+            'pipelines': master_config.get('pipelines', []),
+            'roles': master_config.get('roles', []),
+            'task_types': master_config.get('task_types', {})
+        }
+        for entity_type in self.entity_types:
+            sections[entity_type] = {
+                'custom_field_groups': master_config.get('custom_field_groups', {}).get(entity_type, []),
+                'custom_fields': master_config.get('custom_fields', {}).get(entity_type, [])
+            }
+        return sections
+    
+    def _extract_pipelines_section(self) -> List[Dict]:
+        """Extrai pipelines e estágios (com descrições) da conta mestre"""
+        pipelines_config = []
+        
         # Extrair pipelines e seus estágios
         logger.info("🔍 Buscando pipelines da master COM DESCRIÇÕES...")
         pipelines = self.master_api.get_pipelines(with_descriptions=True)
@@ -477,9 +906,8 @@ class KommoSyncService:
                 'stages': []
             }
             
-            # Extrair estágios do pipeline (com descrições)
-            logger.info(f"🔍 Buscando stages da pipeline '{pipeline['name']}' COM DESCRIÇÕES...")
-            stages = self.master_api.get_pipeline_stages(pipeline['id'], with_descriptions=True)
+            # Estágios do pipeline (com descrições) já buscados por get_pipelines(with_descriptions=True)
+            stages = pipeline.get('_embedded', {}).get('statuses', [])
             logger.info(f"📋 Encontrados {len(stages)} stages para pipeline '{pipeline['name']}'")
             
             for i, stage in enumerate(stages):
@@ -519,68 +947,74 @@ class KommoSyncService:
                 
                 pipeline_data['stages'].append(stage_data)
             
-            config['pipelines'].append(pipeline_data)
+            pipelines_config.append(pipeline_data)
         
-        # Extrair grupos de campos e campos personalizados para cada tipo de entidade
-        for entity_type in self.entity_types:
-            logger.info(f"🔍 Extraindo configuração para {entity_type}...")
-            
-            # 1. Extrair grupos de campos primeiro
-            logger.debug(f"Buscando grupos de campos para {entity_type}...")
-            field_groups = self.master_api.get_custom_field_groups(entity_type)
-            config['custom_field_groups'][entity_type] = []
+        return pipelines_config
+    
+    def _extract_entity_section(self, entity_type: str) -> Dict[str, List[Dict]]:
+        """Extrai grupos de campos e campos personalizados de um tipo de entidade"""
+        logger.info(f"🔍 Extraindo configuração para {entity_type}...")
+        
+        # 1. Extrair grupos de campos primeiro
+        logger.debug(f"Buscando grupos de campos para {entity_type}...")
+        field_groups = self.master_api.get_custom_field_groups(entity_type)
+        groups_config = []
+        
+        logger.info(f"Encontrados {len(field_groups)} grupos de campos para {entity_type}")
+        
+        for group in field_groups:
+            group_data = {
+                'id': group['id'],
+                'name': group['name'],
+                'sort': group.get('sort', 0)
+                # NOTA: is_collapsed removido - API do Kommo não suporta este campo
+            }
+            groups_config.append(group_data)
+            logger.debug(f"Grupo extraído: {group['name']} (ID: {group['id']})")
+        
+        # 2. Extrair campos personalizados
+        custom_fields = self.master_api.get_custom_fields(entity_type)
+        fields_config = []
+        
+        for field in custom_fields:
+            field_data = {
+                'id': field['id'],
+                'name': field['name'],
+                'type': field['type'],
+                'code': field.get('code'),
+                'sort': field.get('sort', 0),
+                'is_required': field.get('is_required', False),
+                'group_id': field.get('group_id'),  # ID do grupo ao qual pertence
+                'required_statuses': field.get('required_statuses', []),  # Estágios específicos onde é obrigatório
+                'enums': []
+            }
             
-            logger.info(f"Encontrados {len(field_groups)} grupos de campos para {entity_type}")
+            # Log específico para campos com required_statuses
+            if field.get('required_statuses'):
+                logger.info(f"🎯 CAMPO COM REQUIRED_STATUSES ENCONTRADO: '{field['name']}' tem {len(field['required_statuses'])} configurações")
+                for rs in field['required_statuses']:
+                    logger.debug(f"  - Pipeline ID: {rs.get('pipeline_id')}, Status ID: {rs.get('status_id')}")
+            else:
+                logger.debug(f"Campo '{field['name']}' sem required_statuses específicos")
+            
+            # Tratar enums de forma mais segura
+            if field.get('enums'):
+                for enum_item in field['enums']:
+                    if isinstance(enum_item, dict):
+                        enum_data = {
+                            'value': enum_item.get('value', ''),
+                            'sort': enum_item.get('sort', 0)
+                        }
+                        # Não incluir ID do enum para evitar conflitos
+                        field_data['enums'].append(enum_data)
             
-            for group in field_groups:
-                group_data = {
-                    'id': group['id'],
-                    'name': group['name'],
-                    'sort': group.get('sort', 0)
-                    # NOTA: is_collapsed removido - API do Kommo não suporta este campo
-                }
-                config['custom_field_groups'][entity_type].append(group_data)
-                logger.debug(f"Grupo extraído: {group['name']} (ID: {group['id']})")
-            
-            # 2. Extrair campos personalizados
-            custom_fields = self.master_api.get_custom_fields(entity_type)
-            config['custom_fields'][entity_type] = []
-            
-            for field in custom_fields:
-                field_data = {
-                    'id': field['id'],
-                    'name': field['name'],
-                    'type': field['type'],
-                    'code': field.get('code'),
-                    'sort': field.get('sort', 0),
-                    'is_required': field.get('is_required', False),
-                    'group_id': field.get('group_id'),  # ID do grupo ao qual pertence
-                    'required_statuses': field.get('required_statuses', []),  # Estágios específicos onde é obrigatório
-                    'enums': []
-                }
-                
-                # Log específico para campos com required_statuses
-                if field.get('required_statuses'):
-                    logger.info(f"🎯 CAMPO COM REQUIRED_STATUSES ENCONTRADO: '{field['name']}' tem {len(field['required_statuses'])} configurações")
-                    for rs in field['required_statuses']:
-                        logger.debug(f"  - Pipeline ID: {rs.get('pipeline_id')}, Status ID: {rs.get('status_id')}")
-                else:
-                    logger.debug(f"Campo '{field['name']}' sem required_statuses específicos")
-                
-                # Tratar enums de forma mais segura
-                if field.get('enums'):
-                    for enum_item in field['enums']:
-                        if isinstance(enum_item, dict):
-                            enum_data = {
-                                'value': enum_item.get('value', ''),
-                                'sort': enum_item.get('sort', 0)
-                            }
-                            # Não incluir ID do enum para evitar conflitos
-                            field_data['enums'].append(enum_data)
-                
-                config['custom_fields'][entity_type].append(field_data)
-        
-        # Extrair roles (funções/permissões)
+            fields_config.append(field_data)
+        
+        return {'custom_field_groups': groups_config, 'custom_fields': fields_config}
+    
+    def _extract_roles_section(self) -> List[Dict]:
+        """Extrai roles (funções/permissões) da conta mestre"""
+        roles_config = []
         logger.info("🔐 Extraindo roles da conta master...")
         try:
             roles = self.master_api.get_roles()
@@ -590,14 +1024,17 @@ class KommoSyncService:
                     'name': role['name'],
                     'rights': role.get('rights', {}),  # Permissões da role
                 }
-                config['roles'].append(role_data)
+                roles_config.append(role_data)
                 logger.debug(f"Role extraída: {role['name']} (ID: {role['id']})")
-            logger.info(f"✅ {len(config['roles'])} roles extraídas")
+            logger.info(f"✅ {len(roles_config)} roles extraídas")
         except Exception as e:
             logger.error(f"Erro ao extrair roles: {e}")
-            config['roles'] = []
+            roles_config = []
         
-        # Extrair task types
+        return roles_config
+    
+    def _extract_task_types_section(self) -> Dict:
+        """Extrai os task types da conta mestre"""
         try:
             logger.info("🎯 Extraindo task types...")
             task_types = self.master_api.get_task_types()
@@ -606,28 +1043,40 @@ class KommoSyncService:
             if isinstance(task_types, list):
                 task_types = {}
                 
-            config['task_types'] = task_types
             logger.info(f"✅ {len(task_types)} task types extraídos")
         except Exception as e:
             logger.error(f"Erro ao extrair task types: {e}")
-            config['task_types'] = {}
+            task_types = {}
         
-        return config
+        return task_types
     
     def sync_pipelines_to_slave(self, slave_api: KommoAPIService, master_config: Dict, 
                                mappings: Dict, progress_callback: Optional[Callable] = None, 
-                               sync_group_id: Optional[int] = None, slave_account_id: Optional[int] = None) -> Dict:
-        """Sincroniza pipelines da conta mestre para uma conta escrava - COM PROCESSAMENTO EM LOTES"""
+                               sync_group_id: Optional[int] = None, slave_account_id: Optional[int] = None,
+                               diff: Optional[ConfigDiff] = None) -> Dict:
+        """Sincroniza pipelines da conta mestre para uma conta escrava - COM PROCESSAMENTO EM LOTES
+        
+        Com diff (sincronização incremental) apenas pipelines alterados são processados e só são
+        deletados da escrava os pipelines removidos da master desde a última aplicação.
+        """
         logger.info("📊 Iniciando sincronização de pipelines em lotes...")
         results = {'created': 0, 'updated': 0, 'skipped': 0, 'deleted': 0, 'errors': []}
         
         # Reset da flag de parada
-        self._stop_sync = False
+        self._reset_stop_flag()
+        
+        if diff is not None and not diff.pipelines:
+            logger.info("📊 Nenhum pipeline alterado na master desde a última sincronização")
+            return results
         
         try:
-            # Obter pipelines existentes na conta escrava
-            existing_pipelines = {p['name']: p for p in slave_api.get_pipelines()}
+            # Obter pipelines existentes na conta escrava (a mesma listagem alimenta a topologia da escrava)
+            slave_pipelines = slave_api.get_pipelines()
+            existing_pipelines = {p['name']: p for p in slave_pipelines}
+            topology = SlaveTopology(slave_api, slave_pipelines)
+            self._topologies[slave_api.subdomain] = topology
             master_pipeline_names = {p['name'] for p in master_config['pipelines']}
+            desired_state = get_desired_state(master_config, self.entity_types)
             
             # FASE 1: Criar/Atualizar pipelines da master EM LOTES
             def process_pipeline(master_pipeline, results):
@@ -642,97 +1091,17 @@ class KommoSyncService:
                         logger.info(f"Pipeline '{pipeline_name}' já existe (slave_id: {slave_pipeline_id})")
                         results['skipped'] += 1
                     else:
-                        # Criar novo pipeline
-                        stages_data = []
-                        kommo_colors = [
-                            '#fffeb2', '#fffd7f', '#fff000', '#ffeab2', '#ffdc7f', '#ffce5a',
-                            '#ffdbdb', '#ffc8c8', '#ff8f92', '#d6eaff', '#c1e0ff', '#98cbff',
-                            '#ebffb1', '#deff81', '#87f2c0', '#f9deff', '#f3beff', '#ccc8f9',
-                            '#eb93ff', '#f2f3f4', '#e6e8ea'
-                        ]
-                        
-                        def get_valid_kommo_color(master_color, fallback_index):
-                            """Retorna uma cor válida do Kommo baseada na cor da master ou fallback inteligente"""
-                            # Se a cor da master é válida, usar ela
-                            if master_color and master_color.lower() in [c.lower() for c in kommo_colors]:
-                                return master_color
-                            
-                            # Se não é válida, tentar mapear para cor similar
-                            if master_color:
-                                master_color_lower = master_color.lower()
-                                
-                                # Mapear cores azuis para cores azuis válidas do Kommo
-                                if any(blue_hint in master_color_lower for blue_hint in ['blue', 'azul']) or master_color_lower in ['#0000ff', '#0066ff', '#4169e1']:
-                                    return '#98cbff'  # Azul forte do Kommo
-                                
-                                # Mapear cores verdes para cores verdes válidas do Kommo  
-                                if any(green_hint in master_color_lower for green_hint in ['green', 'verde']) or master_color_lower in ['#00ff00', '#008000', '#32cd32']:
-                                    return '#87f2c0'  # Verde forte do Kommo
-                                
-                                # Mapear cores vermelhas/rosas para cores vermelhas válidas do Kommo
-                                if any(red_hint in master_color_lower for red_hint in ['red', 'vermelho', '#ff0000', '#dc143c', '#b22222']):
-                                    return '#ff8f92'  # Rosa forte do Kommo
-                                
-                                # Mapear cores roxas para cores roxas válidas do Kommo
-                                if any(purple_hint in master_color_lower for purple_hint in ['purple', 'roxo', '#800080', '#9932cc', '#8a2be2']):
-                                    return '#eb93ff'  # Magenta do Kommo
-                                
-                                # Mapear cores amarelas para cores amarelas válidas do Kommo
-                                if any(yellow_hint in master_color_lower for yellow_hint in ['yellow', 'amarelo', '#ffff00', '#ffd700', '#fff8dc']):
-                                    return '#fff000'  # Amarelo forte do Kommo
-                                
-                                # Mapear cores laranjas para cores laranjas válidas do Kommo
-                                if any(orange_hint in master_color_lower for orange_hint in ['orange', 'laranja', '#ffa500', '#ff8c00', '#ff7f50']):
-                                    return '#ffce5a'  # Laranja forte do Kommo
-                            
-                            # Se nenhum mapeamento específico, usar fallback por índice
-                            return kommo_colors[fallback_index % len(kommo_colors)]
-                        
-                        processed_stage_index = 0  # Contador para estágios realmente processados
-                        for i, master_stage in enumerate(master_pipeline['stages']):
-                            # IGNORAR COMPLETAMENTE estágios especiais (IDs 142/143, type=1, etc.)
-                            if self._should_ignore_stage(master_stage):
-                                logger.info(f"🚫 Ignorando estágio especial '{master_stage['name']}' - será gerenciado automaticamente pelo Kommo")
-                                continue
-                                
-                            stage_data = {
-                                'name': master_stage['name'],
-                                'sort': max(1, min(10000, master_stage.get('sort', i + 1))),
-                                'type': master_stage.get('type', 0)
-                            }
-                            
-                            # Sincronizar descrições se existirem
-                            if 'descriptions' in master_stage and master_stage['descriptions']:
-                                # As descrições vêm como array de objetos
-                                stage_data['descriptions'] = master_stage['descriptions']
-                                logger.info(f"📝 Sincronizando {len(master_stage['descriptions'])} descrições para estágio '{master_stage['name']}'")
-                                for desc_obj in master_stage['descriptions']:
-                                    level = desc_obj.get('level', 'default')
-                                    desc_text = desc_obj.get('description', '')
-                                    logger.debug(f"   - Level '{level}': {desc_text[:50]}...")
-                            
-                            # Usar a cor do stage da master validada (usar contador de estágios processados para fallback)
-                            master_color = master_stage.get('color')
-                            valid_color = get_valid_kommo_color(master_color, processed_stage_index)
-                            stage_data['color'] = valid_color
-                            logger.debug(f"Estágio '{master_stage['name']}' - Cor master: '{master_color}' -> Cor válida: '{valid_color}' (índice processado: {processed_stage_index})")
-                            
-                            processed_stage_index += 1  # Incrementar apenas para estágios processados
-                                
-                            stages_data.append(stage_data)
-                        
-                        pipeline_data = {
-                            'name': master_pipeline['name'],
-                            'sort': max(1, min(10000, master_pipeline.get('sort', 1))),
-                            'is_main': master_pipeline.get('is_main', False),
-                            'is_unsorted_on': master_pipeline.get('is_unsorted_on', True),
-                            '_embedded': {'statuses': stages_data}
-                        }
+                        # Criar novo pipeline (payload compilado uma vez para todas as escravas)
+                        pipeline_data = desired_state.pipeline_payloads[master_pipeline['id']]
+                        stages_data = pipeline_data['_embedded']['statuses']
                         
                         logger.info(f"Criando pipeline '{pipeline_name}' com {len(stages_data)} estágios")
                         response = slave_api.create_pipeline(pipeline_data)
                         slave_pipeline_id = response['_embedded']['pipelines'][0]['id']
                         results['created'] += 1
+                        created_statuses = response['_embedded']['pipelines'][0].get('_embedded', {}).get('statuses')
+                        topology.add_pipeline(slave_pipeline_id, [s['id'] for s in created_statuses]
+                                              if created_statuses is not None else None)
                         
                         # Sincronizar nomes dos estágios automáticos criados pelo Kommo
                         # DESABILITADO: Os estágios especiais (142, 143) são gerenciados automaticamente pelo Kommo
@@ -776,7 +1145,8 @@ class KommoSyncService:
                     
                     # Se pipeline já existia, sincronizar estágios separadamente
                     if pipeline_name in existing_pipelines:
-                        self._sync_pipeline_stages(slave_api, master_pipeline, slave_pipeline_id, mappings)
+                        self._sync_pipeline_stages(slave_api, master_pipeline, slave_pipeline_id, mappings,
+                                                   stage_payloads=desired_state.stages_for(master_pipeline))
                     
                 except Exception as e:
                     logger.error(f"Erro ao processar pipeline '{pipeline_name}': {e}")
@@ -784,11 +1154,12 @@ class KommoSyncService:
             
             # Processar pipelines em lotes
             self._process_in_batches(
-                items=master_config['pipelines'],
+                items=diff.pipelines.select(master_config['pipelines']) if diff is not None else master_config['pipelines'],
                 process_func=process_pipeline,
                 operation_name="pipelines",
                 results=results,
-                progress_callback=progress_callback
+                progress_callback=progress_callback,
+                pacer=self._pacer_for(slave_api)
             )
             
             if self._stop_sync:
@@ -798,6 +1169,8 @@ class KommoSyncService:
             pipelines_to_delete = []
             for slave_pipeline_name, slave_pipeline in existing_pipelines.items():
                 if slave_pipeline_name not in master_pipeline_names:
+                    if diff is not None and not diff.pipelines.allows_delete(slave_pipeline_name):
+                        continue
                     if not slave_pipeline.get('is_main', False):
                         pipelines_to_delete.append(slave_pipeline)
             
@@ -808,6 +1181,7 @@ class KommoSyncService:
                 
                 try:
                     delete_response = slave_api.delete_pipeline(pipeline_id)
+                    topology.remove_pipeline(pipeline_id)
                     if delete_response.get('success') or delete_response.get('status_code') in [200, 204]:
                         results['deleted'] += 1
                         logger.info(f"Pipeline '{pipeline_name}' deletado com sucesso")
@@ -817,6 +1191,7 @@ class KommoSyncService:
                 except Exception as e:
                     error_str = str(e).lower()
                     if any(phrase in error_str for phrase in ['not found', '404', 'does not exist']):
+                        topology.remove_pipeline(pipeline_id)
                         results['deleted'] += 1
                     else:
                         logger.error(f"Erro ao deletar pipeline '{pipeline_name}': {e}")
@@ -829,7 +1204,8 @@ class KommoSyncService:
                     process_func=delete_pipeline,
                     operation_name="exclusão de pipelines",
                     results=results,
-                    progress_callback=progress_callback
+                    progress_callback=progress_callback,
+                    pacer=self._pacer_for(slave_api)
                 )
             
         except Exception as e:
@@ -863,13 +1239,24 @@ class KommoSyncService:
             
         return results
     
-    def _sync_pipeline_stages(self, slave_api: KommoAPIService, master_pipeline: Dict, slave_pipeline_id: int, mappings: Dict):
-        """Sincroniza estágios de um pipeline específico - SINCRONIZAÇÃO BIDIRECIONAL"""
+    def _sync_pipeline_stages(self, slave_api: KommoAPIService, master_pipeline: Dict, slave_pipeline_id: int, mappings: Dict,
+                              stage_payloads: Optional[List[tuple]] = None):
+        """Sincroniza estágios de um pipeline específico - SINCRONIZAÇÃO BIDIRECIONAL
+        
+        stage_payloads: pares (estágio da master, dados) já compilados por DesiredState; se omitido são
+        compilados aqui.
+        """
+        if stage_payloads is None:
+            stage_payloads = compile_stage_payloads(master_pipeline)
+        
         logger.info(f"Sincronizando estágios do pipeline '{master_pipeline['name']}' (slave_id: {slave_pipeline_id})")
         
         # Obter estágios existentes na conta escrava usando o ID correto da conta escrava (com descrições)
         existing_stages_list = slave_api.get_pipeline_stages(slave_pipeline_id, with_descriptions=True)
         existing_stages = {s['name']: s for s in existing_stages_list}
+        topology = self._tracked_topology(slave_api)
+        if topology is not None:
+            topology.add_pipeline(slave_pipeline_id, [s['id'] for s in existing_stages_list])
         
         # Criar conjunto dos nomes dos estágios da master para comparação
         master_stage_names = {stage['name'] for stage in master_pipeline['stages']}
@@ -878,85 +1265,16 @@ class KommoSyncService:
         logger.info(f"📋 Pipeline '{master_pipeline['name']}' - Estágios da master: {list(master_stage_names)}")
         logger.info(f"📋 Pipeline '{master_pipeline['name']}' - Total de estágios mestre: {len(master_pipeline['stages'])}")
         
-        # Cores oficiais da documentação do Kommo (COM #)
-        kommo_colors = [
-            '#fffeb2', '#fffd7f', '#fff000', '#ffeab2', '#ffdc7f', '#ffce5a',
-            '#ffdbdb', '#ffc8c8', '#ff8f92', '#d6eaff', '#c1e0ff', '#98cbff',
-            '#ebffb1', '#deff81', '#87f2c0', '#f9deff', '#f3beff', '#ccc8f9',
-            '#eb93ff', '#f2f3f4', '#e6e8ea'
-        ]
-        
-        def get_valid_kommo_color(master_color, fallback_index):
-            """Retorna uma cor válida do Kommo baseada na cor da master ou fallback inteligente"""
-            # Se a cor da master é válida, usar ela
-            if master_color and master_color.lower() in [c.lower() for c in kommo_colors]:
-                return master_color
-            
-            # Se não é válida, tentar mapear para cor similar
-            if master_color:
-                master_color_lower = master_color.lower()
-                
-            # Mapear cores azuis para cores azuis válidas do Kommo
-            if any(blue_hint in master_color_lower for blue_hint in ['blue', 'azul']) or master_color_lower in ['#0000ff', '#0066ff', '#4169e1']:
-                return '#98cbff'  # Azul forte do Kommo
-            
-            # Mapear cores verdes para cores verdes válidas do Kommo  
-            if any(green_hint in master_color_lower for green_hint in ['green', 'verde']) or master_color_lower in ['#00ff00', '#008000', '#32cd32']:
-                return '#87f2c0'  # Verde forte do Kommo                # Mapear cores vermelhas/rosas para cores vermelhas válidas do Kommo
-                if any(red_hint in master_color_lower for red_hint in ['red', 'vermelho', '#ff0000', '#dc143c', '#b22222']):
-                    return '#ff8f92'  # Rosa forte do Kommo
-                
-                # Mapear cores roxas para cores roxas válidas do Kommo
-                if any(purple_hint in master_color_lower for purple_hint in ['purple', 'roxo', '#800080', '#9932cc', '#8a2be2']):
-                    return '#eb93ff'  # Magenta do Kommo
-                
-                # Mapear cores amarelas para cores amarelas válidas do Kommo
-                if any(yellow_hint in master_color_lower for yellow_hint in ['yellow', 'amarelo', '#ffff00', '#ffd700', '#fff8dc']):
-                    return '#fff000'  # Amarelo forte do Kommo
-                
-                # Mapear cores laranjas para cores laranjas válidas do Kommo
-                if any(orange_hint in master_color_lower for orange_hint in ['orange', 'laranja', '#ffa500', '#ff8c00', '#ff7f50']):
-                    return '#ffce5a'  # Laranja forte do Kommo
-            
-            # Se nenhum mapeamento específico, usar fallback por índice
-            return kommo_colors[fallback_index % len(kommo_colors)]
-        
         # FASE 1: Criar/Atualizar estágios da master que estão faltando na slave
-        processed_stage_index = 0  # Contador para estágios realmente processados
-        for i, master_stage in enumerate(master_pipeline['stages']):
+        # Criações e atualizações são acumuladas e enviadas em lotes ao final da fase
+        pending_creates = []
+        pending_updates = []
+        # Estágios especiais (IDs 142/143, type=1, etc.) já foram descartados na compilação
+        for i, (master_stage, stage_data) in enumerate(stage_payloads):
             try:
                 stage_name = master_stage['name']
-                stage_type = master_stage.get('type', 0)
-                logger.info(f"🔄 Processando estágio {i+1}/{len(master_pipeline['stages'])}: '{stage_name}' (type: {stage_type})")
-                
-                # IGNORAR COMPLETAMENTE estágios especiais (IDs 142/143, type=1, etc.)
-                if self._should_ignore_stage(master_stage):
-                    logger.info(f"🚫 Ignorando estágio especial '{stage_name}' - será gerenciado automaticamente pelo Kommo")
-                    continue
-                
-                # Preparar dados do estágio sem IDs da conta mestre
-                stage_data = {
-                    'name': master_stage['name'],
-                    'sort': max(1, min(10000, master_stage.get('sort', i + 1))),  # Garantir range válido
-                    'type': stage_type
-                }
-                
-                # Sincronizar descrições se existirem
-                if 'descriptions' in master_stage and master_stage['descriptions']:
-                    stage_data['descriptions'] = master_stage['descriptions']
-                    logger.info(f"📝 Sincronizando {len(master_stage['descriptions'])} descrições para estágio '{stage_name}'")
-                    for desc_obj in master_stage['descriptions']:
-                        level = desc_obj.get('level', 'default')
-                        desc_text = desc_obj.get('description', '')
-                        logger.debug(f"   - Level '{level}': {desc_text[:50]}...")
-                
-                # Usar a cor do stage da master validada (usar contador de estágios processados para fallback)
-                master_color = master_stage.get('color')
-                valid_color = get_valid_kommo_color(master_color, processed_stage_index)
-                stage_data['color'] = valid_color
-                logger.debug(f"Estágio '{stage_name}' - Cor master: '{master_color}' -> Cor válida: '{valid_color}' (índice processado: {processed_stage_index})")
-                
-                processed_stage_index += 1  # Incrementar apenas para estágios processados
+                stage_type = stage_data['type']
+                logger.info(f"🔄 Processando estágio {i+1}/{len(stage_payloads)}: '{stage_name}' (type: {stage_type})")
                 
                 # Verificar se estágio já existe (verificação detalhada)
                 stage_exists = stage_name in existing_stages
@@ -1047,16 +1365,7 @@ class KommoSyncService:
                             update_data['color'] = master_color
                             logger.info(f"   🎨 Atualizando color: {existing_color} -> {master_color}")
                         
-                        try:
-                            slave_api.update_pipeline_stage(slave_pipeline_id, slave_stage_id, update_data)
-                            logger.info(f"✅ Estágio '{stage_name}' atualizado com sucesso")
-                            if descriptions_different:
-                                for desc_obj in master_descriptions:
-                                    level = desc_obj.get('level', 'default')
-                                    desc_text = desc_obj.get('description', '')
-                                    logger.debug(f"   - Level '{level}': {desc_text[:50]}...")
-                        except Exception as e:
-                            logger.warning(f"⚠️ Erro ao atualizar estágio '{stage_name}': {e}")
+                        pending_updates.append((stage_name, {'id': slave_stage_id, **update_data}))
                     else:
                         logger.debug(f"📝 Estágio '{stage_name}' já está sincronizado - nenhuma mudança necessária")
                     
@@ -1069,28 +1378,19 @@ class KommoSyncService:
                     logger.info(f"🎭 MAPEAMENTO CRIADO (existente): Stage {master_stage_id} -> {slave_stage_id}")
                     logger.debug(f"🎭 Mapeamento de stage existente salvo: {master_stage_id} -> {slave_stage_id}")
                 else:
-                    # Criar novo estágio na conta escrava
-                    logger.info(f"🆕 Criando estágio '{stage_name}' no pipeline {slave_pipeline_id}")
+                    # Criar novo estágio na conta escrava (enviado em lote abaixo)
+                    logger.info(f"🆕 Estágio '{stage_name}' será criado no pipeline {slave_pipeline_id}")
                     logger.debug(f"Dados do estágio: {stage_data}")
-                    response = slave_api.create_pipeline_stage(slave_pipeline_id, stage_data)
-                    slave_stage_id = response['_embedded']['statuses'][0]['id']
-                    logger.info(f"✅ Estágio '{stage_name}' criado com ID: {slave_stage_id}")
-                    
-                    # Armazenar mapeamento para o estágio recém-criado
-                    if 'stages' not in mappings:
-                        mappings['stages'] = {}
-                    # Usar ID do master stage - garantir que seja inteiro
-                    master_stage_id = int(master_stage['id'])
-                    slave_stage_id = int(slave_stage_id)
-                    mappings['stages'][master_stage_id] = slave_stage_id
-                    logger.info(f"🎭 MAPEAMENTO CRIADO: Stage {master_stage_id} -> {slave_stage_id}")
-                    logger.debug(f"🎭 Mapeamento de stage salvo: {master_stage_id} -> {slave_stage_id}")
+                    pending_creates.append((master_stage, stage_data))
                 
             except Exception as e:
                 logger.error(f"Erro ao sincronizar estágio '{master_stage['name']}': {e}")
                 logger.error(f"Pipeline escrava ID: {slave_pipeline_id}, Estágio mestre: {master_stage}")
                 # Continuar com próximo estágio mesmo se este falhar
         
+        self._flush_stage_creates(slave_api, slave_pipeline_id, pending_creates, mappings)
+        self._flush_stage_updates(slave_api, slave_pipeline_id, pending_updates)
+        
         # FASE 2: Remover estágios que existem na slave mas NÃO existem na master
         stages_to_delete = []
         for slave_stage_name, slave_stage in existing_stages.items():
@@ -1117,6 +1417,8 @@ class KommoSyncService:
                     
                     # Chamar API para deletar o estágio (com pipeline_id correto)
                     delete_response = slave_api.delete_pipeline_stage(slave_pipeline_id, stage_id)
+                    if topology is not None:
+                        topology.remove_stage(slave_pipeline_id, stage_id)
                     
                     if delete_response.get('success') or delete_response.get('status_code') in [200, 204]:
                         logger.info(f"✅ Estágio '{stage_name}' excluído com sucesso")
@@ -1130,6 +1432,8 @@ class KommoSyncService:
                     
                     # Verificar se é erro 404 - estágio já foi removido
                     if any(phrase in error_str for phrase in ['not found', '404', 'does not exist']):
+                        if topology is not None:
+                            topology.remove_stage(slave_pipeline_id, stage_id)
                         logger.info(f"ℹ️ Estágio '{stage_name}' já foi removido ou não existe")
                     else:
                         logger.error(f"❌ Erro ao excluir estágio '{stage_name}': {e}")
@@ -1137,38 +1441,80 @@ class KommoSyncService:
         else:
             logger.info(f"✅ Nenhum estágio excedente encontrado no pipeline '{master_pipeline['name']}'")
     
-    def _should_ignore_stage(self, stage: Dict) -> bool:
+    def _flush_stage_creates(self, slave_api: KommoAPIService, slave_pipeline_id: int,
+                             pending: List[tuple], mappings: Dict):
         """
-        Verifica se um estágio deve ser completamente ignorado durante a sincronização.
-        Estágios especiais do sistema (Won=142, Lost=143) são gerenciados automaticamente pelo Kommo.
+        Cria os estágios pendentes de um pipeline em lotes (POST com array).
+        
+        Os IDs criados são mapeados de volta por nome para mappings['stages'].
+        Se um lote for rejeitado, seus estágios são criados um a um.
         """
-        stage_id = stage.get('id')
-        stage_type = stage.get('type', 0)
-        stage_name = stage.get('name', '').lower()
+        if not pending:
+            return
         
-        # REGRA 1: Ignorar por ID direto (MAIS IMPORTANTE)
-        if stage_id in [142, 143]:
-            logger.debug(f"🚫 Ignorando estágio por ID especial: {stage_id} - '{stage_name}'")
-            return True
+        chunk_size = slave_api.STAGES_BATCH_LIMIT
+        topology = self._tracked_topology(slave_api)
+        logger.info(f"📦 Criando {len(pending)} estágios no pipeline {slave_pipeline_id} em lotes de até {chunk_size}")
+        
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            try:
+                created_stages = slave_api.create_pipeline_stages(slave_pipeline_id, [data for _, data in chunk])
+                created_by_name = {stage.get('name'): stage for stage in created_stages}
+            except Exception as e:
+                logger.warning(f"⚠️ Lote de {len(chunk)} estágios rejeitado ({e}) - criando um a um")
+                created_by_name = {}
             
-        # REGRA 2: Ignorar estágios type=1 (incoming leads) - criados automaticamente
-        if stage_type == 1:
-            logger.debug(f"🚫 Ignorando estágio type=1: '{stage_name}' - criado automaticamente pelo Kommo")
-            return True
+            for master_stage, stage_data in chunk:
+                stage_name = stage_data['name']
+                created_stage = created_by_name.get(stage_name)
+                try:
+                    if created_stage is None:
+                        response = slave_api.create_pipeline_stage(slave_pipeline_id, stage_data)
+                        created_stage = response['_embedded']['statuses'][0]
+                    logger.info(f"✅ Estágio '{stage_name}' criado com ID: {created_stage['id']}")
+                    
+                    # Armazenar mapeamento para o estágio recém-criado - garantir que sejam inteiros
+                    master_stage_id = int(master_stage['id'])
+                    slave_stage_id = int(created_stage['id'])
+                    mappings.setdefault('stages', {})[master_stage_id] = slave_stage_id
+                    if topology is not None:
+                        topology.add_stage(slave_pipeline_id, slave_stage_id)
+                    logger.info(f"🎭 MAPEAMENTO CRIADO: Stage {master_stage_id} -> {slave_stage_id}")
+                except Exception as e:
+                    logger.error(f"Erro ao criar estágio '{stage_name}': {e}")
+                    logger.error(f"Pipeline escrava ID: {slave_pipeline_id}, Estágio mestre: {master_stage}")
+    
+    def _flush_stage_updates(self, slave_api: KommoAPIService, slave_pipeline_id: int, pending: List[tuple]):
+        """Atualiza os estágios pendentes de um pipeline em lotes; lotes rejeitados são refeitos um a um"""
+        if not pending:
+            return
+        
+        chunk_size = slave_api.STAGES_BATCH_LIMIT
+        for start in range(0, len(pending), chunk_size):
+            chunk = pending[start:start + chunk_size]
+            try:
+                slave_api.update_pipeline_stages(slave_pipeline_id, [data for _, data in chunk])
+                logger.info(f"✅ {len(chunk)} estágios atualizados no pipeline {slave_pipeline_id}")
+                continue
+            except Exception as e:
+                logger.warning(f"⚠️ Lote de {len(chunk)} atualizações de estágios rejeitado ({e}) - atualizando um a um")
             
-        # REGRA 3: Ignorar por nome (padrões conhecidos de estágios especiais)
-        special_patterns = [
-            'incoming leads', 'incoming', 'etapa de leads de entrada', 'leads de entrada', 'entrada',
-            'venda ganha', 'fechado - ganho', 'closed - won', 'won', 'successful', 'sucesso',
-            'venda perdida', 'fechado - perdido', 'closed - lost', 'lost', 'unsuccessful', 'fracasso'
-        ]
-        
-        for pattern in special_patterns:
-            if pattern in stage_name:
-                logger.debug(f"🚫 Ignorando estágio por padrão de nome: '{pattern}' em '{stage_name}'")
-                return True
-                
-        return False
+            for stage_name, stage_data in chunk:
+                try:
+                    update_data = {k: v for k, v in stage_data.items() if k != 'id'}
+                    slave_api.update_pipeline_stage(slave_pipeline_id, stage_data['id'], update_data)
+                    logger.info(f"✅ Estágio '{stage_name}' atualizado com sucesso")
+                except Exception as e:
+                    logger.warning(f"⚠️ Erro ao atualizar estágio '{stage_name}': {e}")
+    
+    def _should_ignore_stage(self, stage: Dict) -> bool:
+        """
+        Verifica se um estágio deve ser completamente ignorado durante a sincronização.
+        Estágios especiais do sistema (Won=142, Lost=143) são gerenciados automaticamente pelo Kommo.
+        """
+        return should_ignore_stage(stage)
+    
     def _is_system_stage(self, stage: Dict) -> bool:
         """
         Verifica se um estágio é um estágio especial do sistema (Won=142, Lost=143, Incoming=1)
@@ -1207,7 +1553,7 @@ class KommoSyncService:
         return None
     
     def _save_mappings_to_database(self, mappings: Dict, sync_group_id: int, slave_account_id: int):
-        """Salva os mapeamentos de pipelines e estágios no banco de dados"""
+        """Salva os mapeamentos de pipelines, estágios e campos personalizados no banco de dados"""
         try:
             logger.info(f"💾 Salvando mapeamentos no banco de dados para o grupo {sync_group_id}")
             
@@ -1263,18 +1609,81 @@ class KommoSyncService:
                             existing_mapping.slave_stage_id = slave_stage_id
                             logger.debug(f"📊 Atualizado mapeamento de estágio: {master_stage_id} -> {slave_stage_id}")
             
+            # Salvar identidade dos campos personalizados
+            field_count = self._add_custom_field_mappings(mappings, sync_group_id, slave_account_id)
+            
             # Commitar todas as mudanças
             db.session.commit()
             
             pipeline_count = len(mappings.get('pipelines', {}))
             stage_count = len(mappings.get('stages', {}))
-            logger.info(f"✅ Mapeamentos salvos no banco: {pipeline_count} pipelines, {stage_count} estágios")
+            logger.info(f"✅ Mapeamentos salvos no banco: {pipeline_count} pipelines, {stage_count} estágios, {field_count} campos")
             
         except Exception as e:
             logger.error(f"❌ Erro ao salvar mapeamentos no banco: {e}")
             db.session.rollback()
             raise
     
+    def _add_custom_field_mappings(self, mappings: Dict, sync_group_id: int, slave_account_id: int) -> int:
+        """Adiciona/atualiza na sessão os mapeamentos campo master -> campo escrava (sem commit)"""
+        field_ids = {}
+        for entity_mappings in mappings.get('custom_fields', {}).values():
+            field_ids.update(entity_mappings)
+        if not field_ids:
+            return 0
+        
+        existing = {mapping.master_field_id: mapping for mapping in CustomFieldMapping.query.filter_by(
+            sync_group_id=sync_group_id,
+            slave_account_id=slave_account_id
+        ).all()}
+        for master_field_id, slave_field_id in field_ids.items():
+            master_field_id, slave_field_id = int(master_field_id), int(slave_field_id)
+            mapping = existing.get(master_field_id)
+            if mapping is None:
+                db.session.add(CustomFieldMapping(
+                    sync_group_id=sync_group_id,
+                    master_field_id=master_field_id,
+                    slave_account_id=slave_account_id,
+                    slave_field_id=slave_field_id
+                ))
+            elif mapping.slave_field_id != slave_field_id:
+                logger.debug(f"🏷️ Atualizado mapeamento de campo: {master_field_id} -> {slave_field_id}")
+                mapping.slave_field_id = slave_field_id
+        return len(field_ids)
+    
+    def _save_custom_field_mappings(self, mappings: Dict, sync_group_id: int, slave_account_id: int):
+        """Salva os mapeamentos de campos personalizados no banco de dados"""
+        try:
+            count = self._add_custom_field_mappings(mappings, sync_group_id, slave_account_id)
+            db.session.commit()
+            logger.info(f"💾 {count} mapeamentos de campos salvos no banco")
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao salvar mapeamentos de campos: {e}")
+            db.session.rollback()
+    
+    def _load_custom_field_mappings(self, sync_group_id: int, slave_account_id: int, master_config: Dict) -> Dict:
+        """
+        Mapeamentos campo master -> campo escrava salvos no banco, por tipo de entidade.
+        
+        A tabela não guarda a entidade (IDs de campo são únicos na conta); ela vem da configuração da master.
+        Mapeamentos de campos que não existem mais na master são ignorados.
+        """
+        try:
+            saved = {int(mapping.master_field_id): int(mapping.slave_field_id)
+                     for mapping in CustomFieldMapping.query.filter_by(sync_group_id=sync_group_id,
+                                                                       slave_account_id=slave_account_id).all()}
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao carregar mapeamentos de campos: {e}")
+            return {}
+        
+        field_mappings = {}
+        for entity_type in self.entity_types:
+            for master_field in master_config.get('custom_fields', {}).get(entity_type, []):
+                if master_field.get('id') in saved:
+                    field_mappings.setdefault(entity_type, {})[master_field['id']] = saved[master_field['id']]
+        logger.info(f"📖 {sum(len(ids) for ids in field_mappings.values())} mapeamentos de campos carregados do banco")
+        return field_mappings
+    
     def _load_mappings_from_database(self, sync_group_id, slave_account_id):
         """Carrega mapeamentos existentes do banco de dados"""
         try:
@@ -1414,13 +1823,14 @@ class KommoSyncService:
             logger.error(f"Erro ao sincronizar nomes automáticos do pipeline '{master_pipeline['name']}': {e}")
     
     def sync_custom_field_groups_to_slave(self, slave_api: KommoAPIService, master_config: Dict, 
-                                         mappings: Dict, progress_callback: Optional[Callable] = None) -> Dict:
+                                         mappings: Dict, progress_callback: Optional[Callable] = None,
+                                         diff: Optional[ConfigDiff] = None) -> Dict:
         """Sincroniza grupos de campos personalizados da conta mestre para uma conta escrava - COM LOTES"""
         logger.info("📁 Iniciando sincronização de grupos de campos em lotes...")
         results = {'created': 0, 'updated': 0, 'skipped': 0, 'deleted': 0, 'errors': []}
         
         # Reset da flag de parada
-        self._stop_sync = False
+        self._reset_stop_flag()
         
         for entity_type in self.entity_types:
             if self._stop_sync:
@@ -1434,9 +1844,25 @@ class KommoSyncService:
                     logger.info(f"Nenhum grupo encontrado para {entity_type}")
                     continue
                 
+                groups_diff = diff.custom_field_groups[entity_type] if diff is not None else None
+                if groups_diff is not None and not groups_diff and not diff.custom_fields[entity_type]:
+                    logger.info(f"Nenhum grupo ou campo de {entity_type} alterado desde a última sincronização")
+                    continue
+                
                 existing_groups = {g['name']: g for g in slave_api.get_custom_field_groups(entity_type)}
                 master_group_names = {g['name'] for g in master_groups}
                 
+                # Todos os grupos da master são mapeados por nome, inclusive os que o diff não alterou:
+                # campos novos/alterados em grupos inalterados também precisam do grupo da escrava
+                group_mappings = mappings.setdefault('custom_field_groups', {}).setdefault(entity_type, {})
+                for master_group in master_groups:
+                    if master_group['name'] in existing_groups:
+                        group_mappings[master_group['id']] = existing_groups[master_group['name']]['id']
+                
+                if groups_diff is not None and not groups_diff:
+                    logger.info(f"Nenhum grupo de {entity_type} alterado desde a última sincronização")
+                    continue
+                
                 # FASE 1: Criar/Atualizar grupos da master EM LOTES
                 def process_group(master_group, results):
                     group_name = master_group['name']
@@ -1486,11 +1912,12 @@ class KommoSyncService:
                 
                 # Processar grupos em lotes
                 self._process_in_batches(
-                    items=master_groups,
+                    items=groups_diff.select(master_groups) if groups_diff is not None else master_groups,
                     process_func=process_group,
                     operation_name=f"grupos de {entity_type}",
                     results=results,
-                    progress_callback=progress_callback
+                    progress_callback=progress_callback,
+                    pacer=self._pacer_for(slave_api)
                 )
                 
                 if self._stop_sync:
@@ -1500,6 +1927,8 @@ class KommoSyncService:
                 groups_to_delete = []
                 for slave_group_name, slave_group in existing_groups.items():
                     if slave_group_name not in master_group_names:
+                        if groups_diff is not None and not groups_diff.allows_delete(slave_group_name):
+                            continue
                         groups_to_delete.append(slave_group)
                 
                 def delete_group(group_to_delete, results):
@@ -1528,7 +1957,8 @@ class KommoSyncService:
                         process_func=delete_group,
                         operation_name=f"exclusão de grupos de {entity_type}",
                         results=results,
-                        progress_callback=progress_callback
+                        progress_callback=progress_callback,
+                        pacer=self._pacer_for(slave_api)
                     )
                 
             except Exception as e:
@@ -1539,14 +1969,183 @@ class KommoSyncService:
         return results
     
 
+    def _store_custom_field_mapping(self, mappings: Dict, entity_type: str, master_field_id: int, slave_field_id: int):
+        """Guarda o mapeamento campo master -> campo escrava"""
+        mappings.setdefault('custom_fields', {}).setdefault(entity_type, {})[master_field_id] = slave_field_id
+    
+    def _log_created_field_check(self, field_name: str, field_data: Dict, created_field: Dict):
+        """Verifica se o campo foi criado com grupo e required_statuses corretos"""
+        if field_data.get('group_id'):
+            actual_group_id = created_field.get('group_id')
+            expected_group_id = field_data['group_id']
+            if actual_group_id == expected_group_id:
+                logger.info(f"✅ Campo '{field_name}' criado no grupo correto: {actual_group_id}")
+            else:
+                logger.error(f"❌ Campo '{field_name}' NÃO foi criado no grupo correto! Esperado: {expected_group_id}, Atual: {actual_group_id}")
+        
+        if field_data.get('required_statuses') and 'required_statuses' in created_field:
+            actual_count = len(created_field.get('required_statuses') or [])
+            expected_count = len(field_data['required_statuses'])
+            if actual_count == expected_count:
+                logger.info(f"✅ Campo '{field_name}' criado com {actual_count} required_statuses corretos")
+            else:
+                logger.error(f"❌ Campo '{field_name}' NÃO foi criado com required_statuses corretos! Esperado: {expected_count}, Atual: {actual_count}")
+    
+    @staticmethod
+    def _is_required_statuses_error(error: Exception) -> bool:
+        error_str = str(error)
+        return ("required_statuses" in error_str or "NotSupportedChoice" in error_str or
+                "status_id" in error_str or "pipeline_id" in error_str)
+    
+    def _create_custom_field_without_required_statuses(self, slave_api: 'KommoAPIService', entity_type: str,
+                                                       master_field: Dict, field_data: Dict,
+                                                       results: Dict, mappings: Dict):
+        """Fallback: cria o campo sem required_statuses quando a API rejeita os estágios informados"""
+        logger.info(f"🔄 Tentando criar campo '{master_field['name']}' SEM required_statuses como fallback...")
+        try:
+            fallback_field_data = {k: v for k, v in field_data.items() if k != 'required_statuses'}
+            
+            logger.info(f"📤 Criando campo SEM required_statuses:")
+            logger.info(f"   Nome: {fallback_field_data.get('name')}")
+            logger.info(f"   Tipo: {fallback_field_data.get('type')}")
+            logger.info(f"   Grupo: {fallback_field_data.get('group_id', 'Sem grupo')}")
+            
+            fallback_response = slave_api.create_custom_field(entity_type, fallback_field_data)
+            slave_field_id = fallback_response['_embedded']['custom_fields'][0]['id']
+            
+            logger.warning(f"⚠️ Campo '{master_field['name']}' criado SEM required_statuses específicos (ID: {slave_field_id})")
+            logger.info(f"ℹ️ Campo estará disponível em todos os estágios do funil")
+            
+            results['created'] += 1
+            self._store_custom_field_mapping(mappings, entity_type, master_field['id'], slave_field_id)
+            
+        except Exception as fallback_error:
+            logger.error(f"❌ Fallback também falhou: {fallback_error}")
+            results['errors'].append(f"Fallback falhou para campo '{master_field['name']}': {fallback_error}")
+    
+    def _create_custom_field_individually(self, slave_api: 'KommoAPIService', entity_type: str,
+                                          master_field: Dict, field_data: Dict, results: Dict, mappings: Dict):
+        """Cria um único campo (usado quando o lote que o continha foi rejeitado)"""
+        field_name = master_field['name']
+        try:
+            response = slave_api.create_custom_field(entity_type, field_data)
+            created_field = response['_embedded']['custom_fields'][0]
+            results['created'] += 1
+            logger.info(f"✅ Campo '{field_name}' criado com ID: {created_field['id']}")
+            self._log_created_field_check(field_name, field_data, created_field)
+            self._store_custom_field_mapping(mappings, entity_type, master_field['id'], created_field['id'])
+        except Exception as e:
+            error_msg = f"Erro ao sincronizar campo '{field_name}' para {entity_type}: {e}"
+            if field_data.get('required_statuses') and self._is_required_statuses_error(e):
+                logger.error(f"❌ ERRO DE REQUIRED_STATUSES: {error_msg}")
+                for rs in field_data['required_statuses']:
+                    logger.error(f"   - pipeline_id: {rs.get('pipeline_id')}, status_id: {rs.get('status_id')}")
+                self._create_custom_field_without_required_statuses(
+                    slave_api, entity_type, master_field, field_data, results, mappings
+                )
+            else:
+                logger.error(error_msg)
+                results['errors'].append(error_msg)
+    
+    def _flush_custom_field_creates(self, slave_api: 'KommoAPIService', entity_type: str,
+                                    pending: List[tuple], results: Dict, mappings: Dict):
+        """
+        Cria os campos pendentes em lotes de até CUSTOM_FIELDS_BATCH_LIMIT por requisição.
+        
+        Os IDs retornados são mapeados de volta para os campos da master pela posição
+        (conferindo o nome). Apenas os lotes rejeitados são refeitos campo a campo.
+        """
+        if not pending:
+            return
+        
+        chunk_size = slave_api.CUSTOM_FIELDS_BATCH_LIMIT
+        total_chunks = (len(pending) + chunk_size - 1) // chunk_size
+        logger.info(f"📦 Criando {len(pending)} campos de {entity_type} em {total_chunks} requisições")
+        
+        for start in range(0, len(pending), chunk_size):
+            if self._stop_sync:
+                break
+            chunk = pending[start:start + chunk_size]
+            try:
+                created_fields = slave_api.create_custom_fields(entity_type, [field_data for _, field_data in chunk])
+            except Exception as e:
+                logger.warning(f"⚠️ Lote de {len(chunk)} campos rejeitado ({e}) - criando um a um")
+                for master_field, field_data in chunk:
+                    self._create_custom_field_individually(slave_api, entity_type, master_field, field_data,
+                                                           results, mappings)
+                continue
+            
+            created_by_name = {}
+            for created_field in created_fields:
+                created_by_name.setdefault(created_field.get('name'), created_field)
+            
+            for index, (master_field, field_data) in enumerate(chunk):
+                created_field = None
+                if index < len(created_fields) and created_fields[index].get('name') == field_data['name']:
+                    created_field = created_fields[index]
+                else:
+                    created_field = created_by_name.get(field_data['name'])
+                
+                if created_field is None:
+                    # A API não devolveu este campo: criar individualmente
+                    self._create_custom_field_individually(slave_api, entity_type, master_field, field_data,
+                                                           results, mappings)
+                    continue
+                
+                results['created'] += 1
+                logger.info(f"✅ Campo '{field_data['name']}' criado com ID: {created_field['id']}")
+                self._log_created_field_check(field_data['name'], field_data, created_field)
+                self._store_custom_field_mapping(mappings, entity_type, master_field['id'], created_field['id'])
+    
+    def _flush_custom_field_updates(self, slave_api: 'KommoAPIService', entity_type: str,
+                                    pending: List[tuple], results: Dict):
+        """Atualiza os campos pendentes em lotes (PATCH na coleção); lotes rejeitados são refeitos um a um"""
+        if not pending:
+            return
+        
+        chunk_size = slave_api.CUSTOM_FIELDS_BATCH_LIMIT
+        logger.info(f"📦 Atualizando {len(pending)} campos de {entity_type} em lotes de até {chunk_size}")
+        
+        for start in range(0, len(pending), chunk_size):
+            if self._stop_sync:
+                break
+            chunk = pending[start:start + chunk_size]
+            try:
+                slave_api.update_custom_fields(
+                    entity_type, [{'id': slave_field_id, **update_data} for _, slave_field_id, update_data in chunk]
+                )
+                results['updated'] += len(chunk)
+                logger.info(f"✅ {len(chunk)} campos atualizados em uma requisição")
+                continue
+            except Exception as e:
+                logger.warning(f"⚠️ Lote de {len(chunk)} atualizações rejeitado ({e}) - atualizando um a um")
+            
+            for master_field, slave_field_id, update_data in chunk:
+                try:
+                    slave_api.update_custom_field(entity_type, slave_field_id, update_data)
+                    results['updated'] += 1
+                    logger.info(f"Campo '{master_field['name']}' atualizado com sucesso")
+                except Exception as e:
+                    error_msg = f"Erro ao sincronizar campo '{master_field['name']}' para {entity_type}: {e}"
+                    logger.error(error_msg)
+                    results['errors'].append(error_msg)
+    
     def sync_custom_fields_to_slave(self, slave_api: KommoAPIService, master_config: Dict,
                                    mappings: Dict, progress_callback: Optional[Callable] = None,
                                    sync_group_id: Optional[int] = None, 
-                                   slave_account_id: Optional[int] = None) -> Dict:
+                                   slave_account_id: Optional[int] = None,
+                                   diff: Optional[ConfigDiff] = None, sync_groups: bool = True) -> Dict:
         """Sincroniza campos personalizados da conta mestre para uma conta escrava (criar/atualizar + deletar excesso)
         
         NOTA: Este método também sincroniza os grupos de campos AUTOMATICAMENTE antes de sincronizar os campos,
-        garantindo que as dependências estejam corretas.
+        garantindo que as dependências estejam corretas. Com sync_groups=False (sync_all_to_slave, que já
+        sincronizou os grupos em uma fase própria) os mapeamentos de grupos em `mappings` são usados direto.
+        
+        Com diff (sincronização incremental) apenas campos alterados - ou que dependem de grupos/estágios
+        alterados - são aplicados, e só campos removidos da master são deletados da escrava.
+        
+        Cada campo da master é procurado primeiro pelo mapeamento salvo (ID master -> ID escrava,
+        tabela custom_field_mappings); as heurísticas de nome/código só valem para campos sem mapeamento.
         """
         # Carregar mapeamentos existentes do banco se disponível
         if sync_group_id and slave_account_id:
@@ -1554,104 +2153,97 @@ class KommoSyncService:
             database_mappings = self._load_mappings_from_database(sync_group_id, slave_account_id)
             # Mesclar com os mapeamentos já existentes (priorizando os do banco)
             mappings.update(database_mappings)
+            for entity_type, field_ids in self._load_custom_field_mappings(sync_group_id, slave_account_id,
+                                                                           master_config).items():
+                mappings.setdefault('custom_fields', {}).setdefault(entity_type, {}).update(field_ids)
         
         results = {'created': 0, 'updated': 0, 'skipped': 0, 'deleted': 0, 'errors': []}
         
         # PRIMEIRO: Sincronizar grupos de campos (dependência obrigatória)
-        logger.info("🔄 Sincronizando grupos de campos automaticamente antes dos campos...")
-        groups_results = self.sync_custom_field_groups_to_slave(slave_api, master_config, mappings, progress_callback)
-        
-        # Verificar se groups_results é um dicionário válido
-        if isinstance(groups_results, dict):
-            logger.info(f"Grupos sincronizados: {groups_results['created']} criados, {groups_results['updated']} atualizados, {groups_results['skipped']} ignorados, {groups_results['deleted']} deletados")
-            
-            # Adicionar resultados dos grupos ao resultado final
-            results['groups_created'] = groups_results['created']
-            results['groups_updated'] = groups_results['updated']
-            results['groups_skipped'] = groups_results['skipped']
-            results['groups_deleted'] = groups_results['deleted']
-            results['groups_errors'] = groups_results['errors']
-        else:
-            logger.error(f"Erro na sincronização de grupos: resultado inválido ({type(groups_results)})")
-            results['groups_created'] = 0
-            results['groups_updated'] = 0
-            results['groups_skipped'] = 0
-            results['groups_deleted'] = 0
-            results['groups_errors'] = [f"Erro na sincronização de grupos: {groups_results}"]
+        if sync_groups:
+            logger.info("🔄 Sincronizando grupos de campos automaticamente antes dos campos...")
+            groups_results = self.sync_custom_field_groups_to_slave(slave_api, master_config, mappings, progress_callback,
+                                                                    diff=diff)
+            
+            # Verificar se groups_results é um dicionário válido
+            if isinstance(groups_results, dict):
+                logger.info(f"Grupos sincronizados: {groups_results['created']} criados, {groups_results['updated']} atualizados, {groups_results['skipped']} ignorados, {groups_results['deleted']} deletados")
+                
+                # Adicionar resultados dos grupos ao resultado final
+                results['groups_created'] = groups_results['created']
+                results['groups_updated'] = groups_results['updated']
+                results['groups_skipped'] = groups_results['skipped']
+                results['groups_deleted'] = groups_results['deleted']
+                results['groups_errors'] = groups_results['errors']
+            else:
+                logger.error(f"Erro na sincronização de grupos: resultado inválido ({type(groups_results)})")
+                results['groups_created'] = 0
+                results['groups_updated'] = 0
+                results['groups_skipped'] = 0
+                results['groups_deleted'] = 0
+                results['groups_errors'] = [f"Erro na sincronização de grupos: {groups_results}"]
         
         # Campos padrão do sistema que não devem ser sincronizados
-        system_codes = ['PHONE', 'EMAIL', 'POSITION', 'WEB', 'IM', 'ADDRESS']
+        system_codes = SYSTEM_FIELD_CODES
+        
+        # Payloads dos campos que não dependem da escrava (tipo validado, código, enums)
+        desired_state = get_desired_state(master_config, self.entity_types)
         
         for entity_type in self.entity_types:
+            fields_diff = diff.custom_fields[entity_type] if diff is not None else None
+            if fields_diff is not None and not fields_diff:
+                logger.info(f"🏷️ Nenhum campo de {entity_type} alterado desde a última sincronização")
+                continue
+            
+            # Retomada: campos dessa entidade já sincronizados em uma execução anterior
+            checkpoint_operation = f"campos de {entity_type}"
+            if self._checkpoint is not None and entity_type in self._checkpoint.completed_items(checkpoint_operation):
+                logger.info(f"⏭️ Campos de {entity_type} já sincronizados em execução anterior")
+                continue
+            errors_before = len(results['errors'])
+            
             try:
                 logger.info(f"🏷️ Sincronizando campos personalizados para {entity_type}...")
                 
                 # Obter campos existentes na conta escrava
                 all_slave_fields = slave_api.get_custom_fields(entity_type)
-                existing_fields_by_name = {f['name']: f for f in all_slave_fields}
-                existing_fields_by_code = {f.get('code'): f for f in all_slave_fields if f.get('code')}
                 
-                # Criar conjunto de nomes de campos da master para comparação
-                master_field_names = {f['name'] for f in master_config['custom_fields'][entity_type]}
-                master_field_codes = {f.get('code') for f in master_config['custom_fields'][entity_type] if f.get('code')}
+                # Índices montados uma vez por entidade: campos da escrava (para encontrar o correspondente
+                # de cada campo da master) e campos da master (para decidir o que deletar da escrava)
+                slave_fields_index = CustomFieldMatchIndex(all_slave_fields)
+                master_fields_index = CustomFieldMatchIndex(master_config['custom_fields'][entity_type])
+                # Identidade salva de sincronizações anteriores (master_field_id -> slave_field_id): tem
+                # prioridade sobre as heurísticas de nome, então campos renomeados são atualizados, não recriados
+                slave_fields_by_id = {f['id']: f for f in all_slave_fields}
+                known_field_ids = mappings.get('custom_fields', {}).get(entity_type, {})
+                
+                # Criações e atualizações são acumuladas e enviadas em lotes no fim da FASE 1
+                pending_creates = []
+                pending_updates = []
                 
                 # FASE 1: Criar/Atualizar campos da master
                 for master_field in master_config['custom_fields'][entity_type]:
+                    if fields_diff is not None and master_field.get('id') not in fields_diff.changed_ids:
+                        continue
+                    
                     try:
                         field_name = master_field['name']
                         field_code = master_field.get('code', '')
-                        field_type = master_field['type']
-                        
-                        # Verificar se o tipo é suportado pela API do Kommo (conforme documentação oficial)
-                        supported_types = [
-                            'text', 'numeric', 'checkbox', 'select', 'multiselect', 'date', 'date_time',
-                            'url', 'textarea', 'radiobutton', 'streetaddress', 'smart_address',
-                            'legal_entity', 'price', 'monetary', 'category', 'file', 'multitext',
-                            'tracking_data', 'linked_entity', 'chained_list'
-                        ]
-                        
-                        # Tipos problemáticos que devem ser convertidos
-                        type_conversions = {
-                            'birthday_date': 'date',  # birthday_date não existe, usar date
-                            'birthday': 'date',       # birthday não é suportado, usar date
-                            'datetime': 'date_time',  # datetime deve ser date_time
-                        }
-                        
-                        # Aplicar conversões de tipo se necessário
-                        if field_type in type_conversions:
-                            original_type = field_type
-                            field_type = type_conversions[field_type]
-                            logger.info(f"Convertendo tipo '{original_type}' para '{field_type}' para campo '{field_name}'")
-                        
-                        if field_type not in supported_types:
-                            logger.warning(f"Tipo de campo '{field_type}' não suportado pela API do Kommo para campo '{field_name}'. Convertendo para 'text'.")
-                            field_type = 'text'  # Fallback para tipo texto
+                        field_template = desired_state.field_templates[entity_type].get(master_field['id'])
+                        if field_template is None and master_field['id'] not in desired_state.field_templates[entity_type]:
+                            field_template = compile_field_template(master_field)
                         
                         # Pular campos do sistema
-                        if field_code and field_code.upper() in system_codes:
+                        if field_template is None:
                             logger.info(f"Pulando campo do sistema '{field_name}' (código: {field_code})")
                             results['skipped'] += 1
                             continue
                         
-                        # Preparar dados básicos do campo
-                        field_data = {
-                            'name': master_field['name'],
-                            'type': field_type,  # Usar o tipo validado
-                            'sort': master_field.get('sort', 0),
-                            'is_required': master_field.get('is_required', False)
-                        }
-                        
-                        # Só adicionar código se não for um campo do sistema
-                        if field_code and field_code.upper() not in system_codes:
-                            field_data['code'] = field_code
-                        
-                        # Tratamento específico para campos monetários
-                        if field_type == 'monetary':
-                            # Campos monetários requerem o parâmetro 'currency'
-                            # Se existir no campo master, usar o mesmo, senão usar USD como padrão
-                            currency = master_field.get('currency', 'USD')
-                            field_data['currency'] = currency
-                            logger.info(f"💰 Campo monetário '{field_name}' configurado com moeda: {currency}")
+                        # Dados básicos do campo (tipo validado, código, moeda e enums já compilados)
+                        field_data = dict(field_template)
+                        field_type = field_data['type']
+                        if field_type != master_field['type']:
+                            logger.debug(f"Tipo '{master_field['type']}' convertido para '{field_type}' no campo '{field_name}'")
                         
                         # Mapear required_statuses (estágios específicos onde é obrigatório)
                         if master_field.get('required_statuses'):
@@ -1717,9 +2309,9 @@ class KommoSyncService:
                                 valid_required_statuses = []
                                 
                                 try:
-                                    # Obter pipelines e stages reais da slave
-                                    real_slave_pipelines = slave_api.get_pipelines()
-                                    logger.debug(f"Pipelines disponíveis na slave: {[p['id'] for p in real_slave_pipelines[:5]]}...")
+                                    # Pipelines e stages reais da slave (topologia carregada uma vez por sincronização)
+                                    topology = self._topology_for(slave_api)
+                                    logger.debug(f"Pipelines disponíveis na slave: {topology.sample_pipelines()}...")
                                     
                                     for mapped_status in mapped_required_statuses:
                                         slave_status_id = mapped_status['status_id']
@@ -1728,27 +2320,27 @@ class KommoSyncService:
                                         logger.info(f"   🔍 Validando pipeline_id: {slave_pipeline_id}, status_id: {slave_status_id}")
                                         
                                         # Verificar se pipeline existe
-                                        pipeline_exists = any(p['id'] == slave_pipeline_id for p in real_slave_pipelines)
+                                        pipeline_exists = topology.has_pipeline(slave_pipeline_id)
                                         
                                         if pipeline_exists:
                                             logger.debug(f"      ✅ Pipeline {slave_pipeline_id} existe na slave")
                                             
                                             # Verificar se status existe no pipeline
                                             try:
-                                                real_slave_stages = slave_api.get_pipeline_stages(slave_pipeline_id)
-                                                status_exists = any(s['id'] == slave_status_id for s in real_slave_stages)
+                                                real_slave_stages = topology.stage_ids(slave_pipeline_id)
+                                                status_exists = slave_status_id in real_slave_stages
                                                 
                                                 if status_exists:
                                                     logger.info(f"      ✅ VÁLIDO: pipeline {slave_pipeline_id}, status {slave_status_id}")
                                                     valid_required_statuses.append(mapped_status)
                                                 else:
                                                     logger.error(f"      ❌ Status {slave_status_id} NÃO existe no pipeline {slave_pipeline_id}")
-                                                    logger.debug(f"         Status disponíveis: {[s['id'] for s in real_slave_stages[:5]]}...")
+                                                    logger.debug(f"         Status disponíveis: {sorted(real_slave_stages)[:5]}...")
                                             except Exception as stage_error:
                                                 logger.error(f"      ❌ Erro ao obter stages do pipeline {slave_pipeline_id}: {stage_error}")
                                         else:
                                             logger.error(f"      ❌ Pipeline {slave_pipeline_id} NÃO existe na slave")
-                                            logger.debug(f"         Pipelines disponíveis: {[p['id'] for p in real_slave_pipelines[:5]]}...")
+                                            logger.debug(f"         Pipelines disponíveis: {topology.sample_pipelines()}...")
                                 
                                 except Exception as validation_error:
                                     logger.error(f"❌ Erro na validação real: {validation_error}")
@@ -1786,131 +2378,23 @@ class KommoSyncService:
                         else:
                             logger.debug(f"Campo '{field_name}' não tem group_id na master")
                         
-                        # Validações específicas por tipo de campo
-                        if field_type in ['select', 'multiselect', 'radiobutton']:
-                            # Só adicionar enums para campos que realmente suportam
-                            if master_field.get('enums'):
-                                clean_enums = []
-                                for enum_item in master_field['enums']:
-                                    if isinstance(enum_item, dict):
-                                        # Remover ID e manter apenas valor e sort
-                                        enum_data = {
-                                            'value': enum_item.get('value', ''),
-                                            'sort': enum_item.get('sort', 0)
-                                        }
-                                        clean_enums.append(enum_data)
-                                    else:
-                                        # Se for string simples
-                                        clean_enums.append({'value': str(enum_item), 'sort': 0})
-                                
-                                if clean_enums:
-                                    field_data['enums'] = clean_enums
-                        else:
-                            # Para outros tipos, verificar se há enums desnecessários
-                            if master_field.get('enums'):
-                                logger.warning(f"Campo '{field_name}' do tipo '{field_type}' tem enums, mas este tipo não suporta. Ignorando enums.")
+                        if master_field.get('enums') and 'enums' not in field_data:
+                            logger.warning(f"Campo '{field_name}' do tipo '{field_type}' tem enums, mas este tipo não suporta. Ignorando enums.")
                         
                         # Log dos dados que serão enviados
                         logger.debug(f"Dados preparados para campo '{field_name}': {field_data}")
                         
-                        # ESTRATÉGIA ROBUSTA: Verificar se campo já existe - múltiplas tentativas
-                        existing_field = None
-                        slave_field_id = None
-                        match_method = ""
-                        
-                        # 1. Tentar encontrar por código (mais confiável)
-                        if field_code:
-                            for slave_field in all_slave_fields:
-                                if slave_field.get('code') == field_code:
-                                    existing_field = slave_field
-                                    slave_field_id = existing_field['id']
-                                    match_method = f"código '{field_code}'"
-                                    logger.info(f"✅ Campo encontrado por código '{field_code}': {existing_field['name']} (ID: {slave_field_id})")
-                                    break
-                        
-                        # 2. Se não encontrou por código, tentar por nome EXATO
-                        if not existing_field:
-                            for slave_field in all_slave_fields:
-                                if slave_field.get('name') == field_name:
-                                    existing_field = slave_field
-                                    slave_field_id = existing_field['id']
-                                    match_method = f"nome exato '{field_name}'"
-                                    logger.info(f"✅ Campo encontrado por nome exato '{field_name}' (ID: {slave_field_id})")
-                                    break
-                        
-                        # 3. Busca por nome similar (case-insensitive e similaridade)
-                        if not existing_field:
-                            for slave_field in all_slave_fields:
-                                slave_name = slave_field.get('name', '').lower().strip()
-                                master_name = field_name.lower().strip()
-                                
-                                # Verificar similaridade exata
-                                if slave_name == master_name:
-                                    existing_field = slave_field
-                                    slave_field_id = existing_field['id']
-                                    match_method = f"nome similar '{slave_field['name']}'"
-                                    logger.info(f"✅ Campo encontrado por nome similar '{slave_field['name']}' -> '{field_name}' (ID: {slave_field_id})")
-                                    break
-                                
-                                # Verificar se um nome contém o outro (para casos como popo -> popopa)
-                                elif (len(slave_name) >= 3 and len(master_name) >= 3 and 
-                                      (slave_name in master_name or master_name in slave_name) and
-                                      abs(len(slave_name) - len(master_name)) <= 3):  # Diferença máxima de 3 caracteres
-                                    existing_field = slave_field
-                                    slave_field_id = existing_field['id']
-                                    match_method = f"nome parcialmente similar '{slave_field['name']}'"
-                                    logger.info(f"✅ Campo encontrado por similaridade '{slave_field['name']}' -> '{field_name}' (ID: {slave_field_id})")
-                                    break
-                        
-                        # 4. Busca por tipo + nome normalizado (remove espaços/caracteres especiais)
-                        if not existing_field:
-                            import re
-                            master_normalized = re.sub(r'[^a-zA-Z0-9]', '', field_name.lower())
-                            for slave_field in all_slave_fields:
-                                slave_normalized = re.sub(r'[^a-zA-Z0-9]', '', slave_field.get('name', '').lower())
-                                slave_type = slave_field.get('type', '')
-                                
-                                # Verificar se o tipo convertido é compatível
-                                compatible_type = (slave_type == field_type or 
-                                                 (slave_type == 'date' and master_field['type'] == 'birthday') or
-                                                 (slave_type == 'date_time' and master_field['type'] == 'datetime'))
-                                
-                                if compatible_type and slave_normalized == master_normalized and len(master_normalized) > 2:
-                                    existing_field = slave_field
-                                    slave_field_id = existing_field['id']
-                                    match_method = f"tipo+nome normalizado '{slave_field['name']}'"
-                                    logger.info(f"✅ Campo encontrado por tipo+nome normalizado '{slave_field['name']}' -> '{field_name}' (ID: {slave_field_id})")
-                                    break
-                        
-                        # 5. ÚLTIMA TENTATIVA: Busca por características + similaridade de strings
-                        if not existing_field:
-                            # Função para calcular similaridade simples
-                            def string_similarity(s1, s2):
-                                s1, s2 = s1.lower(), s2.lower()
-                                if len(s1) == 0 or len(s2) == 0:
-                                    return 0
-                                # Calcular quantos caracteres em comum têm
-                                common = sum(1 for a, b in zip(s1, s2) if a == b)
-                                max_len = max(len(s1), len(s2))
-                                return common / max_len
-                            
-                            for slave_field in all_slave_fields:
-                                slave_name = slave_field.get('name', '')
-                                slave_type = slave_field.get('type', '')
-                                
-                                # Verificar se o tipo convertido é compatível
-                                compatible_type = (slave_type == field_type or 
-                                                 (slave_type == 'date' and master_field['type'] == 'birthday') or
-                                                 (slave_type == 'date_time' and master_field['type'] == 'datetime'))
-                                
-                                # Se tipo compatível e similaridade alta (>= 70%)
-                                similarity = string_similarity(slave_name, field_name)
-                                if compatible_type and similarity >= 0.7 and len(slave_name) >= 3:
-                                    existing_field = slave_field
-                                    slave_field_id = existing_field['id']
-                                    match_method = f"alta similaridade ({similarity:.0%}) '{slave_field['name']}'"
-                                    logger.info(f"✅ Campo encontrado por alta similaridade '{slave_field['name']}' -> '{field_name}' (ID: {slave_field_id}, {similarity:.0%})")
-                                    break
+                        # ESTRATÉGIA ROBUSTA: Verificar se campo já existe - código, nome exato, nome similar,
+                        # tipo+nome normalizado e alta similaridade, nessa ordem (ver CustomFieldMatchIndex)
+                        existing_field = slave_fields_by_id.get(known_field_ids.get(master_field['id']))
+                        if existing_field is not None:
+                            match_method = f"mapeamento salvo (ID {existing_field['id']})"
+                        else:
+                            existing_field, match_method = slave_fields_index.match(
+                                field_name, field_code,
+                                lambda slave_field: types_compatible(slave_field.get('type', ''), field_type, master_field['type'])
+                            )
+                        slave_field_id = existing_field['id'] if existing_field else None
                         
                         # Log final do resultado da busca
                         if existing_field:
@@ -2051,9 +2535,7 @@ class KommoSyncService:
                                 logger.info(f"ATUALIZANDO campo existente '{field_name}' (ID: {slave_field_id}) - diferenças detectadas")
                                 logger.debug(f"Dados da atualização: {update_data}")
                                 if update_data:  # Só fazer UPDATE se há dados para atualizar
-                                    slave_api.update_custom_field(entity_type, slave_field_id, update_data)
-                                    results['updated'] += 1
-                                    logger.info(f"Campo '{field_name}' atualizado com sucesso")
+                                    pending_updates.append((master_field, slave_field_id, update_data))
                                 else:
                                     logger.info(f"Campo '{field_name}' - nenhuma propriedade alterável detectada")
                                     results['skipped'] += 1
@@ -2078,40 +2560,11 @@ class KommoSyncService:
                                 logger.info(f"❌ Campo será criado SEM required_statuses específicos")
                             
                             logger.debug(f"Tipo original: {master_field['type']} -> Tipo enviado: {field_type}")
-                            response = slave_api.create_custom_field(entity_type, field_data)
-                            slave_field_id = response['_embedded']['custom_fields'][0]['id']
-                            results['created'] += 1
-                            logger.info(f"✅ Campo '{field_name}' criado com ID: {slave_field_id}")
-                            
-                            # Verificar se o campo foi criado com configurações corretas
-                            created_field = response['_embedded']['custom_fields'][0]
-                            
-                            if field_data.get('group_id'):
-                                actual_group_id = created_field.get('group_id')
-                                expected_group_id = field_data['group_id']
-                                if actual_group_id == expected_group_id:
-                                    logger.info(f"✅ Campo '{field_name}' criado no grupo correto: {actual_group_id}")
-                                else:
-                                    logger.error(f"❌ Campo '{field_name}' NÃO foi criado no grupo correto! Esperado: {expected_group_id}, Atual: {actual_group_id}")
-                            
-                            if field_data.get('required_statuses'):
-                                actual_required_statuses = created_field.get('required_statuses', [])
-                                expected_count = len(field_data['required_statuses'])
-                                actual_count = len(actual_required_statuses)
-                                if actual_count == expected_count:
-                                    logger.info(f"✅ Campo '{field_name}' criado com {actual_count} required_statuses corretos")
-                                else:
-                                    logger.error(f"❌ Campo '{field_name}' NÃO foi criado com required_statuses corretos! Esperado: {expected_count}, Atual: {actual_count}")
-                                    logger.debug(f"Expected: {field_data['required_statuses']}")
-                                    logger.debug(f"Actual: {actual_required_statuses}")
-                            
+                            pending_creates.append((master_field, field_data))
+                            continue
                         
                         # Armazenar mapeamento
-                        if 'custom_fields' not in mappings:
-                            mappings['custom_fields'] = {}
-                        if entity_type not in mappings['custom_fields']:
-                            mappings['custom_fields'][entity_type] = {}
-                        mappings['custom_fields'][entity_type][master_field['id']] = slave_field_id
+                        self._store_custom_field_mapping(mappings, entity_type, master_field['id'], slave_field_id)
                         
                     except Exception as e:
                         error_msg = f"Erro ao sincronizar campo '{master_field['name']}' para {entity_type}: {e}"
@@ -2132,36 +2585,9 @@ class KommoSyncService:
                                     logger.error(f"   - pipeline_id: {rs.get('pipeline_id')}, status_id: {rs.get('status_id')}")
                             
                             # Tentar criar o campo sem required_statuses como fallback
-                            logger.info(f"🔄 Tentando criar campo '{master_field['name']}' SEM required_statuses como fallback...")
-                            try:
-                                # Remover required_statuses dos dados
-                                fallback_field_data = field_data.copy()
-                                if 'required_statuses' in fallback_field_data:
-                                    del fallback_field_data['required_statuses']
-                                
-                                logger.info(f"📤 Criando campo SEM required_statuses:")
-                                logger.info(f"   Nome: {fallback_field_data.get('name')}")
-                                logger.info(f"   Tipo: {fallback_field_data.get('type')}")
-                                logger.info(f"   Grupo: {fallback_field_data.get('group_id', 'Sem grupo')}")
-                                
-                                fallback_response = slave_api.create_custom_field(entity_type, fallback_field_data)
-                                slave_field_id = fallback_response['_embedded']['custom_fields'][0]['id']
-                                
-                                logger.warning(f"⚠️ Campo '{master_field['name']}' criado SEM required_statuses específicos (ID: {slave_field_id})")
-                                logger.info(f"ℹ️ Campo estará disponível em todos os estágios do funil")
-                                
-                                results['created'] += 1
-                                
-                                # Armazenar mapeamento mesmo assim
-                                if 'custom_fields' not in mappings:
-                                    mappings['custom_fields'] = {}
-                                if entity_type not in mappings['custom_fields']:
-                                    mappings['custom_fields'][entity_type] = {}
-                                mappings['custom_fields'][entity_type][master_field['id']] = slave_field_id
-                                
-                            except Exception as fallback_error:
-                                logger.error(f"❌ Fallback também falhou: {fallback_error}")
-                                results['errors'].append(f"Fallback falhou para campo '{master_field['name']}': {fallback_error}")
+                            self._create_custom_field_without_required_statuses(
+                                slave_api, entity_type, master_field, field_data, results, mappings
+                            )
                         else:
                             logger.error(error_msg)
                             results['errors'].append(error_msg)
@@ -2169,7 +2595,15 @@ class KommoSyncService:
                         if progress_callback:
                             progress_callback(f"❌ Erro no campo '{master_field['name']}': {e}")
                 
+                # Enviar as criações e atualizações acumuladas em lotes
+                self._flush_custom_field_creates(slave_api, entity_type, pending_creates, results, mappings)
+                self._flush_custom_field_updates(slave_api, entity_type, pending_updates, results)
+                
                 # FASE 2: Deletar campos que existem na escrava mas NÃO existem na master
+                # (campos mapeados a um campo que continua na master nunca são deletados, mesmo com outro nome)
+                entity_field_ids = mappings.get('custom_fields', {}).get(entity_type, {})
+                mapped_slave_ids = {entity_field_ids[f['id']] for f in master_config['custom_fields'][entity_type]
+                                    if f['id'] in entity_field_ids}
                 fields_to_delete = []
                 for slave_field in all_slave_fields:
                     slave_field_name = slave_field.get('name', '')
@@ -2179,47 +2613,15 @@ class KommoSyncService:
                     if slave_field_code and slave_field_code.upper() in system_codes:
                         continue
                     
-                    # Verificar se o campo da escrava existe na master (por nome ou código)
-                    found_in_master = False
-                    
-                    # Verificar por nome
-                    if slave_field_name in master_field_names:
-                        found_in_master = True
-                    
-                    # Verificar por código
-                    elif slave_field_code and slave_field_code in master_field_codes:
-                        found_in_master = True
-                    
-                    # Verificar por similaridade (mesmo algoritmo usado na detecção)
-                    else:
-                        for master_field in master_config['custom_fields'][entity_type]:
-                            master_name = master_field['name'].lower().strip()
-                            slave_name = slave_field_name.lower().strip()
-                            
-                            # Verificar similaridade exata ou parcial
-                            if (slave_name == master_name or 
-                                (len(slave_name) >= 3 and len(master_name) >= 3 and 
-                                 (slave_name in master_name or master_name in slave_name) and
-                                 abs(len(slave_name) - len(master_name)) <= 3)):
-                                found_in_master = True
-                                break
-                            
-                            # Verificar alta similaridade (≥70%)
-                            def string_similarity(s1, s2):
-                                s1, s2 = s1.lower(), s2.lower()
-                                if len(s1) == 0 or len(s2) == 0:
-                                    return 0
-                                common = sum(1 for a, b in zip(s1, s2) if a == b)
-                                max_len = max(len(s1), len(s2))
-                                return common / max_len
-                            
-                            similarity = string_similarity(slave_name, master_name)
-                            if similarity >= 0.7 and len(slave_name) >= 3:
-                                found_in_master = True
-                                break
+                    # Verificar se o campo da escrava existe na master (por nome, código ou similaridade -
+                    # mesmo algoritmo usado na detecção)
+                    found_in_master = (slave_field.get('id') in mapped_slave_ids or
+                                       master_fields_index.has_counterpart(slave_field_name, slave_field_code))
                     
                     # Se não foi encontrado na master, marcar para exclusão
                     if not found_in_master:
+                        if fields_diff is not None and not fields_diff.allows_delete(slave_field_name):
+                            continue
                         fields_to_delete.append(slave_field)
                 
                 # Executar exclusões
@@ -2250,6 +2652,9 @@ class KommoSyncService:
                             error_msg = f"Erro ao deletar campo '{field_name}' de {entity_type}: {e}"
                             logger.error(error_msg)
                             results['errors'].append(error_msg)
+                
+                if self._checkpoint is not None and len(results['errors']) == errors_before and not self._stop_sync:
+                    self._checkpoint.complete_items(checkpoint_operation, [entity_type])
                         
             except Exception as e:
                 error_msg = f"Erro ao sincronizar campos personalizados para {entity_type}: {e}"
@@ -2264,12 +2669,18 @@ class KommoSyncService:
             logger.info(f"✅ Sincronização de campos COMPLETA! Grupos: {results.get('groups_created', 0)} criados, {results.get('groups_updated', 0)} atualizados, {results.get('groups_skipped', 0)} ignorados, {results.get('groups_deleted', 0)} deletados")
         logger.info(f"✅ Campos: {results['created']} criados, {results['updated']} atualizados, {results['skipped']} ignorados, {results['deleted']} deletados")
         
+        # Sincronização avulsa de campos: persistir a identidade dos campos para as próximas execuções
+        if sync_group_id and slave_account_id:
+            self._save_custom_field_mappings(mappings, sync_group_id, slave_account_id)
+        
         return results
     
     def sync_all_to_slave(self, slave_api: KommoAPIService, master_config: Dict, 
                          progress_callback: Optional[Callable] = None,
                          sync_group_id: Optional[int] = None, 
-                         slave_account_id: Optional[int] = None) -> Dict:
+                         slave_account_id: Optional[int] = None,
+                         previous_config: Optional[Dict] = None,
+                         checkpoints: Optional[SyncCheckpointStore] = None) -> Dict:
         """
         Sincroniza TODA a configuração da master para uma conta escrava - COM PROCESSAMENTO EM LOTES
         
@@ -2279,17 +2690,48 @@ class KommoSyncService:
             progress_callback: Função opcional para receber updates de progresso
             sync_group_id: ID do grupo de sincronização (opcional)
             slave_account_id: ID da conta slave (opcional)
+            previous_config: Última configuração da master aplicada nessa escrava. Quando informada
+                             (junto com os IDs, para usar os mapeamentos do banco), a sincronização é
+                             incremental: só o que mudou na master desde então vira operação na escrava.
+            checkpoints: Store de checkpoints. Quando informado (junto com os IDs), fases e lotes concluídos
+                         são gravados à medida que terminam e uma execução anterior interrompida com a mesma
+                         configuração da master é retomada do primeiro lote incompleto.
         """
-        logger.info("🚀 Iniciando sincronização COMPLETA em lotes da conta mestre para escrava...")
-        
-        # Reset da flag de parada
-        self._stop_sync = False
+        # Topologia de uma execução anterior pode estar desatualizada: é remontada nesta execução
+        self._topologies.pop(slave_api.subdomain, None)
         
         # Carregar mapeamentos existentes do banco se disponível
         if sync_group_id and slave_account_id:
             mappings = self._load_mappings_from_database(sync_group_id, slave_account_id)
+            mappings['custom_fields'] = self._load_custom_field_mappings(sync_group_id, slave_account_id, master_config)
         else:
             mappings = {'pipelines': {}, 'stages': {}, 'custom_field_groups': {}, 'roles': {}}
+        # As fases rodam em threads diferentes e escrevem nos mesmos mapeamentos
+        mappings = SharedMappings(mappings)
+        
+        # Checkpoint da execução (mapeamentos de uma execução interrompida são restaurados)
+        checkpoint = None
+        if checkpoints is not None and sync_group_id and slave_account_id:
+            try:
+                checkpoint = checkpoints.open(sync_group_id, slave_account_id, master_config)
+                checkpoint.attach(mappings)
+            except Exception as e:
+                logger.warning(f"⚠️ Não foi possível abrir o checkpoint da conta {slave_account_id}: {e}")
+                db.session.rollback()
+                checkpoint = None
+        self._checkpoint = checkpoint
+        
+        diff = None
+        if previous_config is not None and sync_group_id and slave_account_id:
+            diff = diff_master_configs(previous_config, master_config, self.entity_types)
+            logger.info("🚀 Iniciando sincronização INCREMENTAL da conta mestre para escrava...")
+        else:
+            logger.info("🚀 Iniciando sincronização COMPLETA em lotes da conta mestre para escrava...")
+        
+        # Reset da flag de parada (só aqui: as fases abaixo não a zeram)
+        self._stop_sync = False
+        self._in_full_sync = True
+        
         total_results = {
             'pipelines': {'created': 0, 'updated': 0, 'skipped': 0, 'deleted': 0, 'errors': []},
             'custom_field_groups': {'created': 0, 'updated': 0, 'skipped': 0, 'deleted': 0, 'errors': []},
@@ -2299,49 +2741,103 @@ class KommoSyncService:
         }
         
         try:
-            # FASE 1: Sincronizar pipelines (independentes)
-            if not self._stop_sync:
+            nothing_changed = diff is not None and diff.is_empty()
+            if nothing_changed:
+                logger.info("✅ Nada mudou na master desde a última sincronização desta escrava")
+            
+            # Fases como um DAG: pipelines (e seus estágios) -> campos (required_statuses usam os
+            # mapeamentos de estágios) e roles (permissões por pipeline/estágio); grupos de campos ->
+            # campos; task types independentes. Cada fase roda uma única vez e fases independentes
+            # rodam ao mesmo tempo.
+            def run_pipelines():
+                if nothing_changed or self._phase_done('pipelines'):
+                    return None
                 logger.info("📊 FASE 1: Sincronizando pipelines em lotes...")
-                pipeline_results = self.sync_pipelines_to_slave(slave_api, master_config, mappings, progress_callback)
+                pipeline_results = self.sync_pipelines_to_slave(slave_api, master_config, mappings, progress_callback,
+                                                                diff=diff)
                 total_results['pipelines'] = pipeline_results
+                self._complete_phase('pipelines', pipeline_results)
                 logger.info(f"Pipelines: {pipeline_results['created']} criados, {pipeline_results['updated']} atualizados, "
                            f"{pipeline_results['skipped']} ignorados, {pipeline_results['deleted']} deletados")
+                return pipeline_results
             
-            # FASE 2: Sincronizar grupos de campos (os campos dependem deles)
-            if not self._stop_sync:
+            def run_field_groups():
+                if nothing_changed or self._phase_done('custom_field_groups'):
+                    return None
                 logger.info("📁 FASE 2: Sincronizando grupos de campos em lotes...")
-                groups_results = self.sync_custom_field_groups_to_slave(slave_api, master_config, mappings, progress_callback)
+                groups_results = self.sync_custom_field_groups_to_slave(slave_api, master_config, mappings, progress_callback,
+                                                                        diff=diff)
                 total_results['custom_field_groups'] = groups_results
+                self._complete_phase('custom_field_groups', groups_results)
                 logger.info(f"Grupos: {groups_results['created']} criados, {groups_results['updated']} atualizados, "
                            f"{groups_results['skipped']} ignorados, {groups_results['deleted']} deletados")
+                return groups_results
             
-            # FASE 3: Sincronizar campos personalizados (agora que os grupos já existem)
-            if not self._stop_sync:
+            def run_fields():
+                if nothing_changed or self._phase_done('custom_fields'):
+                    return None
                 logger.info("🏷️ FASE 3: Sincronizando campos personalizados em lotes...")
-                fields_results = self.sync_custom_fields_to_slave(slave_api, master_config, mappings, progress_callback)
+                # Os grupos já foram sincronizados na fase custom_field_groups
+                fields_results = self.sync_custom_fields_to_slave(slave_api, master_config, mappings, progress_callback,
+                                                                  diff=diff, sync_groups=False)
                 total_results['custom_fields'] = fields_results
+                self._complete_phase('custom_fields', fields_results)
                 logger.info(f"Campos: {fields_results['created']} criados, {fields_results['updated']} atualizados, "
                            f"{fields_results['skipped']} ignorados, {fields_results['deleted']} deletados")
+                return fields_results
             
-            # FASE 4: Sincronizar task types
-            if not self._stop_sync:
+            def run_task_types():
+                if (diff is not None and not diff.task_types_changed) or self._phase_done('task_types'):
+                    return None
                 logger.info("🎯 FASE 4: Sincronizando task types...")
                 task_types_results = self.sync_task_types_to_slave(slave_api, master_config, slave_api.subdomain, progress_callback)
                 total_results['task_types'] = task_types_results
+                self._complete_phase('task_types', task_types_results)
                 logger.info(f"Task Types: {task_types_results['created']} criados, {task_types_results['updated']} atualizados, "
                            f"{task_types_results['skipped']} ignorados, {task_types_results['deleted']} deletados")
-            
-            # FASE 5: Sincronizar roles (funções/permissões)
-            if not self._stop_sync:
-                logger.info("🔐 FASE 5: Sincronizando roles em lotes...")
-                
-                # Salvar mapeamentos no banco antes de sincronizar roles (para garantir que estejam atualizados)
+                return task_types_results
+            
+            def run_roles():
+                if nothing_changed or (diff is not None and not diff.roles) or self._phase_done('roles'):
+                    return None
+                logger.info("🔐 FASE 5: Sincronizando roles...")
+                # Mapeamentos de pipelines/estágios já estão completos: gravados antes das roles (a fase
+                # de campos pode ainda estar escrevendo, por isso a cópia)
                 if sync_group_id and slave_account_id:
                     try:
-                        self._save_mappings_to_database(mappings, sync_group_id, slave_account_id)
-                        logger.info("💾 Mapeamentos salvos no banco")
+                        self._save_mappings_to_database(mappings.snapshot(), sync_group_id, slave_account_id)
                     except Exception as mapping_error:
                         logger.warning(f"⚠️ Erro ao salvar mapeamentos: {mapping_error}")
+                roles_results = self.sync_roles_to_slave(slave_api, master_config, mappings, progress_callback)
+                total_results['roles'] = roles_results
+                self._complete_phase('roles', roles_results)
+                logger.info(f"Roles: {roles_results['created']} criadas, {roles_results['skipped']} ignoradas, "
+                           f"{len(roles_results['errors'])} erros")
+                return roles_results
+            
+            phase_report = run_phases(
+                [
+                    Phase('pipelines', run_pipelines),
+                    Phase('custom_field_groups', run_field_groups),
+                    Phase('custom_fields', run_fields, depends_on=('pipelines', 'custom_field_groups')),
+                    Phase('roles', run_roles, depends_on=('pipelines',)),
+                    Phase('task_types', run_task_types)
+                ],
+                app=current_app._get_current_object() if has_app_context() else None,
+                max_workers=self.phase_workers,
+                should_stop=lambda: self._stop_sync
+            )
+            if phase_report.errors:
+                total_results['general_error'] = '; '.join(f"{name}: {error}" for name, error in phase_report.errors.items())
+            
+            # Salvar todos os mapeamentos da execução (inclusive os de campos, que podem ter terminado
+            # depois da fase de roles)
+            if not self._stop_sync and sync_group_id and slave_account_id:
+                try:
+                    self._save_mappings_to_database(mappings, sync_group_id, slave_account_id)
+                    logger.info("💾 Mapeamentos salvos no banco")
+                except Exception as mapping_error:
+                    logger.warning(f"⚠️ Erro ao salvar mapeamentos: {mapping_error}")
             
             # Calcular totais
             total_created = sum(results['created'] for results in total_results.values())
@@ -2365,14 +2861,49 @@ class KommoSyncService:
                 'total_skipped': total_skipped,
                 'total_deleted': total_deleted,
                 'total_errors': total_errors,
-                'interrupted': self._stop_sync
+                'interrupted': self._stop_sync,
+                # Resumo do diff quando a sincronização foi incremental
+                'incremental': diff.summary() if diff is not None else None,
+                # Retries feitos na conta escrava (erros transitórios recuperados)
+                'api_retries': slave_api.retry_stats.as_dict(),
+                'api_cache': {**slave_api.cache.stats(), 'coalesced': slave_api.single_flight.coalesced},
+                # Ordem, duração (s) e falhas de cada fase
+                'phases': phase_report.as_dict(),
+                # Ritmo adaptativo da escrava ao final da sincronização
+                'pacing': slave_api.pacer.as_dict() if self.adaptive_pacing else None,
+                # Trabalho reaproveitado do checkpoint de uma execução interrompida
+                'resumed': checkpoint.summary() if checkpoint is not None else None
             }
             
+            # Concluída sem erros: a próxima execução começa do zero
+            if checkpoint is not None and not self._stop_sync and total_errors == 0 and not phase_report.errors:
+                try:
+                    checkpoints.clear(sync_group_id, slave_account_id)
+                except Exception as clear_error:
+                    logger.warning(f"⚠️ Não foi possível remover o checkpoint: {clear_error}")
+                    db.session.rollback()
+            
         except Exception as e:
             logger.error(f"Erro geral na sincronização completa: {e}")
             total_results['general_error'] = str(e)
+        finally:
+            self._checkpoint = None
+            self._in_full_sync = False
         
         return total_results
+    
+    def _phase_done(self, phase: str) -> bool:
+        """Se a fase foi concluída em uma execução anterior (checkpoint)"""
+        if self._checkpoint is not None and self._checkpoint.phase_done(phase):
+            logger.info(f"⏭️ Fase {phase} já concluída em execução anterior, pulando")
+            return True
+        return False
+    
+    def _complete_phase(self, phase: str, results: Dict):
+        """Grava a fase no checkpoint se terminou sem erros e sem interrupção"""
+        if (self._checkpoint is not None and not results.get('errors') and not results.get('groups_errors')
+                and not self._stop_sync):
+            self._checkpoint.complete_phase(phase)
 
     def sync_roles_to_slave(self, slave_api: KommoAPIService, master_config: Dict,
                            mappings: Dict, progress_callback: Optional[Callable] = None) -> Dict:
@@ -0,0 +1,416 @@
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+import logging
+
+import aiohttp
+import requests
+
+from src.services.http_pool import session_pool
+from src.services.rate_limiter import get_rate_limiter
+from src.services.pacing import get_pacer
+from src.services.retry_policy import RetryPolicy, RetryStats, DEFAULT_RETRY_POLICY, retry_reason, select_retry_policy
+from src.services.kommo_api import KommoAPIService, build_task_types_form_data
+
+logger = logging.getLogger(__name__)
+
+# Conexões simultâneas por conta. O token bucket continua limitando as requisições
+# por segundo; este limite só evita abrir sockets demais para o mesmo host.
+DEFAULT_CONNECTION_LIMIT = 20
+
+
+def _to_requests_exception(error: BaseException) -> requests.exceptions.RequestException:
+    """
+    Converte exceções do aiohttp nas equivalentes do requests.
+
+    Assim o RetryPolicy classifica as falhas da mesma forma nos dois clientes e quem
+    chama pode continuar capturando requests.exceptions.RequestException.
+    """
+    if isinstance(error, requests.exceptions.RequestException):
+        return error
+    if isinstance(error, aiohttp.ClientConnectorError):
+        # Falha ao conectar: a requisição nunca chegou ao servidor
+        return requests.exceptions.ConnectTimeout(str(error))
+    if isinstance(error, (asyncio.TimeoutError, aiohttp.ServerTimeoutError)):
+        return requests.exceptions.ReadTimeout(str(error) or 'Timeout')
+    if isinstance(error, aiohttp.ClientConnectionError):
+        return requests.exceptions.ConnectionError(str(error))
+    return requests.exceptions.RequestException(str(error))
+
+
+class AsyncKommoAPIService:
+    """
+    Versão asyncio do KommoAPIService, com a mesma interface de métodos (todos awaitable).
+
+    Compartilha com o cliente síncrono o token bucket da conta e a política de retry,
+    então chamadas síncronas e assíncronas para o mesmo subdomínio somam no mesmo limite.
+    Deve ser usado dentro de um único event loop, preferencialmente com `async with`.
+    """
+
+    def __init__(self, subdomain: str, refresh_token: str, retry_policy: Optional[RetryPolicy] = None,
+                 endpoint_retry_policies: Optional[Dict[str, RetryPolicy]] = None,
+                 connection_limit: int = DEFAULT_CONNECTION_LIMIT):
+        self.subdomain = subdomain
+        self.refresh_token = refresh_token
+        self.base_url = f"https://{subdomain}.kommo.com/api/v4"
+        self.connection_limit = connection_limit
+        self.rate_limiter = get_rate_limiter(subdomain)
+        self.pacer = get_pacer(subdomain)
+        self.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+        self.endpoint_retry_policies = endpoint_retry_policies or {}
+        self.retry_stats = RetryStats()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> 'AsyncKommoAPIService':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        """Cria a sessão na primeira chamada (precisa acontecer dentro do event loop)"""
+        if self._session is None or self._session.closed:
+            connect_timeout, read_timeout = session_pool.timeout
+            timeout = aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)
+            connector = aiohttp.TCPConnector(limit_per_host=self.connection_limit, keepalive_timeout=30)
+            self._session = aiohttp.ClientSession(timeout=timeout, connector=connector)
+        return self._session
+
+    async def close(self):
+        """Fecha a sessão HTTP"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _get_retry_policy(self, method: str, endpoint: str) -> RetryPolicy:
+        """Retorna a política de retry do endpoint (sobrescrita mais específica) ou a padrão"""
+        return select_retry_policy(self.retry_policy, self.endpoint_retry_policies, method, endpoint)
+
+    async def _acquire_token(self):
+        wait = self.rate_limiter.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def _send_with_retry(self, method: str, url: str, endpoint: str, **kwargs) -> Tuple[int, Dict, str]:
+        """
+        Envia a requisição respeitando rate limit e política de retry.
+
+        Retorna (status, headers, texto). Exceções do aiohttp são convertidas para requests.
+        """
+        policy = self._get_retry_policy(method, endpoint)
+        session = self._get_session()
+        attempt = 1
+
+        while True:
+            await self._acquire_token()
+            self.retry_stats.record_request()
+            started = time.monotonic()
+            try:
+                async with session.request(method, url, **kwargs) as response:
+                    status = response.status
+                    headers = dict(response.headers)
+                    text = await response.text()
+            except Exception as e:
+                if not isinstance(e, (aiohttp.ClientError, asyncio.TimeoutError)):
+                    raise
+                error = _to_requests_exception(e)
+                self.pacer.record_failure()
+                if policy.should_retry(attempt, method, exception=error):
+                    delay = policy.backoff(attempt)
+                    self.retry_stats.record_retry(retry_reason(exception=error))
+                    logger.warning(f"🔁 Falha transitória em {method} {url} ({type(error).__name__}). "
+                                   f"Tentativa {attempt}/{policy.max_attempts}, aguardando {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                if policy.classify(method, exception=error) == 'transient':
+                    self.retry_stats.record_gave_up()
+                raise error from e
+
+            logger.debug(f"Status da resposta: {status}")
+            self.pacer.record_response(status, time.monotonic() - started)
+
+            if policy.should_retry(attempt, method, status_code=status):
+                retry_after = None
+                if headers.get('Retry-After', '').isdigit():
+                    retry_after = int(headers['Retry-After'])
+                delay = policy.backoff(attempt, retry_after)
+                self.retry_stats.record_retry(retry_reason(status_code=status))
+                if status == 429:
+                    logger.warning(f"Rate limit atingido. Aguardando {delay:.1f} segundos...")
+                    # Pausa o bucket compartilhado; a espera acontece no próximo _acquire_token
+                    self.rate_limiter.pause(delay)
+                else:
+                    logger.warning(f"🔁 HTTP {status} em {method} {url}. "
+                                   f"Tentativa {attempt}/{policy.max_attempts}, aguardando {delay:.1f}s...")
+                    await asyncio.sleep(delay)
+                attempt += 1
+                continue
+
+            if policy.classify(method, status_code=status) == 'transient':
+                self.retry_stats.record_gave_up()
+            return status, headers, text
+
+    @staticmethod
+    def _parse_json(text: str) -> Any:
+        return json.loads(text)
+
+    async def _make_request(self, method: str, endpoint: str, data: Optional[Any] = None,
+                            params: Optional[Dict] = None) -> Dict:
+        """Faz uma requisição para a API v4 do Kommo"""
+        url = f"{self.base_url}/{endpoint.lstrip('/')}"
+        headers = {
+            'Authorization': f'Bearer {self.refresh_token}',
+            'Content-Type': 'application/json'
+        }
+
+        logger.debug(f"Fazendo requisição assíncrona {method} para {url}")
+
+        kwargs = {'headers': headers}
+        if data is not None:
+            kwargs['json'] = data
+        if params:
+            kwargs['params'] = {key: str(value) for key, value in params.items()}
+
+        status, _, text = await self._send_with_retry(method, url, endpoint, **kwargs)
+
+        if status >= 400:
+            logger.error(f"Erro HTTP {status} para {url}")
+            logger.error(f"Resposta: {text}")
+            raise requests.exceptions.HTTPError(f"{status} Error for url: {url}")
+
+        # DELETE (204) e outras respostas vazias
+        if not text.strip():
+            if method.upper() != 'DELETE':
+                logger.warning(f"Resposta vazia para {method} {url} - Status {status}")
+            return {'success': True, 'status_code': status}
+
+        try:
+            return self._parse_json(text)
+        except ValueError as e:
+            if method.upper() == 'DELETE' and status in [200, 204]:
+                return {'success': True, 'status_code': status}
+            logger.error(f"Erro ao fazer parse JSON da resposta de {url}: {e}")
+            raise
+
+    async def _make_ajax_request(self, method: str, endpoint: str, data: Optional[Dict] = None,
+                                 form_data: Optional[str] = None) -> Dict:
+        """Faz uma requisição AJAX para endpoints específicos que não usam a API v4"""
+        url = f"https://{self.subdomain}.kommo.com{endpoint}"
+        headers = {
+            'Authorization': f'Bearer {self.refresh_token}',
+            'X-Requested-With': 'XMLHttpRequest'
+        }
+
+        kwargs = {'headers': headers}
+        if form_data:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            kwargs['data'] = form_data
+        elif data:
+            headers['Content-Type'] = 'application/json'
+            kwargs['json'] = data
+
+        logger.debug(f"Fazendo requisição AJAX assíncrona {method} para {url}")
+
+        status, _, text = await self._send_with_retry(method, url, endpoint, **kwargs)
+
+        if status >= 400:
+            logger.error(f"Erro HTTP {status} para {url}")
+            logger.error(f"Resposta: {text}")
+            raise requests.exceptions.HTTPError(f"{status} Error for url: {url}")
+
+        return self._parse_json(text)
+
+    async def _get_all_pages(self, endpoint: str, embedded_key: str, params: Optional[Dict] = None,
+                             limit: int = KommoAPIService.MAX_PAGE_LIMIT) -> List[Dict]:
+        """Lê todas as páginas de uma listagem da API v4, seguindo _links.next"""
+        limit = max(1, min(int(limit), KommoAPIService.MAX_PAGE_LIMIT))
+        items: List[Dict] = []
+        page = 1
+        while True:
+            response = await self._make_request('GET', endpoint, params={**(params or {}), 'page': page, 'limit': limit})
+            page_items = KommoAPIService._extract_embedded(response, embedded_key)
+            items.extend(page_items)
+            if not page_items or not isinstance(response, dict) or not response.get('_links', {}).get('next'):
+                return items
+            page += 1
+
+    # Pipelines e estágios
+    async def get_pipelines(self, with_descriptions: bool = False) -> List[Dict]:
+        """Obtém todos os pipelines da conta (estágios com descrições buscados em paralelo)"""
+        response = await self._make_request('GET', '/leads/pipelines')
+        pipelines = response.get('_embedded', {}).get('pipelines', [])
+
+        if with_descriptions and pipelines:
+            stages_per_pipeline = await asyncio.gather(*[
+                self.get_pipeline_stages(pipeline['id'], with_descriptions=True) for pipeline in pipelines
+            ])
+            for pipeline, stages in zip(pipelines, stages_per_pipeline):
+                pipeline.setdefault('_embedded', {})['statuses'] = stages
+
+        return pipelines
+
+    async def get_pipeline_stages(self, pipeline_id: int, with_descriptions: bool = False) -> List[Dict]:
+        """Obtém todos os estágios de um pipeline específico"""
+        params = {'with': 'required_fields'}
+        if with_descriptions:
+            params['with'] = 'required_fields,descriptions'
+        response = await self._make_request('GET', f'/leads/pipelines/{pipeline_id}/statuses', params=params)
+        return response.get('_embedded', {}).get('statuses', [])
+
+    async def create_pipeline(self, pipeline_data: Dict) -> Dict:
+        """Cria um novo pipeline"""
+        return await self._make_request('POST', '/leads/pipelines', data=[pipeline_data])
+
+    async def update_pipeline(self, pipeline_id: int, pipeline_data: Dict) -> Dict:
+        """Atualiza um pipeline existente"""
+        return await self._make_request('PATCH', f'/leads/pipelines/{pipeline_id}', data=pipeline_data)
+
+    async def delete_pipeline(self, pipeline_id: int) -> Dict:
+        """Deleta um pipeline"""
+        return await self._make_request('DELETE', f'/leads/pipelines/{pipeline_id}')
+
+    async def create_pipeline_stage(self, pipeline_id: int, stage_data: Dict) -> Dict:
+        """Cria um novo estágio em um pipeline"""
+        return await self._make_request('POST', f'/leads/pipelines/{pipeline_id}/statuses', data=[stage_data])
+
+    async def update_pipeline_stage(self, pipeline_id: int, stage_id: int, stage_data: Dict) -> Dict:
+        """Atualiza um estágio existente"""
+        return await self._make_request('PATCH', f'/leads/pipelines/{pipeline_id}/statuses/{stage_id}', data=stage_data)
+
+    async def delete_pipeline_stage(self, pipeline_id: int, stage_id: int) -> Dict:
+        """Deleta um estágio de pipeline"""
+        return await self._make_request('DELETE', f'/leads/pipelines/{pipeline_id}/statuses/{stage_id}')
+
+    # Campos personalizados e grupos
+    async def get_custom_fields(self, entity_type: str) -> List[Dict]:
+        """Obtém todos os campos personalizados para uma entidade (leads, contacts, companies)"""
+        params = {'with': 'required_statuses,enums'}
+        return await self._get_all_pages(f'/{entity_type}/custom_fields', 'custom_fields', params)
+
+    async def get_custom_field_groups(self, entity_type: str) -> List[Dict]:
+        """Obtém todos os grupos de campos personalizados para uma entidade"""
+        try:
+            return await self._get_all_pages(f'/{entity_type}/custom_fields/groups', 'custom_field_groups')
+        except Exception as e:
+            logger.error(f"Erro ao obter grupos de campos para {entity_type}: {e}")
+            return []
+
+    async def create_custom_field_group(self, entity_type: str, group_data: Dict) -> Dict:
+        """Cria um novo grupo de campos personalizados"""
+        return await self._make_request('POST', f'/{entity_type}/custom_fields/groups', data=[group_data])
+
+    async def update_custom_field_group(self, entity_type: str, group_id: int, group_data: Dict) -> Dict:
+        """Atualiza um grupo de campos personalizados existente"""
+        return await self._make_request('PATCH', f'/{entity_type}/custom_fields/groups/{group_id}', data=group_data)
+
+    async def delete_custom_field_group(self, entity_type: str, group_id: int) -> Dict:
+        """Deleta um grupo de campos personalizados"""
+        return await self._make_request('DELETE', f'/{entity_type}/custom_fields/groups/{group_id}')
+
+    async def create_custom_field(self, entity_type: str, field_data: Dict) -> Dict:
+        """Cria um novo campo personalizado"""
+        return await self._make_request('POST', f'/{entity_type}/custom_fields', data=[field_data])
+
+    async def update_custom_field(self, entity_type: str, field_id: int, field_data: Dict) -> Dict:
+        """Atualiza um campo personalizado existente"""
+        return await self._make_request('PATCH', f'/{entity_type}/custom_fields/{field_id}', data=field_data)
+
+    async def delete_custom_field(self, entity_type: str, field_id: int) -> Dict:
+        """Deleta um campo personalizado"""
+        return await self._make_request('DELETE', f'/{entity_type}/custom_fields/{field_id}')
+
+    # Usuários e roles
+    async def get_users(self) -> List[Dict]:
+        """Obtém todos os usuários da conta"""
+        return await self._get_all_pages('/users', 'users')
+
+    async def get_user(self, user_id: int) -> Dict:
+        """Obtém informações de um usuário específico"""
+        return await self._make_request('GET', f'/users/{user_id}')
+
+    async def get_roles(self) -> List[Dict]:
+        """Obtém todas as roles (funções/permissões) da conta"""
+        return await self._get_all_pages('/roles', 'roles')
+
+    async def get_role(self, role_id: int) -> Dict:
+        """Obtém informações de uma role específica"""
+        return await self._make_request('GET', f'/roles/{role_id}')
+
+    async def create_role(self, role_data: Dict) -> Dict:
+        """Cria uma nova role"""
+        return await self._make_request('POST', '/roles', data=[role_data])
+
+    async def update_role(self, role_id: int, role_data: Dict) -> Dict:
+        """Atualiza uma role existente"""
+        return await self._make_request('PATCH', f'/roles/{role_id}', data=role_data)
+
+    async def delete_role(self, role_id: int) -> Dict:
+        """Deleta uma role"""
+        return await self._make_request('DELETE', f'/roles/{role_id}')
+
+    async def get_account_info(self) -> Dict:
+        """Obtém informações da conta"""
+        return await self._make_request('GET', '/account')
+
+    async def test_connection(self) -> bool:
+        """Testa se a conexão com a API está funcionando"""
+        try:
+            await self._make_request('GET', '/account')
+            return True
+        except Exception as e:
+            logger.error(f"Falha no teste de conexão ({self.subdomain}): {e}")
+            return False
+
+    # Task types (endpoints AJAX)
+    async def get_task_types(self) -> Dict:
+        """Obtém todos os tipos de tarefas da conta"""
+        return await self._make_ajax_request('GET', '/ajax/tasks/types')
+
+    async def update_task_types(self, task_types_data: List[Dict], types_to_delete: List[int] = None) -> Dict:
+        """Atualiza os tipos de tarefas usando form data"""
+        form_data = build_task_types_form_data(task_types_data, types_to_delete)
+        return await self._make_ajax_request('POST', '/ajax/tasks/types', form_data=form_data)
+
+
+async def gather_limited(coroutines: Iterable[Awaitable], limit: int = 10) -> List[Any]:
+    """
+    Executa as corrotinas com no máximo `limit` em andamento ao mesmo tempo.
+
+    Retorna os resultados na ordem de entrada; exceções são retornadas no lugar do resultado.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*[run(c) for c in coroutines], return_exceptions=True)
+
+
+def run_for_accounts(accounts: List[Tuple[str, str]],
+                     operation: Callable[[AsyncKommoAPIService], Awaitable[Any]],
+                     max_concurrency: int = 10) -> List[Any]:
+    """
+    Executa `operation` para várias contas em um único event loop.
+
+    Args:
+        accounts: Lista de (subdomain, refresh_token)
+        operation: Corrotina que recebe o AsyncKommoAPIService da conta
+        max_concurrency: Número máximo de contas processadas ao mesmo tempo
+
+    Returns:
+        Resultados na mesma ordem de `accounts` (exceções no lugar do resultado)
+    """
+    async def run_one(subdomain: str, refresh_token: str):
+        async with AsyncKommoAPIService(subdomain, refresh_token) as api:
+            return await operation(api)
+
+    async def run_all():
+        return await gather_limited([run_one(s, t) for s, t in accounts], max_concurrency)
+
+    started_at = time.monotonic()
+    results = asyncio.run(run_all())
+    logger.debug(f"⚡ {len(accounts)} contas processadas em {time.monotonic() - started_at:.2f}s")
+    return results
@@ -0,0 +1,189 @@
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from src.database import db
+from src.models.kommo_account import AccountPacingState
+
+logger = logging.getLogger(__name__)
+
+# Limites do tamanho de lote e do delay entre lotes ajustados automaticamente
+PACING_MIN_BATCH = int(os.getenv('KOMMO_PACING_MIN_BATCH', '1'))
+PACING_MAX_BATCH = int(os.getenv('KOMMO_PACING_MAX_BATCH', '50'))
+PACING_MAX_DELAY = float(os.getenv('KOMMO_PACING_MAX_DELAY', '10.0'))
+# Aumento aditivo a cada lote saudável
+PACING_BATCH_STEP = int(os.getenv('KOMMO_PACING_BATCH_STEP', '2'))
+PACING_DELAY_STEP = float(os.getenv('KOMMO_PACING_DELAY_STEP', '0.25'))
+# Redução multiplicativa quando a conta dá sinais de sobrecarga
+PACING_BACKOFF = float(os.getenv('KOMMO_PACING_BACKOFF', '0.5'))
+PACING_MIN_BACKOFF_DELAY = float(os.getenv('KOMMO_PACING_MIN_BACKOFF_DELAY', '0.5'))
+# Latência média do lote acima de X vezes a referência conta como pico
+PACING_LATENCY_SPIKE = float(os.getenv('KOMMO_PACING_LATENCY_SPIKE', '2.0'))
+# Fração de itens com erro a partir da qual o lote não é saudável
+PACING_MAX_ERROR_RATE = float(os.getenv('KOMMO_PACING_MAX_ERROR_RATE', '0.2'))
+# Peso de cada lote saudável na latência de referência (média móvel exponencial)
+PACING_LATENCY_ALPHA = 0.2
+
+
+class AdaptivePacer:
+    """
+    Tamanho de lote e delay entre lotes de uma conta Kommo, ajustados por AIMD.
+
+    KommoAPIService registra cada resposta (status e latência) no pacer do subdomínio.
+    _process_in_batches consulta batch_size/delay antes de cada lote e, ao final dele,
+    chama end_batch: se não houve 429, 5xx/timeouts, pico de latência nem muitos itens com
+    erro, o lote cresce e o delay diminui aos poucos (aumento aditivo); caso contrário o lote
+    cai pela metade e o delay dobra (redução multiplicativa).
+    """
+
+    def __init__(self, subdomain: str, batch_size: int = 10, delay: float = 0.0):
+        self.subdomain = subdomain
+        self.batch_size = batch_size
+        self.delay = delay
+        self.latency_baseline: Optional[float] = None
+        # Se o estado já foi restaurado do banco (ou inicializado com a configuração da sincronização)
+        self.initialized = False
+        self._responses = 0
+        self._throttled = 0
+        self._server_errors = 0
+        self._latency_total = 0.0
+        self._lock = threading.Lock()
+
+    def record_response(self, status_code: int, latency: float):
+        with self._lock:
+            self._responses += 1
+            self._latency_total += latency
+            if status_code == 429:
+                self._throttled += 1
+            elif status_code >= 500:
+                self._server_errors += 1
+
+    def record_failure(self):
+        """Requisição sem resposta (timeout, conexão resetada)"""
+        with self._lock:
+            self._server_errors += 1
+
+    def begin_batch(self) -> Tuple[int, int, int, float]:
+        with self._lock:
+            return self._responses, self._throttled, self._server_errors, self._latency_total
+
+    def end_batch(self, started: Tuple[int, int, int, float], items: int, failed: int) -> str:
+        """Ajusta lote e delay a partir do que aconteceu desde begin_batch; retorna 'increase' ou 'decrease'"""
+        with self._lock:
+            responses = self._responses - started[0]
+            throttled = self._throttled - started[1]
+            server_errors = self._server_errors - started[2]
+            latency = (self._latency_total - started[3]) / responses if responses else None
+
+            reasons = []
+            if throttled:
+                reasons.append(f"{throttled}x 429")
+            if server_errors:
+                reasons.append(f"{server_errors} erros 5xx/timeout")
+            if items and failed / items > PACING_MAX_ERROR_RATE:
+                reasons.append(f"{failed}/{items} itens com erro")
+            if latency is not None and self.latency_baseline and latency > self.latency_baseline * PACING_LATENCY_SPIKE:
+                reasons.append(f"latência {latency:.2f}s (referência {self.latency_baseline:.2f}s)")
+
+            if reasons:
+                self.batch_size = max(PACING_MIN_BATCH, int(self.batch_size * PACING_BACKOFF))
+                self.delay = min(PACING_MAX_DELAY, max(self.delay / PACING_BACKOFF, PACING_MIN_BACKOFF_DELAY))
+                logger.warning(f"🐢 {self.subdomain}: reduzindo ritmo ({', '.join(reasons)}) -> "
+                               f"lote {self.batch_size}, delay {self.delay:.2f}s")
+                return 'decrease'
+
+            if latency is not None:
+                self.latency_baseline = (latency if self.latency_baseline is None else
+                                         (1 - PACING_LATENCY_ALPHA) * self.latency_baseline + PACING_LATENCY_ALPHA * latency)
+            self.batch_size = min(PACING_MAX_BATCH, self.batch_size + PACING_BATCH_STEP)
+            self.delay = max(0.0, self.delay - PACING_DELAY_STEP)
+            return 'increase'
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'batch_size': self.batch_size,
+                'delay': round(self.delay, 2),
+                'latency_baseline': round(self.latency_baseline, 3) if self.latency_baseline else None
+            }
+
+
+class PacerRegistry:
+    """
+    Um AdaptivePacer por subdomínio, compartilhado por todas as instâncias do processo.
+    O estado é gravado na tabela account_pacing_states para que cada conta continue, na
+    próxima execução (ou depois de um reinício), do ritmo em que parou.
+    """
+
+    def __init__(self):
+        self._pacers: Dict[str, AdaptivePacer] = {}
+        self._lock = threading.Lock()
+
+    def get(self, subdomain: str) -> AdaptivePacer:
+        with self._lock:
+            pacer = self._pacers.get(subdomain)
+            if pacer is None:
+                pacer = self._pacers[subdomain] = AdaptivePacer(subdomain)
+            return pacer
+
+    def restore(self, pacer: AdaptivePacer, batch_size: int, delay: float) -> AdaptivePacer:
+        """
+        Na primeira sincronização da conta neste processo: carrega o estado gravado ou, se a
+        conta ainda não tem histórico, parte da configuração da sincronização.
+        """
+        if pacer.initialized:
+            return pacer
+        state = None
+        try:
+            state = db.session.get(AccountPacingState, pacer.subdomain)
+        except Exception as e:
+            logger.debug(f"Estado de ritmo de {pacer.subdomain} indisponível: {e}")
+        with pacer._lock:
+            if not pacer.initialized:
+                if state is not None:
+                    pacer.batch_size = min(PACING_MAX_BATCH, max(PACING_MIN_BATCH, state.batch_size))
+                    pacer.delay = min(PACING_MAX_DELAY, max(0.0, state.delay))
+                    pacer.latency_baseline = state.latency_baseline
+                    logger.info(f"🎚️ {pacer.subdomain}: retomando ritmo da última execução "
+                                f"(lote {pacer.batch_size}, delay {pacer.delay:.2f}s)")
+                else:
+                    pacer.batch_size = min(PACING_MAX_BATCH, max(PACING_MIN_BATCH, int(batch_size)))
+                    pacer.delay = min(PACING_MAX_DELAY, max(0.0, float(delay)))
+                pacer.initialized = True
+        return pacer
+
+    def save(self, pacer: AdaptivePacer):
+        """Upsert do estado com conexão própria (não interfere na sessão da sincronização)"""
+        table = AccountPacingState.__table__
+        state = pacer.as_dict()
+        values = {
+            'batch_size': state['batch_size'],
+            'delay': pacer.delay,
+            'latency_baseline': pacer.latency_baseline,
+            'updated_at': datetime.utcnow()
+        }
+        try:
+            with db.engine.begin() as connection:
+                updated = connection.execute(
+                    table.update().where(table.c.subdomain == pacer.subdomain).values(**values)
+                ).rowcount
+                if not updated:
+                    connection.execute(table.insert().values(subdomain=pacer.subdomain, **values))
+        except IntegrityError:
+            with db.engine.begin() as connection:
+                connection.execute(table.update().where(table.c.subdomain == pacer.subdomain).values(**values))
+        except Exception as e:
+            logger.warning(f"⚠️ Não foi possível gravar o ritmo de {pacer.subdomain}: {e}")
+
+
+# Registro compartilhado por todo o processo
+pacers = PacerRegistry()
+
+
+def get_pacer(subdomain: str) -> AdaptivePacer:
+    """Atalho para obter o pacer do subdomínio no registro compartilhado"""
+    return pacers.get(subdomain)
@@ -0,0 +1,135 @@
+import contextvars
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from src.database import db
+
+logger = logging.getLogger(__name__)
+
+# Fases independentes de uma mesma escrava executadas ao mesmo tempo
+DEFAULT_PHASE_WORKERS = int(os.getenv('KOMMO_PHASE_WORKERS', '3'))
+
+
+class Phase(NamedTuple):
+    """Fase da sincronização: só começa depois que todas as fases em depends_on terminaram"""
+    name: str
+    run: Callable[[], Any]
+    depends_on: Tuple[str, ...] = ()
+
+
+class PhaseRunReport:
+    """Resultado de run_phases: retorno, erro e tempo (s) de cada fase"""
+
+    def __init__(self):
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, Exception] = {}
+        self.skipped: Dict[str, str] = {}
+        self.timings: Dict[str, float] = {}
+        self.order: List[str] = []  # ordem em que as fases terminaram
+
+    def as_dict(self) -> Dict:
+        return {
+            'order': list(self.order),
+            'timings': dict(self.timings),
+            'errors': {name: str(error) for name, error in self.errors.items()},
+            'skipped': dict(self.skipped)
+        }
+
+
+def _check_graph(phases: List[Phase]):
+    names = [phase.name for phase in phases]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Fases duplicadas: {names}")
+    by_name = {phase.name: phase for phase in phases}
+    for phase in phases:
+        missing = [dep for dep in phase.depends_on if dep not in by_name]
+        if missing:
+            raise ValueError(f"Fase '{phase.name}' depende de fases inexistentes: {missing}")
+
+    # Ordenação topológica só para detectar ciclos
+    visiting, done = set(), set()
+
+    def visit(name: str):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Ciclo de dependências envolvendo a fase '{name}'")
+        visiting.add(name)
+        for dep in by_name[name].depends_on:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in names:
+        visit(name)
+
+
+def run_phases(phases: List[Phase], app=None, max_workers: int = DEFAULT_PHASE_WORKERS,
+               should_stop: Optional[Callable[[], bool]] = None) -> PhaseRunReport:
+    """
+    Executa as fases respeitando as dependências (DAG): cada fase roda uma única vez, assim que
+    as fases das quais depende terminam, e fases independentes rodam ao mesmo tempo.
+
+    Uma fase que lança exceção não interrompe as demais, mas as fases que dependem dela
+    (direta ou indiretamente) não são executadas. Com should_stop() verdadeiro nenhuma fase
+    nova é iniciada.
+
+    Args:
+        app: aplicação Flask; cada fase roda no seu próprio app context (sessão do banco própria)
+    """
+    _check_graph(phases)
+    report = PhaseRunReport()
+    pending = {phase.name: phase for phase in phases}
+
+    def execute(phase: Phase):
+        started = time.monotonic()
+        try:
+            if app is None:
+                return phase.run()
+            with app.app_context():
+                try:
+                    return phase.run()
+                finally:
+                    db.session.remove()
+        finally:
+            report.timings[phase.name] = round(time.monotonic() - started, 3)
+
+    def skip_dependents(name: str, reason: str):
+        for other in list(pending.values()):
+            if name in other.depends_on and other.name in pending:
+                del pending[other.name]
+                report.skipped[other.name] = reason
+                skip_dependents(other.name, reason)
+
+    workers = max(1, min(int(max_workers or 1), len(phases) or 1))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sync-phase') as executor:
+        running = {}
+        while pending or running:
+            if should_stop and should_stop():
+                for name in list(pending):
+                    report.skipped[name] = 'interrompida'
+                pending.clear()
+
+            for phase in [phase for phase in pending.values() if all(dep in report.results for dep in phase.depends_on)]:
+                del pending[phase.name]
+                # Cada fase roda com uma cópia do contexto atual (ex.: o job em execução)
+                running[executor.submit(contextvars.copy_context().run, execute, phase)] = phase
+
+            if not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                phase = running.pop(future)
+                report.order.append(phase.name)
+                try:
+                    report.results[phase.name] = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Fase {phase.name} falhou: {e}")
+                    report.errors[phase.name] = e
+                    skip_dependents(phase.name, f"depende de {phase.name}, que falhou")
+
+    return report
@@ -0,0 +1,109 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# O Kommo documenta um limite de 7 requisições por segundo por conta.
+# Trabalhamos um pouco abaixo do limite para nunca receber 429.
+KOMMO_DOCUMENTED_RATE = 7.0
+DEFAULT_RATE = float(os.getenv('KOMMO_RATE_LIMIT_PER_SECOND', '6'))
+DEFAULT_BURST = float(os.getenv('KOMMO_RATE_LIMIT_BURST', '6'))
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe.
+
+    reserve() reserva um token e retorna quantos segundos o chamador deve esperar
+    antes de usá-lo, sem dormir. Isso permite que o mesmo bucket seja usado por
+    código síncrono (acquire) e assíncrono (await asyncio.sleep(reserve())).
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: float = DEFAULT_BURST):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated_at = now
+
+    def reserve(self, tokens: float = 1.0) -> float:
+        """Reserva tokens e retorna o tempo de espera (em segundos) até poder usá-los"""
+        with self._lock:
+            now = time.monotonic()
+            # Durante uma pausa (ex: após 429) os tokens não são repostos
+            if now < self._paused_until:
+                self._updated_at = max(self._updated_at, self._paused_until)
+            else:
+                self._refill(now)
+            self._tokens -= tokens
+            wait = 0.0
+            if self._tokens < 0:
+                wait = -self._tokens / self.rate
+            if self._paused_until > now:
+                wait += self._paused_until - now
+            return wait
+
+    def acquire(self, tokens: float = 1.0):
+        """Bloqueia até que os tokens estejam disponíveis"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug(f"⏳ Rate limiter aguardando {wait:.2f}s")
+            time.sleep(wait)
+
+    def pause(self, seconds: float):
+        """Suspende a emissão de tokens (usado quando a API responde 429 com Retry-After)"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+
+class RateLimiterRegistry:
+    """Mantém um TokenBucket por subdomínio, compartilhado entre threads e instâncias"""
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: float = DEFAULT_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def get(self, subdomain: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(subdomain)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.capacity)
+                self._buckets[subdomain] = bucket
+            return bucket
+
+    def configure(self, rate: Optional[float] = None, capacity: Optional[float] = None):
+        """Altera o limite padrão. Buckets existentes são atualizados imediatamente."""
+        with self._lock:
+            if rate is not None:
+                self.rate = rate
+            if capacity is not None:
+                self.capacity = capacity
+            for bucket in self._buckets.values():
+                with bucket._lock:
+                    bucket.rate = float(self.rate)
+                    bucket.capacity = float(self.capacity)
+                    bucket._tokens = min(bucket._tokens, bucket.capacity)
+
+
+# Registro compartilhado por todo o processo
+rate_limiters = RateLimiterRegistry()
+
+
+def get_rate_limiter(subdomain: str) -> TokenBucket:
+    """Atalho para obter o bucket do subdomínio no registro compartilhado"""
+    return rate_limiters.get(subdomain)
@@ -0,0 +1,136 @@
+import copy
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = float(os.getenv('KOMMO_CACHE_TTL', '60'))
+DEFAULT_MAX_ENTRIES = int(os.getenv('KOMMO_CACHE_MAX_ENTRIES', '256'))
+
+_MISSING = object()
+
+
+def _normalize_path(endpoint: str) -> str:
+    return '/' + endpoint.split('?', 1)[0].strip('/')
+
+
+class ResponseCache:
+    """
+    Cache de respostas GET com TTL e limite LRU, usado por conta no KommoAPIService.
+
+    As chaves são (endpoint, parâmetros ordenados). Os valores são devolvidos como
+    cópias, porque vários métodos alteram as listas retornadas pela API.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[str, Tuple], Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Incrementado a cada invalidação: leituras iniciadas antes de uma escrita
+        # não podem repopular o cache com dados antigos
+        self.generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    @staticmethod
+    def make_key(endpoint: str, params: Optional[Dict] = None) -> Tuple[str, Tuple]:
+        """Chave do cache: caminho normalizado + parâmetros em ordem"""
+        items = tuple(sorted((str(k), str(v)) for k, v in (params or {}).items()))
+        return (_normalize_path(endpoint), items)
+
+    def get(self, endpoint: str, params: Optional[Dict] = None) -> Any:
+        """Retorna uma cópia da resposta em cache ou _MISSING"""
+        if not self.enabled:
+            return _MISSING
+        key = self.make_key(endpoint, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            self.hits += 1
+            value = entry[1]
+        return copy.deepcopy(value)
+
+    def set(self, endpoint: str, params: Optional[Dict], value: Any, generation: Optional[int] = None):
+        """Guarda uma cópia da resposta (ignorada se houve invalidação desde `generation`)"""
+        if not self.enabled:
+            return
+        key = self.make_key(endpoint, params)
+        stored = copy.deepcopy(value)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, stored)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate_for_write(self, endpoint: str) -> int:
+        """
+        Invalida as entradas afetadas por uma escrita (POST/PATCH/DELETE) em `endpoint`.
+
+        Remove a coleção escrita e tudo abaixo dela, além dos recursos "pais" que
+        embutem essa coleção. Ex: POST /leads/pipelines/5/statuses invalida
+        /leads/pipelines/5/statuses*, /leads/pipelines/5 e /leads/pipelines.
+        """
+        path = _normalize_path(endpoint)
+        # Coleção escrita: o caminho sem o ID final (ex: /leads/custom_fields/123 -> /leads/custom_fields)
+        collection = re.sub(r'/\d+$', '', path)
+        removed = 0
+        with self._lock:
+            self.generation += 1
+            for key in list(self._entries):
+                cached_path = key[0]
+                inside_collection = cached_path == collection or cached_path.startswith(collection + '/')
+                is_parent = path == cached_path or path.startswith(cached_path + '/')
+                if inside_collection or is_parent:
+                    del self._entries[key]
+                    removed += 1
+            self.invalidations += removed
+        if removed:
+            logger.debug(f"🧹 Cache: {removed} entradas invalidadas por escrita em {path}")
+        return removed
+
+    def clear(self, prefix: Optional[str] = None) -> int:
+        """Remove todas as entradas (ou apenas as que começam com `prefix`)"""
+        with self._lock:
+            self.generation += 1
+            if prefix is None:
+                removed = len(self._entries)
+                self._entries.clear()
+            else:
+                prefix = _normalize_path(prefix)
+                keys = [k for k in self._entries if k[0] == prefix or k[0].startswith(prefix + '/')]
+                for key in keys:
+                    del self._entries[key]
+                removed = len(keys)
+            self.invalidations += removed
+        return removed
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries)
+            }
+
+
+def is_cache_miss(value: Any) -> bool:
+    return value is _MISSING
@@ -0,0 +1,146 @@
+import os
+import random
+import threading
+from typing import Dict, Optional, Set
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Status que indicam falha temporária do lado do Kommo
+TRANSIENT_STATUS_CODES = {429, 500, 502, 503, 504}
+# Para métodos não idempotentes (POST) só repetimos quando temos certeza de que
+# o servidor não processou a requisição - evita criar pipelines/campos duplicados
+NON_IDEMPOTENT_SAFE_STATUS_CODES = {429, 502, 503}
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'PATCH', 'DELETE'}
+
+
+class RetryPolicy:
+    """
+    Política de retry com limite de tentativas, backoff exponencial e jitter.
+
+    Classifica cada falha como 'transient' (vale repetir: 429, 5xx, timeouts,
+    conexões resetadas) ou 'permanent' (400, 401, 403, 404, 422...).
+    """
+
+    def __init__(self, max_attempts: int = int(os.getenv('KOMMO_RETRY_MAX_ATTEMPTS', '4')),
+                 base_delay: float = 1.0, max_delay: float = 60.0, jitter: float = 0.5,
+                 retry_statuses: Optional[Set[int]] = None, retry_non_idempotent: bool = False):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.retry_statuses = set(retry_statuses) if retry_statuses is not None else set(TRANSIENT_STATUS_CODES)
+        self.retry_non_idempotent = retry_non_idempotent
+
+    def with_overrides(self, **overrides) -> 'RetryPolicy':
+        """Cria uma cópia da política com alguns parâmetros alterados"""
+        params = {
+            'max_attempts': self.max_attempts,
+            'base_delay': self.base_delay,
+            'max_delay': self.max_delay,
+            'jitter': self.jitter,
+            'retry_statuses': self.retry_statuses,
+            'retry_non_idempotent': self.retry_non_idempotent,
+        }
+        params.update(overrides)
+        return RetryPolicy(**params)
+
+    def classify(self, method: str, status_code: Optional[int] = None,
+                 exception: Optional[BaseException] = None) -> str:
+        """Retorna 'transient' ou 'permanent' para uma resposta ou exceção"""
+        idempotent = method.upper() in IDEMPOTENT_METHODS or self.retry_non_idempotent
+
+        if exception is not None:
+            # Falha ao conectar: a requisição nunca chegou ao servidor
+            if isinstance(exception, requests.exceptions.ConnectTimeout):
+                return 'transient'
+            if isinstance(exception, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+                return 'transient' if idempotent else 'permanent'
+            return 'permanent'
+
+        if status_code is None:
+            return 'permanent'
+        if status_code not in self.retry_statuses:
+            return 'permanent'
+        if not idempotent and status_code not in NON_IDEMPOTENT_SAFE_STATUS_CODES:
+            return 'permanent'
+        return 'transient'
+
+    def should_retry(self, attempt: int, method: str, status_code: Optional[int] = None,
+                     exception: Optional[BaseException] = None) -> bool:
+        """Indica se a tentativa número `attempt` (1 = primeira) deve ser repetida"""
+        if attempt >= self.max_attempts:
+            return False
+        return self.classify(method, status_code, exception) == 'transient'
+
+    def backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """Tempo de espera antes da próxima tentativa (Retry-After tem prioridade)"""
+        if retry_after is not None and retry_after >= 0:
+            return float(retry_after)
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        # Jitter proporcional para evitar que várias threads repitam ao mesmo tempo
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+
+class RetryStats:
+    """Contadores thread-safe de retries por conta, usados nos resultados da sincronização"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.gave_up = 0
+        self.by_reason: Dict[str, int] = {}
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def record_retry(self, reason: str):
+        with self._lock:
+            self.retries += 1
+            self.by_reason[reason] = self.by_reason.get(reason, 0) + 1
+
+    def record_gave_up(self):
+        with self._lock:
+            self.gave_up += 1
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'retries': self.retries,
+                'gave_up': self.gave_up,
+                'by_reason': dict(self.by_reason)
+            }
+
+
+def select_retry_policy(default: RetryPolicy, overrides: Dict[str, RetryPolicy],
+                        method: str, endpoint: str) -> RetryPolicy:
+    """
+    Escolhe a política de um endpoint. Chaves no formato '/leads/pipelines' ou
+    'POST /leads/custom_fields'; o prefixo mais longo vence.
+    """
+    path = '/' + endpoint.lstrip('/')
+    best_match = None
+    best_length = -1
+    for key, policy in overrides.items():
+        key_method, _, key_path = key.rpartition(' ')
+        if key_method and key_method.upper() != method.upper():
+            continue
+        if path.startswith(key_path) and len(key_path) > best_length:
+            best_match = policy
+            best_length = len(key_path)
+    return best_match or default
+
+
+def retry_reason(status_code: Optional[int] = None, exception: Optional[BaseException] = None) -> str:
+    """Rótulo curto do motivo de um retry (ex: 'http_429', 'ReadTimeout')"""
+    if exception is not None:
+        return type(exception).__name__
+    return f"http_{status_code}"
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
@@ -0,0 +1,66 @@
+import copy
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Agrupa chamadas idênticas em andamento.
+
+    Enquanto a primeira chamada de uma chave está em execução, as demais threads que
+    pedem a mesma chave esperam por ela e recebem uma cópia do mesmo resultado (ou a
+    mesma exceção), em vez de repetir a requisição.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Executa func uma única vez por chave em andamento. Retorna (resultado, compartilhado)."""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result), True
+
+        result = None
+        try:
+            result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                waiters = call.waiters
+            if waiters and call.error is None:
+                # Cópia privada para os seguidores: quem chamou primeiro pode alterar o resultado
+                call.result = copy.deepcopy(result)
+            call.done.set()
+        if waiters:
+            logger.debug(f"🔗 Requisição compartilhada com {waiters} chamadas idênticas: {key}")
+        return result, False
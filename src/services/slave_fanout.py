@@ -0,0 +1,75 @@
+import contextvars
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, NamedTuple, Optional, Tuple
+
+from src.database import db
+
+logger = logging.getLogger(__name__)
+
+
+class SlaveAccountRef(NamedTuple):
+    """Dados de uma conta escrava que podem ser passados para outra thread (sem objeto ORM)"""
+    id: int
+    subdomain: str
+    refresh_token: str
+    sync_group_id: Optional[int]
+
+    @classmethod
+    def from_model(cls, account) -> 'SlaveAccountRef':
+        return cls(account.id, account.subdomain, account.refresh_token, account.sync_group_id)
+
+
+def fan_out_slaves(app, slaves: List[SlaveAccountRef], worker: Callable[[SlaveAccountRef], Any],
+                   max_concurrent: int = 3, on_complete: Optional[Callable[[int, int], None]] = None,
+                   stop_on_error: bool = False,
+                   should_stop: Optional[Callable[[], bool]] = None) -> List[Tuple[SlaveAccountRef, Any, Optional[Exception]]]:
+    """
+    Executa worker(slave) para até max_concurrent escravas ao mesmo tempo.
+
+    Cada execução roda no seu próprio app context (e portanto na sua própria sessão do banco);
+    o ritmo das chamadas de cada conta continua controlado pelo rate limiter dela.
+
+    Args:
+        on_complete: chamado como on_complete(concluidas, total) a cada escrava finalizada
+        stop_on_error: não inicia novas escravas depois da primeira falha
+        should_stop: quando retorna True nenhuma escrava nova é iniciada (ex.: job cancelado)
+
+    Returns:
+        Lista (escrava, resultado, erro) na mesma ordem de slaves; escravas não executadas
+        por causa de stop_on_error/should_stop têm resultado e erro None
+    """
+    outcomes: List[Tuple[SlaveAccountRef, Any, Optional[Exception]]] = [(slave, None, None) for slave in slaves]
+    failed = threading.Event()
+    progress_lock = threading.Lock()
+    completed = [0]
+
+    def run(index: int):
+        slave = slaves[index]
+        if stop_on_error and failed.is_set():
+            return
+        if should_stop and should_stop():
+            return
+        with app.app_context():
+            try:
+                outcomes[index] = (slave, worker(slave), None)
+            except Exception as e:
+                logger.error(f"Erro ao sincronizar conta {slave.subdomain}: {e}")
+                outcomes[index] = (slave, None, e)
+                failed.set()
+            finally:
+                db.session.remove()
+        with progress_lock:
+            completed[0] += 1
+            if on_complete:
+                on_complete(completed[0], len(slaves))
+
+    workers = max(1, min(int(max_concurrent or 1), len(slaves) or 1))
+    logger.info(f"🔀 Sincronizando {len(slaves)} escravas com até {workers} em paralelo")
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='slave-sync') as executor:
+        # Cada escrava roda com uma cópia do contexto atual (ex.: o job em execução)
+        futures = [executor.submit(contextvars.copy_context().run, run, index) for index in range(len(slaves))]
+        for future in futures:
+            future.result()
+    return outcomes
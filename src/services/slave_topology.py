@@ -0,0 +1,84 @@
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class SlaveTopology:
+    """
+    IDs dos pipelines e estágios de uma conta escrava, montados uma vez por sincronização.
+
+    A validação dos required_statuses dos campos consulta este índice em vez de buscar
+    pipelines e estágios na API a cada campo. O índice nasce da listagem de pipelines que a
+    fase de pipelines já faz (ou de uma única listagem, se a fase não rodou) e é mantido em dia
+    pelas criações e exclusões de pipelines e estágios feitas durante a sincronização.
+    Pipelines listados sem os estágios embutidos têm os estágios buscados uma única vez, quando
+    consultados pela primeira vez.
+    """
+
+    def __init__(self, slave_api, pipelines: Iterable[Dict] = ()):
+        self.slave_api = slave_api
+        self.pipeline_ids: Set[int] = set()
+        # Pipeline -> IDs dos estágios (None: estágios ainda não conhecidos)
+        self.stages: Dict[int, Optional[Set[int]]] = {}
+        self.stage_fetches = 0
+        self._lock = threading.Lock()
+        for pipeline in pipelines:
+            statuses = pipeline.get('_embedded', {}).get('statuses')
+            self.add_pipeline(pipeline['id'], [s['id'] for s in statuses] if statuses is not None else None)
+
+    @classmethod
+    def load(cls, slave_api) -> 'SlaveTopology':
+        """Monta o índice com uma única listagem de pipelines da escrava"""
+        topology = cls(slave_api, slave_api.get_pipelines(use_cache=False))
+        logger.info(f"🗺️ Topologia da escrava carregada: {len(topology.pipeline_ids)} pipelines")
+        return topology
+
+    def add_pipeline(self, pipeline_id: int, stage_ids: Optional[Iterable[int]] = None):
+        with self._lock:
+            self.pipeline_ids.add(int(pipeline_id))
+            self.stages[int(pipeline_id)] = {int(s) for s in stage_ids} if stage_ids is not None else None
+
+    def remove_pipeline(self, pipeline_id: int):
+        with self._lock:
+            self.pipeline_ids.discard(int(pipeline_id))
+            self.stages.pop(int(pipeline_id), None)
+
+    def add_stage(self, pipeline_id: int, stage_id: int):
+        with self._lock:
+            stage_ids = self.stages.get(int(pipeline_id))
+            if stage_ids is not None:
+                stage_ids.add(int(stage_id))
+
+    def remove_stage(self, pipeline_id: int, stage_id: int):
+        with self._lock:
+            stage_ids = self.stages.get(int(pipeline_id))
+            if stage_ids is not None:
+                stage_ids.discard(int(stage_id))
+
+    def has_pipeline(self, pipeline_id: int) -> bool:
+        with self._lock:
+            return pipeline_id in self.pipeline_ids
+
+    def stage_ids(self, pipeline_id: int) -> Set[int]:
+        """Estágios do pipeline (vazio se o pipeline não existe na escrava)"""
+        with self._lock:
+            if pipeline_id not in self.pipeline_ids:
+                return set()
+            stage_ids = self.stages.get(pipeline_id)
+        if stage_ids is None:
+            stage_ids = {int(s['id']) for s in self.slave_api.get_pipeline_stages(pipeline_id)}
+            with self._lock:
+                self.stage_fetches += 1
+                if pipeline_id in self.pipeline_ids and self.stages.get(pipeline_id) is None:
+                    self.stages[pipeline_id] = stage_ids
+                stage_ids = self.stages.get(pipeline_id) or set()
+        return set(stage_ids)
+
+    def has_stage(self, pipeline_id: int, stage_id: int) -> bool:
+        return stage_id in self.stage_ids(pipeline_id)
+
+    def sample_pipelines(self, limit: int = 5) -> List[int]:
+        with self._lock:
+            return sorted(self.pipeline_ids)[:limit]
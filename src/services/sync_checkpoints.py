@@ -0,0 +1,225 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from src.database import db
+from src.models.kommo_account import SyncCheckpoint
+from src.services.config_snapshots import content_hash
+
+logger = logging.getLogger(__name__)
+
+# Checkpoints mais velhos que isso são descartados: a escrava pode ter sido alterada manualmente
+DEFAULT_CHECKPOINT_MAX_AGE = float(os.getenv('KOMMO_CHECKPOINT_MAX_AGE', '86400'))
+
+
+def _restore_keys(data: Any) -> Any:
+    """JSON transforma as chaves inteiras dos mapeamentos em texto; volta para int"""
+    if isinstance(data, dict):
+        return {(int(key) if isinstance(key, str) and key.lstrip('-').isdigit() else key): _restore_keys(value)
+                for key, value in data.items()}
+    return data
+
+
+def _merge_mappings(target: Dict, source: Dict):
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge_mappings(target[key], value)
+        else:
+            target[key] = value
+
+
+class SharedMappings(dict):
+    """
+    Mapeamentos (master -> escrava) de uma sincronização, compartilhados pelas fases que rodam
+    em threads diferentes.
+
+    Toda escrita, em qualquer nível (mappings['stages'][id] = ..., setdefault, update...), usa o
+    mesmo lock, e snapshot() copia tudo com esse lock: a gravação do checkpoint nunca vê um
+    dicionário sendo alterado por outra fase.
+    """
+
+    def __init__(self, data: Optional[Dict] = None, lock: Optional[threading.RLock] = None):
+        super().__init__()
+        self._lock = lock or threading.RLock()
+        for key, value in (data or {}).items():
+            self[key] = value
+
+    def _wrap(self, value: Any) -> Any:
+        if isinstance(value, dict) and not isinstance(value, SharedMappings):
+            return SharedMappings(value, self._lock)
+        return value
+
+    def __setitem__(self, key, value):
+        value = self._wrap(value)
+        with self._lock:
+            super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        with self._lock:
+            super().__delitem__(key)
+
+    def setdefault(self, key, default=None):
+        with self._lock:
+            if key not in self:
+                super().__setitem__(key, self._wrap(default))
+            return super().__getitem__(key)
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def pop(self, key, *default):
+        with self._lock:
+            return super().pop(key, *default)
+
+    def clear(self):
+        with self._lock:
+            super().clear()
+
+    def snapshot(self) -> Dict:
+        """Cópia consistente (dicts comuns) de todos os mapeamentos"""
+        with self._lock:
+            return {key: value.snapshot() if isinstance(value, SharedMappings) else value
+                    for key, value in self.items()}
+
+
+def checkpoint_key(item: Any) -> Optional[str]:
+    """Identificador de um item processado em lote (None se não der para identificá-lo)"""
+    if isinstance(item, dict) and item.get('id') is not None:
+        return str(item['id'])
+    return None
+
+
+class SlaveSyncCheckpoint:
+    """
+    Checkpoint de uma sincronização completa em andamento em uma escrava.
+
+    Guarda as fases concluídas, os itens concluídos de cada operação em lotes e os mapeamentos
+    produzidos até o momento; cada alteração é gravada no banco na hora, para que uma execução
+    interrompida (reinício do servidor, falha no meio da FASE 3...) seja retomada do primeiro
+    lote incompleto. As fases de uma escrava podem rodar em threads diferentes, então as
+    gravações usam conexão própria e são serializadas por um lock.
+    """
+
+    def __init__(self, record: SyncCheckpoint, resumed: bool = False):
+        self.record_id = record.id
+        self.slave_account_id = record.slave_account_id
+        self.resumed = resumed
+        self.phases: List[str] = json.loads(record.completed_phases or '[]')
+        self.items: Dict[str, Set[str]] = {operation: set(keys)
+                                           for operation, keys in json.loads(record.completed_items or '{}').items()}
+        self.stored_mappings: Dict = _restore_keys(json.loads(record.mappings or '{}'))
+        self.mappings: Optional[SharedMappings] = None
+        self.phases_skipped: List[str] = []
+        self.items_skipped = 0
+        self._lock = threading.Lock()
+
+    def attach(self, mappings: Dict) -> SharedMappings:
+        """Passa a acompanhar os mapeamentos da sincronização, restaurando os já gravados"""
+        if not isinstance(mappings, SharedMappings):
+            mappings = SharedMappings(mappings)
+        _merge_mappings(mappings, self.stored_mappings)
+        self.mappings = mappings
+        return mappings
+
+    def phase_done(self, phase: str) -> bool:
+        with self._lock:
+            if phase in self.phases:
+                self.phases_skipped.append(phase)
+                return True
+            return False
+
+    def completed_items(self, operation: str) -> Set[str]:
+        with self._lock:
+            return set(self.items.get(operation, set()))
+
+    def skip_completed(self, operation: str, items: List[Any]) -> List[Any]:
+        """Itens da operação que ainda não foram concluídos"""
+        done = self.completed_items(operation)
+        if not done:
+            return items
+        remaining = [item for item in items if checkpoint_key(item) not in done]
+        skipped = len(items) - len(remaining)
+        if skipped:
+            with self._lock:
+                self.items_skipped += skipped
+            logger.info(f"⏭️ {skipped} itens de {operation} já concluídos em execução anterior")
+        return remaining
+
+    def complete_items(self, operation: str, keys: Iterable[Optional[str]]):
+        keys = {key for key in keys if key is not None}
+        if not keys:
+            return
+        with self._lock:
+            self.items.setdefault(operation, set()).update(keys)
+            self._save()
+
+    def complete_phase(self, phase: str):
+        with self._lock:
+            if phase not in self.phases:
+                self.phases.append(phase)
+            self._save()
+
+    def _save(self):
+        values = {
+            'completed_phases': json.dumps(self.phases),
+            'completed_items': json.dumps({operation: sorted(keys) for operation, keys in self.items.items()}),
+            'updated_at': datetime.utcnow()
+        }
+        if self.mappings is not None:
+            # Cópia feita com o lock dos mapeamentos: as outras fases não alteram nada no meio
+            values['mappings'] = json.dumps(self.mappings.snapshot(), default=str)
+        table = SyncCheckpoint.__table__
+        try:
+            with db.engine.begin() as connection:
+                connection.execute(table.update().where(table.c.id == self.record_id).values(**values))
+        except Exception as e:
+            logger.warning(f"⚠️ Não foi possível gravar o checkpoint da conta {self.slave_account_id}: {e}")
+
+    def summary(self) -> Optional[Dict]:
+        """Trabalho reaproveitado de uma execução anterior (None se a sincronização não foi retomada)"""
+        if not self.resumed:
+            return None
+        with self._lock:
+            return {'phases_skipped': list(self.phases_skipped), 'items_skipped': self.items_skipped}
+
+
+class SyncCheckpointStore:
+    """Checkpoints das sincronizações completas, um por (grupo, escrava)"""
+
+    def __init__(self, max_age: float = DEFAULT_CHECKPOINT_MAX_AGE):
+        self.max_age = max_age
+
+    def open(self, sync_group_id: Optional[int], slave_account_id: int, master_config: Dict) -> SlaveSyncCheckpoint:
+        """
+        Checkpoint da sincronização dessa escrava: o da execução anterior se ela aplicava a mesma
+        configuração da master e não está velha demais, senão um checkpoint vazio.
+        """
+        config_hash = content_hash(master_config)
+        record = SyncCheckpoint.query.filter_by(sync_group_id=sync_group_id,
+                                                slave_account_id=slave_account_id).first()
+        if record is not None:
+            age = (datetime.utcnow() - record.updated_at).total_seconds()
+            if record.config_hash == config_hash and age <= self.max_age:
+                logger.info(f"♻️ Retomando sincronização da conta {slave_account_id} do checkpoint "
+                            f"(fases concluídas: {record.completed_phases})")
+                return SlaveSyncCheckpoint(record, resumed=True)
+            logger.info(f"🧹 Checkpoint da conta {slave_account_id} descartado "
+                        f"({'configuração da master mudou' if record.config_hash != config_hash else 'expirado'})")
+            db.session.delete(record)
+            db.session.flush()
+
+        record = SyncCheckpoint(sync_group_id=sync_group_id, slave_account_id=slave_account_id,
+                                config_hash=config_hash, completed_phases='[]', completed_items='{}', mappings='{}')
+        db.session.add(record)
+        db.session.commit()
+        return SlaveSyncCheckpoint(record)
+
+    def clear(self, sync_group_id: Optional[int], slave_account_id: int):
+        """Remove o checkpoint (sincronização concluída sem erros)"""
+        SyncCheckpoint.query.filter_by(sync_group_id=sync_group_id,
+                                       slave_account_id=slave_account_id).delete()
+        db.session.commit()
@@ -0,0 +1,118 @@
+import copy
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _read_only(*args, **kwargs):
+    raise TypeError('A configuração da master é compartilhada entre as contas da execução e não pode ser alterada')
+
+
+class FrozenDict(dict):
+    """dict somente leitura - continua passando em isinstance(x, dict) e em json.dumps"""
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return {copy.deepcopy(key, memo): copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class FrozenList(list):
+    """list somente leitura - continua passando em isinstance(x, list) e em json.dumps"""
+
+    __setitem__ = __delitem__ = append = extend = insert = pop = remove = reverse = sort = clear = _read_only
+    __iadd__ = __imul__ = _read_only
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return [copy.deepcopy(item, memo) for item in self]
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def freeze_config(data: Any) -> Any:
+    """Cópia somente leitura (recursiva) de uma configuração extraída; copy()/deepcopy() devolvem cópias mutáveis"""
+    if isinstance(data, dict):
+        return FrozenDict((key, freeze_config(value)) for key, value in data.items())
+    if isinstance(data, list):
+        return FrozenList(freeze_config(item) for item in data)
+    if isinstance(data, tuple):
+        return tuple(freeze_config(item) for item in data)
+    return data
+
+
+class SyncRunCoordinator:
+    """
+    Uma execução de sincronização (um disparo), que pode cobrir vários grupos e escravas.
+
+    A configuração de cada conta mestre é extraída (ou lida do snapshot) uma única vez por
+    execução e a mesma cópia somente leitura é entregue a todos os grupos que usam essa master.
+    """
+
+    def __init__(self, snapshot_store=None, max_age: Optional[float] = None, force_refresh: bool = False):
+        self.run_id = uuid.uuid4().hex[:8]
+        self.snapshot_store = snapshot_store
+        self.max_age = max_age
+        self.force_refresh = force_refresh
+        self.extractions = 0
+        self.reuses = 0
+        self._configs: Dict[int, Tuple[Dict, Dict]] = {}
+        self._master_locks: Dict[int, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _master_lock(self, master_account_id: int) -> threading.Lock:
+        with self._lock:
+            return self._master_locks.setdefault(master_account_id, threading.Lock())
+
+    def get_master_config(self, sync_service, master_account_id: int) -> Tuple[Dict, Dict]:
+        """
+        Configuração da master para esta execução.
+
+        Returns:
+            Tupla (configuração somente leitura, informações sobre a origem da configuração)
+        """
+        with self._master_lock(master_account_id):
+            if master_account_id in self._configs:
+                self.reuses += 1
+                config, info = self._configs[master_account_id]
+                logger.info(f"♻️ [{self.run_id}] Reutilizando configuração da master {master_account_id} nesta execução")
+                return config, {**info, 'shared_in_run': True}
+
+            started_at = time.monotonic()
+            if self.snapshot_store is not None:
+                config, info = self.snapshot_store.get_or_extract(
+                    sync_service, master_account_id, max_age=self.max_age, force_refresh=self.force_refresh
+                )
+            else:
+                config = sync_service.extract_master_configuration()
+                info = {'source': 'extracted'}
+            info = {**info, 'run_id': self.run_id, 'seconds': round(time.monotonic() - started_at, 3)}
+            if info['source'] != 'snapshot':
+                # Tempo de cada seção da extração feita agora; grupos que reutilizam a configuração recebem o mesmo
+                info['extraction_timings'] = dict(sync_service.last_extraction_timings)
+
+            frozen = freeze_config(config)
+            self._configs[master_account_id] = (frozen, info)
+            self.extractions += 1
+            return frozen, {**info, 'shared_in_run': False}
+
+    def stats(self) -> Dict:
+        return {
+            'run_id': self.run_id,
+            'masters': len(self._configs),
+            'extractions': self.extractions,
+            'reuses': self.reuses
+        }
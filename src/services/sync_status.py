@@ -0,0 +1,206 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from flask import current_app, has_app_context
+from sqlalchemy.exc import IntegrityError
+
+from src.database import db
+from src.models.kommo_account import SyncStatusEntry
+from src.services.job_engine import worker_id, worker_is_alive
+
+logger = logging.getLogger(__name__)
+
+# Intervalo mínimo (s) entre gravações do status de uma sincronização no banco
+STATUS_WRITE_INTERVAL = float(os.getenv('KOMMO_STATUS_WRITE_INTERVAL', '1.0'))
+# Status de sincronizações finalizadas mantidos no banco
+STATUS_KEEP = int(os.getenv('KOMMO_STATUS_KEEP', '100'))
+
+# Chave do status de sincronizações executadas fora de um job (ex.: "wait": true)
+INLINE_STATUS_KEY = 'inline'
+
+DEFAULT_STATUS = {
+    'is_running': False,
+    'sync_type': None,
+    'current_status': 'idle',
+    'progress': 0,
+    'current_operation': '-',
+    'current_batch': '-',
+    'estimated_time': '-',
+    'start_time': None,
+    'total_items': 0,
+    'processed_items': 0,
+    'accounts_processed': 0,
+    'total_accounts': 0,
+    'results': {}
+}
+
+
+class SyncStatusRegistry:
+    """
+    Status das sincronizações, um por job, gravado na tabela sync_status_entries.
+
+    Cada worker mantém em memória o status das sincronizações que ele executa e grava no
+    banco no máximo a cada STATUS_WRITE_INTERVAL segundos (as atualizações intermediárias são
+    agrupadas em uma única escrita). Mudanças de estado (current_status, is_running) são
+    gravadas na hora, e uma atualização agrupada é gravada ao fim do intervalo mesmo que nenhuma
+    outra chegue. Qualquer worker lê o status de qualquer sincronização pelo banco.
+    """
+
+    def __init__(self, write_interval: Optional[float] = None):
+        self.write_interval = STATUS_WRITE_INTERVAL if write_interval is None else write_interval
+        self._states: Dict[str, Dict] = {}
+        self._last_write: Dict[str, float] = {}
+        self._dirty: set = set()
+        # Gravação agendada para o fim do intervalo de cada status com atualizações pendentes
+        self._timers: Dict[str, threading.Timer] = {}
+        self._lock = threading.Lock()
+
+    def _load(self, key: str) -> Dict:
+        entry = db.session.get(SyncStatusEntry, key)
+        if entry is None:
+            return dict(DEFAULT_STATUS)
+        return {**DEFAULT_STATUS, **json.loads(entry.data)}
+
+    def update(self, key: str, job_id: Optional[str] = None, **fields) -> Dict:
+        """Atualiza o status de uma sincronização; retorna o status completo (em memória)"""
+        with self._lock:
+            state = self._states.get(key)
+        if state is None:
+            state = self._load(key)
+
+        with self._lock:
+            state = self._states.setdefault(key, state)
+            state_changed = any(
+                field in fields and fields[field] != state.get(field) for field in ('current_status', 'is_running')
+            )
+            state.update(fields)
+            state['job_id'] = job_id
+            state['updated_at'] = datetime.utcnow().isoformat()
+            self._dirty.add(key)
+
+            now = time.monotonic()
+            if not state_changed and now - self._last_write.get(key, 0.0) < self.write_interval:
+                self._schedule_flush(key, self.write_interval - (now - self._last_write.get(key, 0.0)))
+                return dict(state)
+            snapshot = dict(state)
+            self._last_write[key] = now
+            self._dirty.discard(key)
+            self._cancel_flush(key)
+            if not state['is_running']:
+                # Sincronização finalizada: o banco passa a ser a única cópia
+                self._states.pop(key, None)
+                self._last_write.pop(key, None)
+
+        self._write(key, snapshot)
+        return snapshot
+
+    def _schedule_flush(self, key: str, delay: float):
+        """Agenda a gravação do status ao fim do intervalo (chamado com o lock)"""
+        if key in self._timers or not has_app_context():
+            return
+        timer = threading.Timer(max(delay, 0.0), self._flush_later, args=(key, current_app._get_current_object()))
+        timer.daemon = True
+        self._timers[key] = timer
+        timer.start()
+
+    def _cancel_flush(self, key: str):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+
+    def _flush_later(self, key: str, app):
+        with self._lock:
+            self._timers.pop(key, None)
+        with app.app_context():
+            self.flush(key)
+
+    def flush(self, key: Optional[str] = None):
+        """Grava imediatamente os status com atualizações pendentes"""
+        with self._lock:
+            keys = [key] if key is not None else list(self._dirty)
+            pending = [(k, dict(self._states[k])) for k in keys if k in self._dirty and k in self._states]
+            for k, _ in pending:
+                self._dirty.discard(k)
+                self._last_write[k] = time.monotonic()
+                self._cancel_flush(k)
+        for k, snapshot in pending:
+            self._write(k, snapshot)
+
+    def _write(self, key: str, state: Dict):
+        """Upsert do status com conexão própria (não interfere na sessão da sincronização)"""
+        table = SyncStatusEntry.__table__
+        values = {
+            'job_id': state.get('job_id'),
+            'is_running': bool(state.get('is_running')),
+            'data': json.dumps(state, default=str),
+            'worker': worker_id(),
+            'updated_at': datetime.utcnow()
+        }
+        try:
+            with db.engine.begin() as connection:
+                updated = connection.execute(table.update().where(table.c.key == key).values(**values)).rowcount
+                if not updated:
+                    connection.execute(table.insert().values(key=key, **values))
+        except IntegrityError:
+            # Outro worker inseriu a mesma chave ao mesmo tempo
+            with db.engine.begin() as connection:
+                connection.execute(table.update().where(table.c.key == key).values(**values))
+        except Exception as e:
+            logger.warning(f"⚠️ Não foi possível gravar o status da sincronização {key}: {e}")
+            return
+
+        if not values['is_running']:
+            self._prune()
+
+    def _prune(self):
+        table = SyncStatusEntry.__table__
+        try:
+            with db.engine.begin() as connection:
+                old_keys = connection.execute(
+                    db.select(table.c.key).where(table.c.is_running.is_(False), table.c.key != INLINE_STATUS_KEY)
+                    .order_by(table.c.updated_at.desc()).offset(STATUS_KEEP)
+                ).scalars().all()
+                if old_keys:
+                    connection.execute(table.delete().where(table.c.key.in_(old_keys)))
+        except Exception as e:
+            logger.debug(f"Não foi possível remover status antigos: {e}")
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Status de uma sincronização (a cópia em memória é mais recente se este worker a executa)"""
+        with self._lock:
+            if key in self._states:
+                return dict(self._states[key])
+        entry = db.session.get(SyncStatusEntry, key)
+        return {**DEFAULT_STATUS, **json.loads(entry.data)} if entry else None
+
+    def running(self, exclude: Optional[str] = None) -> List[Dict]:
+        """Sincronizações em andamento em qualquer worker (mais recentes primeiro)"""
+        entries = SyncStatusEntry.query.filter_by(is_running=True).order_by(SyncStatusEntry.updated_at.desc()).all()
+        return [self.get(entry.key) or {} for entry in entries if entry.key != exclude]
+
+    def current(self) -> Dict:
+        """Status exibido no painel: a sincronização em andamento mais recente ou, se nenhuma, a última"""
+        entry = (SyncStatusEntry.query.filter_by(is_running=True).order_by(SyncStatusEntry.updated_at.desc()).first()
+                 or SyncStatusEntry.query.order_by(SyncStatusEntry.updated_at.desc()).first())
+        if entry is None:
+            return dict(DEFAULT_STATUS)
+        return self.get(entry.key) or dict(DEFAULT_STATUS)
+
+    def recover_interrupted(self) -> int:
+        """Marca como interrompidos os status 'em andamento' de workers que não existem mais"""
+        entries = [entry for entry in SyncStatusEntry.query.filter_by(is_running=True).all()
+                   if not worker_is_alive(entry.worker)]
+        for entry in entries:
+            data = json.loads(entry.data)
+            data.update({'is_running': False, 'current_status': 'failed',
+                         'current_operation': 'Interrompida: o servidor foi reiniciado'})
+            entry.data = json.dumps(data, default=str)
+            entry.is_running = False
+        if entries:
+            db.session.commit()
+        return len(entries)
@@ -8,13 +8,14 @@ const API_CONFIG = {
 let syncInProgress = false;
 let currentSyncType = null;
 let statusInterval = null;
+let statusEventSource = null;
 let logInterval = null;
 let slaveAccounts = [];
 
 // Configurações padrão
 const defaultConfig = {
   batchSize: 10,
-  batchDelay: 2.0,
+  batchDelay: 0,
   maxConcurrent: 3,
 };
 
@@ -26,7 +27,7 @@ function buildApiUrl(path) {
 // Initialize quando a página carregar
 document.addEventListener("DOMContentLoaded", function () {
   initializeSystem();
-  loadSyncStatus();
+  loadSyncStatus(true);
   refreshAccountsList();
   startAutoRefresh();
 });
@@ -111,7 +112,7 @@ async function triggerBatchSync(syncType) {
 
     if (result.success) {
       addLog(`✅ Sincronização ${syncType} iniciada com sucesso`);
-      startStatusMonitoring();
+      startStatusMonitoring(result.job_id);
     } else {
       throw new Error(result.error || "Erro desconhecido");
     }
@@ -156,7 +157,7 @@ async function triggerMultiAccountSync() {
 
     if (result.success) {
       addLog("✅ Sincronização multi-conta iniciada com sucesso");
-      startStatusMonitoring();
+      startStatusMonitoring(result.job_id);
     } else {
       throw new Error(result.error || "Erro desconhecido");
     }
@@ -231,9 +232,13 @@ function setSyncInProgress(inProgress, syncType = null) {
 }
 
 // Iniciar monitoramento de status
-function startStatusMonitoring() {
-  if (statusInterval) {
-    clearInterval(statusInterval);
+function startStatusMonitoring(jobId = null) {
+  stopStatusMonitoring();
+
+  // Com o id do job o servidor envia o progresso (Server-Sent Events), sem polling
+  if (jobId && window.EventSource) {
+    watchJobEvents(jobId);
+    return;
   }
 
   statusInterval = setInterval(loadSyncStatus, 2000); // A cada 2 segundos
@@ -245,10 +250,85 @@ function stopStatusMonitoring() {
     clearInterval(statusInterval);
     statusInterval = null;
   }
+  if (statusEventSource) {
+    statusEventSource.close();
+    statusEventSource = null;
+  }
 }
 
-// Carregar status da sincronização
-async function loadSyncStatus() {
+// Acompanhar um job pelo stream de eventos do servidor
+function watchJobEvents(jobId) {
+  const liveStatus = {};
+  const source = new EventSource(buildApiUrl(`/sync/jobs/${jobId}/events`));
+  statusEventSource = source;
+
+  const render = () =>
+    updateSyncStatus(
+      liveStatus.current_status || "Aguardando",
+      liveStatus.progress || 0,
+      liveStatus.current_operation || "-",
+      liveStatus.current_batch || "-",
+      liveStatus.estimated_time || "-"
+    );
+
+  // Estado completo ao conectar, depois só os campos que mudaram
+  source.addEventListener("snapshot", (event) => {
+    Object.assign(liveStatus, JSON.parse(event.data).status);
+    render();
+  });
+  source.addEventListener("status", (event) => {
+    Object.assign(liveStatus, JSON.parse(event.data));
+    render();
+  });
+
+  // Progresso dos lotes enviado pelo progress_callback da sincronização
+  source.addEventListener("progress", (event) => {
+    const progress = JSON.parse(event.data);
+    const account = progress.subdomain ? `${progress.subdomain}: ` : "";
+    const batch = progress.total_batches
+      ? ` (lote ${progress.current_batch}/${progress.total_batches})`
+      : "";
+    document.getElementById("currentBatch").textContent = `${account}${
+      progress.operation || "-"
+    }${batch}`;
+  });
+
+  source.addEventListener("done", (event) => {
+    const job = JSON.parse(event.data);
+    source.close();
+    statusEventSource = null;
+
+    if (job.status === "completed") {
+      addLog(`✅ Sincronização concluída (job ${jobId})`);
+    } else {
+      addLog(
+        `⚠️ Sincronização finalizada com status ${job.status}${
+          job.error ? ": " + job.error : ""
+        }`
+      );
+    }
+
+    setSyncInProgress(false);
+    if (job.result && job.result.results) {
+      updateStatistics(job.result.results);
+    }
+
+    // Contas e visão geral só mudam depois de uma sincronização
+    refreshAccountsList();
+    refreshAccountsOverview();
+  });
+
+  source.onerror = () => {
+    // Stream encerrado (ex.: proxy sem suporte a SSE): voltar ao polling
+    if (source.readyState === EventSource.CLOSED && statusEventSource === source) {
+      statusEventSource = null;
+      statusInterval = setInterval(loadSyncStatus, 2000);
+    }
+  };
+}
+
+// Carregar status da sincronização (attachToJob: acompanhar pelo stream o job em andamento)
+async function loadSyncStatus(attachToJob = false) {
   try {
     const response = await fetch(buildApiUrl("/sync/status"));
     const result = await response.json();
@@ -276,6 +356,10 @@ async function loadSyncStatus() {
         }
       } else if (status.current_status !== "idle") {
         setSyncInProgress(true, status.sync_type);
+
+        if (attachToJob && status.job_id) {
+          startStatusMonitoring(status.job_id);
+        }
       }
     }
   } catch (error) {
@@ -433,7 +517,7 @@ async function syncSingleAccount(accountId) {
 
     if (result.success) {
       addLog(`✅ Sincronização da conta ${accountId} iniciada`);
-      startStatusMonitoring();
+      startStatusMonitoring(result.job_id);
     } else {
       throw new Error(result.error || "Erro na sincronização");
     }
@@ -522,8 +606,12 @@ function showAlert(message, type = "info") {
 
 // Iniciar auto-refresh
 function startAutoRefresh() {
-  // Atualizar lista de contas a cada 30 segundos
-  setInterval(refreshAccountsList, 30000);
+  // Lista de contas atualizada ao fim de cada sincronização (evento "done") e ao voltar para a aba
+  document.addEventListener("visibilitychange", function () {
+    if (!document.hidden) {
+      refreshAccountsList();
+    }
+  });
 
   // Carregar configurações salvas
   loadConfig();
@@ -774,7 +862,7 @@ async function syncGroup() {
       // Iniciar monitoramento
       syncInProgress = true;
       currentSyncType = "group";
-      startStatusMonitoring();
+      startStatusMonitoring(data.job_id);
     } else {
       const errorData = await response.json();
       showAlert(`Erro ao iniciar sincronização: ${errorData.error}`, "error");
@@ -1235,8 +1323,12 @@ document.addEventListener("DOMContentLoaded", function () {
   refreshAccountsOverview();
 });
 
-// Atualizar automaticamente a visualização de contas
-setInterval(refreshAccountsOverview, 60000); // A cada minuto
+// Atualizar a visualização de contas ao voltar para a aba (e ao fim de cada sincronização)
+document.addEventListener("visibilitychange", function () {
+  if (!document.hidden) {
+    refreshAccountsOverview();
+  }
+});
 
 // ========================================
 // MODAL PARA TODAS AS CONTAS ESCRAVAS
@@ -0,0 +1,52 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import tempfile
+
+import pytest
+from flask import Flask
+
+from src.database import db
+# Registra todos os modelos antes do create_all
+from src.models import kommo_account, user  # noqa: F401
+
+
+def create_test_app(file_db: bool = False) -> Flask:
+    """
+    App Flask com as tabelas criadas em um SQLite novo.
+
+    file_db: banco em arquivo em vez de memória, para testes em que outras threads
+    (jobs, fan-out, gravações agendadas) acessam o banco, cada uma com a sua conexão.
+    """
+    app = Flask(__name__)
+    if file_db:
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _dispose(app: Flask):
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def app():
+    """App com banco em memória"""
+    app = create_test_app()
+    yield app
+    _dispose(app)
+
+
+@pytest.fixture
+def file_db_app():
+    """App com banco SQLite em arquivo (acesso ao banco a partir de outras threads)"""
+    app = create_test_app(file_db=True)
+    yield app
+    _dispose(app)
@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import requests
+
+from src.services.kommo_api import KommoAPIService, KommoSyncService
+
+
+class FakeSlaveAPI(KommoAPIService):
+    """Conta escrava simulada que registra as chamadas de escrita"""
+
+    def __init__(self, reject_names=()):
+        super().__init__('bulkfields', 'token')
+        self.calls = []
+        self.reject_names = set(reject_names)
+        self.next_id = 1000
+
+    def _new_field(self, field_data):
+        self.next_id += 1
+        return {'id': self.next_id, **field_data}
+
+    def create_custom_fields(self, entity_type, fields_data):
+        self.calls.append(('POST', len(fields_data)))
+        if any(f['name'] in self.reject_names for f in fields_data):
+            raise requests.exceptions.HTTPError('400 validation error')
+        return [self._new_field(f) for f in fields_data]
+
+    def create_custom_field(self, entity_type, field_data):
+        self.calls.append(('POST', 1))
+        if field_data['name'] in self.reject_names:
+            raise requests.exceptions.HTTPError('400 validation error')
+        return {'_embedded': {'custom_fields': [self._new_field(field_data)]}}
+
+    def update_custom_fields(self, entity_type, fields_data):
+        self.calls.append(('PATCH', len(fields_data)))
+        return fields_data
+
+
+def new_results():
+    return {'created': 0, 'updated': 0, 'skipped': 0, 'deleted': 0, 'errors': []}
+
+
+def pending_fields(count):
+    return [({'id': i, 'name': f'Campo {i}'}, {'name': f'Campo {i}', 'type': 'text'}) for i in range(count)]
+
+
+def test_creates_are_sent_in_chunks_and_mapped_back():
+    slave_api = FakeSlaveAPI()
+    service = KommoSyncService(slave_api)
+    results, mappings = new_results(), {}
+
+    service._flush_custom_field_creates(slave_api, 'leads', pending_fields(120), results, mappings)
+
+    assert slave_api.calls == [('POST', 50), ('POST', 50), ('POST', 20)]
+    assert results['created'] == 120
+    assert mappings['custom_fields']['leads'][0] == 1001
+    assert mappings['custom_fields']['leads'][119] == 1120
+
+
+def test_only_rejected_chunk_falls_back_to_single_calls():
+    slave_api = FakeSlaveAPI(reject_names={'Campo 60'})
+    service = KommoSyncService(slave_api)
+    results, mappings = new_results(), {}
+
+    service._flush_custom_field_creates(slave_api, 'leads', pending_fields(100), results, mappings)
+
+    assert slave_api.calls[:2] == [('POST', 50), ('POST', 50)]
+    assert slave_api.calls[2:] == [('POST', 1)] * 50
+    assert results['created'] == 99
+    assert len(results['errors']) == 1
+    assert 60 not in mappings['custom_fields']['leads']
+
+
+def test_updates_are_batched():
+    slave_api = FakeSlaveAPI()
+    service = KommoSyncService(slave_api)
+    results = new_results()
+    pending = [({'id': i, 'name': f'Campo {i}'}, 500 + i, {'sort': i}) for i in range(70)]
+
+    service._flush_custom_field_updates(slave_api, 'contacts', pending, results)
+
+    assert slave_api.calls == [('PATCH', 50), ('PATCH', 20)]
+    assert results['updated'] == 70
+
+
+if __name__ == "__main__":
+    test_creates_are_sent_in_chunks_and_mapped_back()
+    test_only_rejected_chunk_falls_back_to_single_calls()
+    test_updates_are_batched()
+    print("Testes passaram!")
@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import requests
+
+from src.services.kommo_api import KommoAPIService, KommoSyncService
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeStagesAPI(KommoAPIService):
+    """Conta escrava simulada com um pipeline e alguns estágios já existentes"""
+
+    def __init__(self, existing_stages, bulk_patch_status=None):
+        super().__init__('bulkstages', 'token')
+        self.existing_stages = existing_stages
+        self.bulk_patch_status = bulk_patch_status
+        self.calls = []
+        self.next_id = 5000
+
+    def get_pipeline_stages(self, pipeline_id, with_descriptions=False):
+        return [dict(stage) for stage in self.existing_stages]
+
+    def _send_request(self, method, endpoint, data=None, params=None):
+        self.calls.append((method, endpoint, len(data) if isinstance(data, list) else 1))
+        if method == 'POST':
+            created = []
+            for stage in data:
+                self.next_id += 1
+                created.append({'id': self.next_id, **stage})
+            return {'_embedded': {'statuses': created}}
+        if method == 'PATCH' and endpoint.endswith('/statuses') and self.bulk_patch_status:
+            error = requests.exceptions.HTTPError(f'{self.bulk_patch_status} Error')
+            error.response = FakeResponse(self.bulk_patch_status)
+            raise error
+        return {'id': 1}
+
+
+def master_pipeline(stage_count):
+    stages = [{'id': 100 + i, 'name': f'Etapa {i}', 'sort': (i + 1) * 10, 'type': 0, 'color': '#fffeb2'}
+              for i in range(stage_count)]
+    return {'name': 'Vendas', 'stages': stages}
+
+
+def test_missing_stages_are_created_in_one_request_and_mapped_by_name():
+    existing = [{'id': 7, 'name': 'Etapa 0', 'sort': 999, 'type': 0, 'color': '#fffeb2'}]
+    slave_api = FakeStagesAPI(existing)
+    service = KommoSyncService(slave_api)
+    mappings = {'stages': {}}
+
+    service._sync_pipeline_stages(slave_api, master_pipeline(25), 77, mappings)
+
+    posts = [c for c in slave_api.calls if c[0] == 'POST']
+    patches = [c for c in slave_api.calls if c[0] == 'PATCH']
+    assert posts == [('POST', '/leads/pipelines/77/statuses', 24)]
+    assert patches == [('PATCH', '/leads/pipelines/77/statuses', 1)]
+    assert len(mappings['stages']) == 25
+    assert mappings['stages'][100] == 7
+
+
+def test_unsupported_bulk_patch_is_remembered():
+    existing = [{'id': 10 + i, 'name': f'Etapa {i}', 'sort': 0, 'type': 0, 'color': '#fffeb2'} for i in range(3)]
+    slave_api = FakeStagesAPI(existing, bulk_patch_status=405)
+    service = KommoSyncService(slave_api)
+
+    service._sync_pipeline_stages(slave_api, master_pipeline(3), 77, {'stages': {}})
+    assert slave_api.bulk_stage_update_supported is False
+    single_patches = [c for c in slave_api.calls if c[0] == 'PATCH' and not c[1].endswith('/statuses')]
+    assert len(single_patches) == 3
+
+    slave_api.calls.clear()
+    service._sync_pipeline_stages(slave_api, master_pipeline(3), 77, {'stages': {}})
+    assert all(not c[1].endswith('/statuses') for c in slave_api.calls)
+
+
+if __name__ == "__main__":
+    test_missing_stages_are_created_in_one_request_and_mapped_by_name()
+    test_unsupported_bulk_patch_is_remembered()
+    print("Testes passaram!")
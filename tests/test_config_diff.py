@@ -0,0 +1,161 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import copy
+
+from src.services.config_diff import diff_master_configs
+from src.services.kommo_api import KommoAPIService, KommoSyncService
+
+ENTITY_TYPES = ['leads', 'contacts', 'companies']
+
+
+def master_config():
+    return {
+        'pipelines': [
+            {'id': 1, 'name': 'Vendas', 'sort': 1, 'stages': [
+                {'id': 11, 'name': 'Contato', 'sort': 10, 'color': '#fffeb2', 'type': 0},
+                {'id': 12, 'name': 'Proposta', 'sort': 20, 'color': '#fffd7f', 'type': 0}
+            ]},
+            {'id': 2, 'name': 'Pós-venda', 'sort': 2, 'stages': [
+                {'id': 21, 'name': 'Onboarding', 'sort': 10, 'color': '#fffeb2', 'type': 0}
+            ]}
+        ],
+        'custom_field_groups': {'leads': [{'id': 'g1', 'name': 'Dados', 'sort': 0}], 'contacts': [], 'companies': []},
+        'custom_fields': {
+            'leads': [
+                {'id': 100, 'name': 'Origem', 'type': 'text', 'group_id': None, 'required_statuses': []},
+                {'id': 101, 'name': 'Valor', 'type': 'numeric', 'group_id': None,
+                 'required_statuses': [{'pipeline_id': 1, 'status_id': 12}]},
+                {'id': 102, 'name': 'Canal', 'type': 'text', 'group_id': 'g1', 'required_statuses': []}
+            ],
+            'contacts': [], 'companies': []
+        },
+        'task_types': {'task_types': [{'id': 1, 'name': 'Ligar'}]},
+        'roles': [{'id': 5, 'name': 'Vendedor', 'rights': {}}]
+    }
+
+
+def test_identical_configs_produce_empty_diff():
+    diff = diff_master_configs(master_config(), master_config(), ENTITY_TYPES)
+    assert diff.is_empty()
+
+
+def test_stage_change_marks_pipeline_and_dependent_fields():
+    current = master_config()
+    current['pipelines'][0]['stages'][1]['name'] = 'Proposta enviada'
+    current['custom_field_groups']['leads'][0]['sort'] = 5
+
+    diff = diff_master_configs(master_config(), current, ENTITY_TYPES)
+
+    assert diff.pipelines.changed_ids == {1}
+    assert diff.changed_stage_ids == {12}
+    # 101 exige o estágio alterado, 102 pertence ao grupo alterado, 100 não muda
+    assert diff.custom_fields['leads'].changed_ids == {101, 102}
+    assert not diff.custom_fields['contacts']
+    assert not diff.task_types_changed
+    assert diff.roles.changed_ids == {5}
+
+
+def test_removed_entities_are_reported_by_name():
+    current = master_config()
+    del current['pipelines'][1]
+    current['custom_fields']['leads'] = current['custom_fields']['leads'][:2]
+
+    diff = diff_master_configs(master_config(), current, ENTITY_TYPES)
+
+    assert diff.pipelines.removed_names == {'Pós-venda'}
+    assert diff.pipelines.changed_ids == set()
+    assert diff.changed_stage_ids == {21}
+    assert diff.custom_fields['leads'].removed_names == {'Canal'}
+
+
+class CountingSlaveAPI(KommoAPIService):
+    """Conta escrava simulada que só registra as requisições feitas"""
+
+    def __init__(self):
+        super().__init__('incremental', 'token')
+        self.requests = []
+
+    def _send_request(self, method, endpoint, data=None, params=None):
+        self.requests.append((method, endpoint))
+        return {'_embedded': {}}
+
+    def _send_ajax_request(self, method, endpoint, data=None, form_data=None):
+        self.requests.append((method, endpoint))
+        return {}
+
+
+class NoDatabaseSyncService(KommoSyncService):
+    def _load_mappings_from_database(self, sync_group_id, slave_account_id):
+        return {'pipelines': {1: 501, 2: 502}, 'stages': {11: 611, 12: 612, 21: 621}, 'custom_field_groups': {}, 'roles': {}}
+
+    def _save_mappings_to_database(self, mappings, sync_group_id, slave_account_id):
+        pass
+
+
+def test_unchanged_master_makes_no_slave_calls():
+    slave_api = CountingSlaveAPI()
+    service = NoDatabaseSyncService(KommoAPIService('master', 'token'))
+
+    results = service.sync_all_to_slave(slave_api, master_config(), None, 1, 2, previous_config=master_config())
+
+    assert slave_api.requests == []
+    assert results['summary']['total_errors'] == 0
+    assert results['summary']['incremental']['pipelines'] == {'changed': 0, 'removed': []}
+
+
+def test_changed_field_only_touches_custom_fields():
+    current = master_config()
+    current['custom_fields']['leads'][0]['name'] = 'Origem do lead'
+    slave_api = CountingSlaveAPI()
+    service = NoDatabaseSyncService(KommoAPIService('master', 'token'))
+
+    service.sync_all_to_slave(slave_api, current, None, 1, 2, previous_config=copy.deepcopy(master_config()))
+
+    endpoints = {endpoint for _, endpoint in slave_api.requests}
+    assert not any('pipelines' in endpoint for endpoint in endpoints)
+    assert not any('tasks/types' in endpoint for endpoint in endpoints)
+    assert '/leads/custom_fields' in endpoints
+    assert '/contacts/custom_fields' not in endpoints
+
+
+class GroupedSlaveAPI(CountingSlaveAPI):
+    """Escrava que já tem o grupo 'Dados' e guarda os campos criados"""
+
+    def __init__(self):
+        super().__init__()
+        self.created_fields = []
+
+    def get_custom_field_groups(self, entity_type):
+        return [{'id': 900, 'name': 'Dados', 'sort': 0}] if entity_type == 'leads' else []
+
+    def create_custom_fields(self, entity_type, fields_data):
+        self.created_fields.extend(fields_data)
+        return [{'id': 700 + i, **field_data} for i, field_data in enumerate(fields_data)]
+
+
+def test_new_field_in_unchanged_group_keeps_its_group():
+    current = master_config()
+    current['custom_fields']['leads'].append(
+        {'id': 103, 'name': 'Segmento', 'type': 'text', 'group_id': 'g1', 'required_statuses': []}
+    )
+    slave_api = GroupedSlaveAPI()
+    service = NoDatabaseSyncService(KommoAPIService('master', 'token'))
+
+    service.sync_all_to_slave(slave_api, current, None, 1, 2, previous_config=master_config())
+
+    assert [field['name'] for field in slave_api.created_fields] == ['Segmento']
+    assert slave_api.created_fields[0]['group_id'] == 900
+    # O grupo inalterado não é recriado nem atualizado
+    assert not any(method != 'GET' and 'groups' in endpoint for method, endpoint in slave_api.requests)
+
+
+if __name__ == "__main__":
+    test_identical_configs_produce_empty_diff()
+    test_stage_change_marks_pipeline_and_dependent_fields()
+    test_removed_entities_are_reported_by_name()
+    test_unchanged_master_makes_no_slave_calls()
+    test_changed_field_only_touches_custom_fields()
+    test_new_field_in_unchanged_group_keeps_its_group()
+    print("Testes passaram!")
@@ -0,0 +1,119 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.database import db
+from src.models.kommo_account import KommoAccount, MasterConfigSnapshot
+from src.services.config_snapshots import MasterConfigSnapshotStore
+from src.services.kommo_api import KommoAPIService, KommoSyncService
+
+
+class FakeMasterAPI(KommoAPIService):
+    """Conta mestre simulada que conta as requisições por endpoint"""
+
+    def __init__(self):
+        super().__init__('snapshots', 'token')
+        self.cache.ttl = 0
+        self.requests = []
+        self.pipeline_name = 'Vendas'
+
+    def _send_request(self, method, endpoint, data=None, params=None):
+        self.requests.append(endpoint)
+        if endpoint == '/leads/pipelines':
+            return {'_embedded': {'pipelines': [{'id': 1, 'name': self.pipeline_name, 'sort': 1,
+                                                 '_embedded': {'statuses': []}}]}}
+        if endpoint.endswith('/statuses'):
+            return {'_embedded': {'statuses': [{'id': 101, 'name': 'Contato', 'sort': 10, 'type': 0}]}}
+        if endpoint == '/leads/custom_fields':
+            return {'_embedded': {'custom_fields': [{'id': 5, 'name': 'Origem', 'type': 'text'}]}}
+        return {'_embedded': {}}
+
+    def _send_ajax_request(self, method, endpoint, data=None, form_data=None):
+        return {}
+
+
+def add_master_account(app):
+    with app.app_context():
+        db.session.add(KommoAccount(subdomain='snapshots', access_token='x', refresh_token='token',
+                                    token_expires_at=datetime.utcnow(), is_master=True))
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def app(app):
+    return add_master_account(app)
+
+
+def age_snapshots(seconds):
+    for snapshot in MasterConfigSnapshot.query.all():
+        snapshot.created_at = snapshot.created_at - timedelta(seconds=seconds)
+    db.session.commit()
+
+
+def test_snapshot_reuse_and_probe_refresh(app):
+    with app.app_context():
+        store = MasterConfigSnapshotStore(max_age=300, probe_max_age=3600)
+        api = FakeMasterAPI()
+        service = KommoSyncService(api)
+
+        config, info = store.get_or_extract(service, 1)
+        assert info['source'] == 'extracted'
+        assert config['custom_fields']['leads'][0]['name'] == 'Origem'
+
+        # Snapshot recente: nenhuma requisição
+        api.requests.clear()
+        cached_config, info = store.get_or_extract(service, 1)
+        assert api.requests == []
+        assert info['source'] == 'snapshot'
+        assert cached_config == config
+
+        # Snapshot velho, pipelines iguais: só a sonda é feita para a seção de pipelines
+        age_snapshots(600)
+        api.requests.clear()
+        _, info = store.get_or_extract(service, 1)
+        assert info['source'] == 'partial'
+        assert info['reused_sections'] == ['pipelines']
+        assert api.requests.count('/leads/pipelines') == 1
+        assert not any(r.endswith('/statuses') for r in api.requests)
+        # Configuração idêntica: o snapshot existente é renovado em vez de duplicado
+        assert MasterConfigSnapshot.query.count() == 1
+
+        # Pipeline renomeado: a sonda muda e a extração é completa
+        age_snapshots(600)
+        api.pipeline_name = 'Vendas 2'
+        config, info = store.get_or_extract(service, 1)
+        assert info['source'] == 'extracted'
+        assert config['pipelines'][0]['name'] == 'Vendas 2'
+        assert MasterConfigSnapshot.query.count() == 2
+        old, new = MasterConfigSnapshot.query.order_by(MasterConfigSnapshot.id).all()
+        assert store.changed_sections(old, new) == ['pipelines']
+
+
+def test_snapshot_is_reused_only_when_max_age_is_given(app):
+    with app.app_context():
+        store = MasterConfigSnapshotStore()
+        api = FakeMasterAPI()
+        service = KommoSyncService(api)
+        store.get_or_extract(service, 1)
+
+        # Sem max_age a configuração da master é sempre lida de novo
+        config, info = store.get_or_extract(service, 1)
+        assert info['source'] != 'snapshot'
+        assert store.get_fresh(1) is None
+
+        api.requests.clear()
+        config, info = store.get_or_extract(service, 1, max_age=300)
+        assert info['source'] == 'snapshot' and api.requests == []
+
+
+if __name__ == "__main__":
+    from conftest import create_test_app
+
+    test_snapshot_reuse_and_probe_refresh(add_master_account(create_test_app()))
+    test_snapshot_is_reused_only_when_max_age_is_given(add_master_account(create_test_app()))
+    print("Testes passaram!")
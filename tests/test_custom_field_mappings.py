@@ -0,0 +1,91 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.database import db
+from src.models.kommo_account import CustomFieldMapping
+from src.services.kommo_api import KommoAPIService, KommoSyncService
+
+
+class FakeSlaveAPI(KommoAPIService):
+    """Conta escrava simulada com campos de leads em memória"""
+
+    def __init__(self, fields):
+        super().__init__('fieldmappings', 'token')
+        self.fields = {field['id']: dict(field) for field in fields}
+        self.created, self.updated, self.deleted = [], [], []
+        self.next_id = 900
+
+    def get_custom_fields(self, entity_type):
+        return [dict(field) for field in self.fields.values()] if entity_type == 'leads' else []
+
+    def create_custom_fields(self, entity_type, fields_data):
+        created = []
+        for field_data in fields_data:
+            self.next_id += 1
+            self.fields[self.next_id] = {'id': self.next_id, **field_data}
+            self.created.append(field_data['name'])
+            created.append(self.fields[self.next_id])
+        return created
+
+    def update_custom_fields(self, entity_type, fields_data):
+        for field_data in fields_data:
+            self.fields[field_data['id']].update(field_data)
+            self.updated.append(field_data['id'])
+        return fields_data
+
+    def delete_custom_field(self, entity_type, field_id):
+        self.deleted.append(field_id)
+        del self.fields[field_id]
+        return {'success': True}
+
+
+def master_config(leads_fields):
+    return {'custom_fields': {'leads': leads_fields, 'contacts': [], 'companies': []}, 'custom_field_groups': {}}
+
+
+def sync(slave_api, config):
+    service = KommoSyncService(None)
+    results = service.sync_custom_fields_to_slave(slave_api, config, {}, sync_group_id=3, slave_account_id=8,
+                                                  sync_groups=False)
+    assert results['errors'] == [], results['errors']
+    return results
+
+
+def test_renamed_master_field_updates_the_mapped_slave_field(app):
+    with app.app_context():
+        slave_api = FakeSlaveAPI([{'id': 501, 'name': 'Origem', 'type': 'text', 'sort': 1}])
+        sync(slave_api, master_config([{'id': 11, 'name': 'Origem', 'type': 'text', 'sort': 1}]))
+        assert CustomFieldMapping.query.filter_by(master_field_id=11).one().slave_field_id == 501
+
+        # Renomeado na master para um nome que as heurísticas não reconhecem: sem o mapeamento
+        # o campo antigo seria deletado e um novo criado (perdendo os valores na escrava)
+        results = sync(slave_api, master_config([{'id': 11, 'name': 'Canal de aquisição', 'type': 'text', 'sort': 1}]))
+
+        assert slave_api.created == [] and slave_api.deleted == []
+        assert slave_api.updated == [501] and slave_api.fields[501]['name'] == 'Canal de aquisição'
+        assert results['updated'] == 1
+
+
+def test_unmapped_and_stale_fields_fall_back_to_matching(app):
+    with app.app_context():
+        # Mapeamento apontando para um campo que não existe mais na escrava
+        db.session.add(CustomFieldMapping(sync_group_id=3, master_field_id=11, slave_account_id=8, slave_field_id=777))
+        db.session.commit()
+        slave_api = FakeSlaveAPI([{'id': 501, 'name': 'Origem', 'type': 'text', 'sort': 1},
+                                  {'id': 502, 'name': 'Sobra', 'type': 'text', 'sort': 2}])
+
+        sync(slave_api, master_config([{'id': 11, 'name': 'Origem', 'type': 'text', 'sort': 1},
+                                       {'id': 12, 'name': 'CPF', 'type': 'text', 'sort': 2}]))
+
+        assert slave_api.created == ['CPF'] and slave_api.deleted == [502]
+        saved = {m.master_field_id: m.slave_field_id for m in CustomFieldMapping.query.all()}
+        assert saved == {11: 501, 12: 901}
+
+
+if __name__ == "__main__":
+    from conftest import create_test_app
+
+    test_renamed_master_field_updates_the_mapped_slave_field(create_test_app())
+    test_unmapped_and_stale_fields_fall_back_to_matching(create_test_app())
+    print("Testes passaram!")
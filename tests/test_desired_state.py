@@ -0,0 +1,71 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.desired_state import (compile_field_template, compile_stage_payloads, get_desired_state,
+                                        get_valid_kommo_color)
+from src.services.sync_run import freeze_config
+
+ENTITY_TYPES = ['leads', 'contacts', 'companies']
+
+
+def test_color_mapping():
+    assert get_valid_kommo_color('#FFFEB2', 0) == '#FFFEB2'
+    assert get_valid_kommo_color('#ff0000', 0) == '#ff8f92'
+    assert get_valid_kommo_color('azul', 0) == '#98cbff'
+    # Sem cor na master: fallback pelo índice
+    assert get_valid_kommo_color(None, 1) == '#fffd7f'
+
+
+def test_stage_payloads_skip_special_stages():
+    pipeline = {'id': 1, 'name': 'Vendas', 'stages': [
+        {'id': 10, 'name': 'Incoming leads', 'type': 1, 'sort': 10},
+        {'id': 11, 'name': 'Contato', 'type': 0, 'sort': 20000, 'color': '#123456'},
+        {'id': 12, 'name': 'Proposta', 'type': 0, 'sort': 30, 'color': '#fffeb2',
+         'descriptions': [{'level': 'default', 'description': 'Enviar proposta'}]},
+        {'id': 142, 'name': 'Venda ganha', 'type': 0, 'sort': 10000}
+    ]}
+
+    payloads = compile_stage_payloads(pipeline)
+
+    assert [stage['id'] for stage, _ in payloads] == [11, 12]
+    contato, proposta = payloads[0][1], payloads[1][1]
+    assert contato == {'name': 'Contato', 'sort': 10000, 'type': 0, 'color': '#fffeb2'}
+    assert proposta['descriptions'] == [{'level': 'default', 'description': 'Enviar proposta'}]
+
+
+def test_field_templates():
+    assert compile_field_template({'id': 1, 'name': 'Telefone', 'type': 'multitext', 'code': 'PHONE'}) is None
+    template = compile_field_template({
+        'id': 2, 'name': 'Origem', 'type': 'select', 'code': None, 'sort': 3,
+        'enums': [{'id': 99, 'value': 'Site', 'sort': 1}, 'Indicação'],
+        'group_id': 'g1', 'required_statuses': [{'pipeline_id': 1, 'status_id': 11}]
+    })
+    assert template == {'name': 'Origem', 'type': 'select', 'sort': 3, 'is_required': False,
+                        'enums': [{'value': 'Site', 'sort': 1}, {'value': 'Indicação', 'sort': 0}]}
+    assert compile_field_template({'id': 3, 'name': 'Aniversário', 'type': 'birthday'})['type'] == 'date'
+    assert compile_field_template({'id': 4, 'name': 'Estranho', 'type': 'hologram'})['type'] == 'text'
+
+
+def test_frozen_config_is_compiled_once():
+    config = freeze_config({
+        'pipelines': [{'id': 1, 'name': 'Vendas', 'stages': [{'id': 11, 'name': 'Contato', 'type': 0, 'sort': 10}]}],
+        'custom_fields': {'leads': [{'id': 2, 'name': 'Origem', 'type': 'text'}]}
+    })
+
+    state = get_desired_state(config, ENTITY_TYPES)
+    assert get_desired_state(config, ENTITY_TYPES) is state
+    assert state.pipeline_payloads[1]['_embedded']['statuses'][0]['name'] == 'Contato'
+    assert dict(state.field_templates['leads'][2]) == {'name': 'Origem', 'type': 'text', 'sort': 0, 'is_required': False}
+
+    # Configurações mutáveis são compiladas a cada chamada
+    mutable = {'pipelines': [], 'custom_fields': {}}
+    assert get_desired_state(mutable, ENTITY_TYPES) is not get_desired_state(mutable, ENTITY_TYPES)
+
+
+if __name__ == "__main__":
+    test_color_mapping()
+    test_stage_payloads_skip_special_stages()
+    test_field_templates()
+    test_frozen_config_is_compiled_once()
+    print("Testes passaram!")
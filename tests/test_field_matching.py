@@ -0,0 +1,120 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import random
+import re
+import time
+
+from src.services.field_matching import CustomFieldMatchIndex, string_similarity, types_compatible
+
+
+def linear_match(slave_fields, field_name, field_code, field_type, master_type):
+    """As 5 varreduras lineares que o índice substitui (referência)"""
+    def compatible(slave_field):
+        return types_compatible(slave_field.get('type', ''), field_type, master_type)
+
+    if field_code:
+        for slave_field in slave_fields:
+            if slave_field.get('code') == field_code:
+                return slave_field
+    for slave_field in slave_fields:
+        if slave_field.get('name') == field_name:
+            return slave_field
+    master_name = field_name.lower().strip()
+    for slave_field in slave_fields:
+        slave_name = slave_field.get('name', '').lower().strip()
+        if slave_name == master_name or (len(slave_name) >= 3 and len(master_name) >= 3 and
+                                         (slave_name in master_name or master_name in slave_name) and
+                                         abs(len(slave_name) - len(master_name)) <= 3):
+            return slave_field
+    master_normalized = re.sub(r'[^a-zA-Z0-9]', '', field_name.lower())
+    for slave_field in slave_fields:
+        slave_normalized = re.sub(r'[^a-zA-Z0-9]', '', slave_field.get('name', '').lower())
+        if compatible(slave_field) and slave_normalized == master_normalized and len(master_normalized) > 2:
+            return slave_field
+    for slave_field in slave_fields:
+        slave_name = slave_field.get('name', '')
+        if compatible(slave_field) and string_similarity(slave_name, field_name) >= 0.7 and len(slave_name) >= 3:
+            return slave_field
+    return None
+
+
+def linear_has_counterpart(master_fields, slave_field_name, slave_field_code):
+    if slave_field_name in {f['name'] for f in master_fields}:
+        return True
+    if slave_field_code and slave_field_code in {f.get('code') for f in master_fields if f.get('code')}:
+        return True
+    slave_name = slave_field_name.lower().strip()
+    for master_field in master_fields:
+        master_name = master_field['name'].lower().strip()
+        if (slave_name == master_name or
+                (len(slave_name) >= 3 and len(master_name) >= 3 and
+                 (slave_name in master_name or master_name in slave_name) and
+                 abs(len(slave_name) - len(master_name)) <= 3)):
+            return True
+        if string_similarity(slave_name, master_name) >= 0.7 and len(slave_name) >= 3:
+            return True
+    return False
+
+
+def random_fields(rng, count):
+    words = ['Telefone', 'CPF', 'Origem', 'Data', 'Valor', 'Cidade', 'popo', 'E-mail', 'Nº', 'Obs']
+    types = ['text', 'numeric', 'date', 'date_time', 'select']
+    fields = []
+    for index in range(count):
+        name = ' '.join(rng.sample(words, rng.randint(1, 2)))
+        if rng.random() < 0.3:
+            name = name.upper() if rng.random() < 0.5 else f" {name}_{rng.randint(0, 9)} "
+        fields.append({'id': index, 'name': name, 'type': rng.choice(types),
+                       'code': rng.choice([None, None, 'PHONE', 'EMAIL'])})
+    return fields
+
+
+def test_index_returns_the_same_match_as_the_linear_scans():
+    rng = random.Random(7)
+    for _ in range(30):
+        slave_fields = random_fields(rng, 40)
+        master_fields = random_fields(rng, 40)
+        slave_index = CustomFieldMatchIndex(slave_fields)
+        master_index = CustomFieldMatchIndex(master_fields)
+
+        for master_field in master_fields:
+            field_type = 'date' if master_field['type'] == 'date_time' and rng.random() < 0.5 else master_field['type']
+            expected = linear_match(slave_fields, master_field['name'], master_field['code'], field_type, master_field['type'])
+            found, method = slave_index.match(
+                master_field['name'], master_field['code'],
+                lambda f: types_compatible(f.get('type', ''), field_type, master_field['type'])
+            )
+            assert found is expected, (master_field, expected, found, method)
+
+        for slave_field in slave_fields:
+            assert (master_index.has_counterpart(slave_field['name'], slave_field['code']) ==
+                    linear_has_counterpart(master_fields, slave_field['name'], slave_field['code']))
+
+
+def test_match_tiers_and_large_accounts():
+    index = CustomFieldMatchIndex([
+        {'id': 1, 'name': 'popopa', 'type': 'text'},
+        {'id': 2, 'name': 'Data Nascimento', 'type': 'date'},
+        {'id': 3, 'name': 'Telefone', 'type': 'text', 'code': 'PHONE'},
+    ])
+    compatible = lambda f: True
+    assert index.match('Qualquer', 'PHONE', compatible) == (index.fields[2], "código 'PHONE'")
+    assert index.match('popo', None, compatible)[1] == "nome parcialmente similar 'popopa'"
+    assert index.match('data-nascimento', None, lambda f: f['type'] == 'date')[1] == "tipo+nome normalizado 'Data Nascimento'"
+    assert index.match('Telefono', None, compatible)[1] == "alta similaridade (88%) 'Telefone'"
+    assert index.match('Sem correspondente', None, compatible) == (None, '')
+
+    slave_fields = [{'id': i, 'name': f'Campo personalizado {i}', 'type': 'text'} for i in range(600)]
+    started = time.perf_counter()
+    slave_index = CustomFieldMatchIndex(slave_fields)
+    for i in range(600):
+        assert slave_index.match(f'Campo personalizado {i}', None, compatible)[0]['id'] == i
+    assert time.perf_counter() - started < 2
+
+
+if __name__ == "__main__":
+    test_index_returns_the_same_match_as_the_linear_scans()
+    test_match_tiers_and_large_accounts()
+    print("Testes passaram!")
@@ -0,0 +1,126 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+import time
+
+import requests
+from requests.adapters import BaseAdapter
+
+from src.services import http_pool, kommo_api
+from src.services.http_pool import KommoSessionPool
+from src.services.kommo_api import KommoAPIService
+
+
+def test_subdomain_reuses_one_session():
+    pool = KommoSessionPool(pool_size=4)
+    session = pool.get_session('conta1')
+    assert pool.get_session('conta1') is session
+    assert pool.get_session('conta2') is not session
+    pool.close_all()
+
+
+def test_adapter_pool_size_is_configured():
+    pool = KommoSessionPool(pool_size=7)
+    adapter = pool.get_session('conta1').get_adapter('https://conta1.kommo.com')
+    assert adapter._pool_maxsize == 7
+    assert adapter.max_retries.total == 0
+
+    # Nova configuração: a sessão é recriada com o novo tamanho no próximo uso
+    pool.configure(pool_size=3)
+    adapter = pool.get_session('conta1').get_adapter('https://conta1.kommo.com')
+    assert adapter._pool_maxsize == 3
+    assert pool.timeout == (pool.connect_timeout, pool.read_timeout)
+    pool.close_all()
+
+
+def test_idle_sessions_are_evicted():
+    pool = KommoSessionPool(idle_timeout=0.05)
+    idle = pool.get_session('ociosa')
+    time.sleep(0.06)
+    active = pool.get_session('ativa')
+
+    assert pool.close_idle() == 1
+    assert pool.get_session('ativa') is active
+    assert pool.get_session('ociosa') is not idle
+
+    # Atalho do pool compartilhado
+    http_pool.get_session('compartilhada')
+    assert http_pool.close_idle_sessions(max_idle_seconds=0) >= 1
+    assert 'compartilhada' not in http_pool.session_pool._sessions
+
+
+class FakeAdapter(BaseAdapter):
+    """Responde 200 sem rede; pode segurar a resposta até o evento release"""
+
+    def __init__(self):
+        super().__init__()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def send(self, request, **kwargs):
+        self.started.set()
+        self.release.wait(5)
+        response = requests.Response()
+        response.status_code = 200
+        response._content = b'{}'
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class FakeAdapterPool(KommoSessionPool):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.adapter = FakeAdapter()
+        self.created = []
+
+    def _create_session(self):
+        session = super()._create_session()
+        session.mount('https://', self.adapter)
+        self.created.append(session)
+        return session
+
+
+def test_session_in_use_is_not_closed_and_requests_refresh_the_idle_clock():
+    pool = FakeAdapterPool(idle_timeout=0.05)
+    original_pool = kommo_api.session_pool
+    kommo_api.session_pool = pool
+    try:
+        api = KommoAPIService('ativa', 'token')
+        api._send_with_retry('GET', 'https://ativa.kommo.com/api/v4/account', '/account')
+        time.sleep(0.06)
+
+        # Requisição em andamento por mais que o limite de ociosidade: a sessão não é fechada
+        pool.adapter.release.clear()
+        worker = threading.Thread(target=api._send_with_retry,
+                                  args=('GET', 'https://ativa.kommo.com/api/v4/leads', '/leads'))
+        worker.start()
+        assert pool.adapter.started.wait(5)
+        time.sleep(0.06)
+        assert pool.close_idle() == 0
+        pool.configure(idle_timeout=0.05)
+        pool.adapter.release.set()
+        worker.join(5)
+        assert len(pool.created) == 1 and 'ativa' not in pool._sessions
+
+        # O mesmo serviço continua funcionando depois do close_idle/configure, com uma nova sessão
+        assert api._send_with_retry('GET', 'https://ativa.kommo.com/api/v4/account', '/account').status_code == 200
+        assert len(pool.created) == 2 and pool._sessions['ativa'] is pool.created[1]
+        # Cada requisição atualiza o relógio de ociosidade da sessão
+        assert pool.close_idle() == 0
+    finally:
+        kommo_api.session_pool = original_pool
+        pool.close_all()
+
+
+if __name__ == "__main__":
+    test_subdomain_reuses_one_session()
+    test_adapter_pool_size_is_configured()
+    test_idle_sessions_are_evicted()
+    test_session_in_use_is_not_closed_and_requests_refresh_the_idle_clock()
+    print("Testes passaram!")
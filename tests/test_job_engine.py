@@ -0,0 +1,92 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+import time
+
+import pytest
+from flask import has_request_context, jsonify
+
+from src.database import db
+from src.models.kommo_account import SyncJob
+from src.services.job_engine import SyncJobEngine, current_cancel_event, current_job
+
+
+@pytest.fixture
+def app(file_db_app):
+    # Banco em arquivo: os jobs rodam em outras threads, cada uma com a sua conexão
+    return file_db_app
+
+
+def test_job_runs_in_background_and_persists_result(app):
+    engine = SyncJobEngine(max_workers=1)
+
+    def target(group_id, sync_type):
+        current_job().report_progress(50, 'Processando', force=True)
+        # O worker roda só com app context: os parâmetros chegam como argumentos
+        return jsonify({'success': True, 'group_id': group_id, 'body': {'sync_type': sync_type},
+                        'request_context': has_request_context()})
+
+    with app.app_context():
+        job = engine.submit(app, 'group_sync', target, (7, 'full'))
+        assert job['status'] == 'queued'
+        assert engine.wait(job['id'], timeout=5)
+
+        finished = engine.get(job['id'])
+        assert finished['status'] == 'completed'
+        assert finished['progress'] == 100
+        assert finished['result'] == {'success': True, 'group_id': 7, 'body': {'sync_type': 'full'},
+                                      'request_context': False}
+
+    # Rotas que respondem (json, status) de erro viram jobs falhos
+    with app.app_context():
+        job = engine.submit(app, 'sync', lambda: (jsonify({'success': False, 'error': 'Sem conta mestre'}), 400))
+        engine.wait(job['id'], timeout=5)
+        assert engine.get(job['id'])['status'] == 'failed'
+        assert engine.get(job['id'])['error'] == 'Sem conta mestre'
+
+
+def test_jobs_are_cancellable(app):
+    engine = SyncJobEngine(max_workers=1)
+    started = threading.Event()
+
+    def long_sync():
+        started.set()
+        cancel_event = current_cancel_event()
+        while not cancel_event.is_set():
+            time.sleep(0.01)
+        return jsonify({'success': True})
+
+    with app.app_context():
+        running = engine.submit(app, 'sync', long_sync)
+        queued = engine.submit(app, 'sync', lambda: jsonify({'success': True}))
+        assert started.wait(timeout=5)
+
+        # Na fila: cancelado sem chegar a rodar
+        assert engine.cancel(queued['id'])['status'] == 'cancelled'
+        # Em execução: a sincronização recebe o sinal e o job termina como cancelado
+        engine.cancel(running['id'])
+        engine.wait(running['id'], timeout=5)
+        engine.wait(queued['id'], timeout=5)
+
+        assert engine.get(running['id'])['status'] == 'cancelled'
+        assert engine.get(queued['id'])['status'] == 'cancelled'
+        assert engine.get(queued['id'])['started_at'] is None
+
+
+def test_interrupted_jobs_are_marked_failed(app):
+    with app.app_context():
+        db.session.add(SyncJob(id='abc', job_type='sync', status='running'))
+        db.session.commit()
+        assert SyncJobEngine().recover_interrupted() == ['abc']
+        assert db.session.get(SyncJob, 'abc').status == 'failed'
+
+
+if __name__ == "__main__":
+    from conftest import create_test_app
+
+    test_job_runs_in_background_and_persists_result(create_test_app(file_db=True))
+    test_jobs_are_cancellable(create_test_app(file_db=True))
+    test_interrupted_jobs_are_marked_failed(create_test_app(file_db=True))
+    print("Testes passaram!")
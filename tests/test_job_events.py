@@ -0,0 +1,76 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import threading
+
+from flask import jsonify
+
+from src.services.job_events import JobEventBus, format_sse, status_delta
+
+
+def test_bus_delivers_only_new_events():
+    bus = JobEventBus()
+    bus.publish('job1', 'status', {'progress': 10})
+    bus.publish('job1', 'status', {'progress': 20})
+    assert [data for _, _, data in bus.wait('job1', after_id=1, timeout=0)] == [{'progress': 20}]
+    assert bus.last_id('job1') == 2 and bus.is_local('job1') and not bus.is_local('job2')
+
+    # Quem espera é acordado pelo próximo evento
+    received = []
+    waiter = threading.Thread(target=lambda: received.extend(bus.wait('job1', after_id=2, timeout=5)))
+    waiter.start()
+    bus.publish('job1', 'done', {'status': 'completed'})
+    waiter.join()
+    assert received == [(3, 'done', {'status': 'completed'})]
+
+    assert format_sse({'a': 1}, event='status', event_id=3) == 'id: 3\nevent: status\ndata: {"a": 1}\n\n'
+    assert status_delta({'progress': 10, 'current_status': 'processing'},
+                        {'progress': 30, 'current_status': 'processing'}) == {'progress': 30}
+
+
+def test_job_events_endpoint_streams_until_done(file_db_app):
+    from src.routes.sync import publish_job_progress, sync_bp, sync_jobs, update_global_status
+
+    # Banco em arquivo: os jobs rodam em outras threads, cada uma com a sua conexão
+    app = file_db_app
+    app.register_blueprint(sync_bp, url_prefix='/api/sync')
+
+    release = threading.Event()
+
+    def target():
+        release.wait(5)
+        update_global_status(status='processing', progress=50, operation='Processando conta teste', is_running=True)
+        publish_job_progress({'operation': 'Lote de campos', 'percentage': 40, 'subdomain': 'teste'})
+        update_global_status(status='completed', progress=100, is_running=False)
+        return jsonify({'success': True, 'results': {'accounts_processed': 1}})
+
+    with app.app_context():
+        job = sync_jobs.submit(app, 'sync', target)
+
+    client = app.test_client()
+    response = client.get(f"/api/sync/jobs/{job['id']}/events", buffered=False)
+    assert response.mimetype == 'text/event-stream'
+    release.set()
+    body = b''.join(response.response).decode()
+
+    events = [block for block in body.split('\n\n') if block.startswith('id:') or block.startswith('event:')]
+    names = [line.split(': ', 1)[1] for block in events for line in block.split('\n') if line.startswith('event:')]
+    assert names[0] == 'snapshot' and names[-1] == 'done'
+    assert 'progress' in names and 'status' in names
+
+    done = json.loads(events[-1].split('data: ', 1)[1])
+    assert done['status'] == 'completed'
+    assert done['result']['results'] == {'accounts_processed': 1}
+
+    with app.app_context():
+        assert client.get('/api/sync/jobs/nao-existe/events').status_code == 404
+
+
+if __name__ == "__main__":
+    from conftest import create_test_app
+
+    test_bus_delivers_only_new_events()
+    test_job_events_endpoint_streams_until_done(create_test_app(file_db=True))
+    print("Testes passaram!")
@@ -0,0 +1,71 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import asyncio
+
+from aiohttp import web
+
+from src.services.retry_policy import RetryPolicy
+from src.services.kommo_api_async import AsyncKommoAPIService, gather_limited
+
+
+async def start_fake_kommo(handlers):
+    app = web.Application()
+    for method, path, handler in handlers:
+        app.router.add_route(method, path, handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def test_transient_status_is_retried_and_payload_parsed():
+    calls = {'count': 0}
+
+    async def pipelines(request):
+        calls['count'] += 1
+        if calls['count'] == 1:
+            return web.Response(status=502)
+        return web.json_response({'_embedded': {'pipelines': [{'id': 1, 'name': 'Vendas'}]}})
+
+    async def scenario():
+        runner, base_url = await start_fake_kommo([('GET', '/api/v4/leads/pipelines', pipelines)])
+        try:
+            async with AsyncKommoAPIService('asynctest', 'token',
+                                            retry_policy=RetryPolicy(base_delay=0, jitter=0)) as api:
+                api.base_url = f"{base_url}/api/v4"
+                pipelines_found = await api.get_pipelines()
+                return pipelines_found, api.retry_stats.as_dict()
+        finally:
+            await runner.cleanup()
+
+    pipelines_found, stats = asyncio.run(scenario())
+    assert pipelines_found == [{'id': 1, 'name': 'Vendas'}]
+    assert stats['retries'] == 1
+
+
+def test_gather_limited_bounds_concurrency():
+    state = {'running': 0, 'peak': 0}
+
+    async def job(value):
+        state['running'] += 1
+        state['peak'] = max(state['peak'], state['running'])
+        await asyncio.sleep(0.01)
+        state['running'] -= 1
+        if value == 3:
+            raise ValueError('falhou')
+        return value
+
+    results = asyncio.run(gather_limited([job(i) for i in range(10)], limit=3))
+    assert state['peak'] == 3
+    assert results[:3] == [0, 1, 2]
+    assert isinstance(results[3], ValueError)
+
+
+if __name__ == "__main__":
+    test_transient_status_is_retried_and_payload_parsed()
+    test_gather_limited_bounds_concurrency()
+    print("Testes passaram!")
@@ -0,0 +1,66 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+
+from src.services.kommo_api import KommoAPIService, KommoSyncService
+
+
+class FakeMasterAPI(KommoAPIService):
+    """Conta mestre simulada que conta as requisições GET por endpoint"""
+
+    def __init__(self, pipeline_count):
+        super().__init__('extracao', 'token')
+        self.pipeline_count = pipeline_count
+        self.requests = []
+        self._requests_lock = threading.Lock()
+
+    def _send_request(self, method, endpoint, data=None, params=None):
+        with self._requests_lock:
+            self.requests.append(endpoint)
+        if endpoint == '/leads/pipelines':
+            pipelines = [{'id': i, 'name': f'Funil {i}', 'sort': i + 1, '_embedded': {'statuses': []}}
+                         for i in range(1, self.pipeline_count + 1)]
+            return {'_embedded': {'pipelines': pipelines}}
+        if endpoint.endswith('/statuses'):
+            pipeline_id = int(endpoint.split('/')[3])
+            return {'_embedded': {'statuses': [
+                {'id': pipeline_id * 100 + 1, 'name': 'Contato', 'sort': 10, 'type': 0,
+                 'descriptions': [{'level': 'default', 'description': 'Primeiro contato'}]}
+            ]}}
+        return {'_embedded': {}}
+
+    def _send_ajax_request(self, method, endpoint, data=None, form_data=None):
+        return {}
+
+
+def test_stages_are_fetched_once_per_pipeline():
+    master_api = FakeMasterAPI(pipeline_count=6)
+    master_api.cache.ttl = 0  # sem cache: as buscas repetidas não podem ser escondidas por ele
+    config = KommoSyncService(master_api).extract_master_configuration()
+
+    stage_requests = [r for r in master_api.requests if r.endswith('/statuses')]
+    assert len(stage_requests) == 6
+    assert len(set(stage_requests)) == 6
+    assert [p['id'] for p in config['pipelines']] == [1, 2, 3, 4, 5, 6]
+    first_stage = config['pipelines'][0]['stages'][0]
+    assert first_stage['id'] == 101
+    assert first_stage['descriptions'] == [{'level': 'default', 'description': 'Primeiro contato'}]
+
+
+def test_parallel_extraction_matches_sequential_and_reports_timings():
+    parallel_service = KommoSyncService(FakeMasterAPI(pipeline_count=3))
+    parallel_config = parallel_service.extract_master_configuration(parallel=True)
+    sequential_config = KommoSyncService(FakeMasterAPI(pipeline_count=3)).extract_master_configuration(parallel=False)
+
+    assert parallel_config == sequential_config
+    assert set(parallel_service.last_extraction_timings) == {
+        'pipelines', 'leads', 'contacts', 'companies', 'roles', 'task_types', 'total'
+    }
+
+
+if __name__ == "__main__":
+    test_stages_are_fetched_once_per_pipeline()
+    test_parallel_extraction_matches_sequential_and_reports_timings()
+    print("Testes passaram!")
@@ -0,0 +1,72 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.kommo_api import KommoSyncService
+from src.services.pacing import AdaptivePacer, PacerRegistry
+
+
+def run_batch(pacer, status_codes, latency=0.1, items=5, failed=0, timeouts=0):
+    window = pacer.begin_batch()
+    for status_code in status_codes:
+        pacer.record_response(status_code, latency)
+    for _ in range(timeouts):
+        pacer.record_failure()
+    return pacer.end_batch(window, items, failed)
+
+
+def test_aimd_grows_additively_and_backs_off_multiplicatively():
+    pacer = AdaptivePacer('conta', batch_size=10, delay=1.0)
+
+    assert run_batch(pacer, [200] * 5) == 'increase'
+    assert (pacer.batch_size, pacer.delay) == (12, 0.75)
+
+    # 429: lote cai pela metade e o delay dobra
+    assert run_batch(pacer, [200, 429, 200]) == 'decrease'
+    assert (pacer.batch_size, pacer.delay) == (6, 1.5)
+
+    # Pico de latência (acima de 2x a referência) também conta como sobrecarga
+    assert run_batch(pacer, [200] * 5, latency=1.0) == 'decrease'
+    assert pacer.batch_size == 3
+
+    # Muitos itens com erro, mesmo sem erro HTTP
+    assert run_batch(pacer, [200], items=5, failed=3) == 'decrease'
+
+    assert run_batch(pacer, [], timeouts=1) == 'decrease'
+    assert pacer.batch_size == 1
+
+
+def test_batches_follow_pacer_and_state_persists_between_runs(app):
+
+    class FakeSlaveApi:
+        subdomain = 'escrava'
+
+        def __init__(self, pacer):
+            self.pacer = pacer
+
+    with app.app_context():
+        pacer = AdaptivePacer('escrava')
+        service = KommoSyncService(None, batch_size=2, adaptive_pacing=True)
+        progress = []
+
+        def process(item, results):
+            pacer.record_response(200, 0.05)
+
+        service._process_in_batches(list(range(20)), process, 'pipelines', {'errors': []},
+                                    progress_callback=progress.append, pacer=service._pacer_for(FakeSlaveApi(pacer)))
+
+        # Lotes de 2, 4, 6 e 8 itens: o tamanho cresce enquanto a conta responde bem
+        assert [p['processed'] for p in progress] == [2, 6, 12, 20]
+        assert pacer.batch_size == 10
+
+        # Outro processo (ou depois de reiniciar) continua do ritmo gravado
+        restored = PacerRegistry().restore(AdaptivePacer('escrava'), batch_size=2, delay=0.0)
+        assert restored.batch_size == 10 and restored.latency_baseline is not None
+
+
+if __name__ == "__main__":
+    from conftest import create_test_app
+
+    test_aimd_grows_additively_and_backs_off_multiplicatively()
+    test_batches_follow_pacer_and_state_persists_between_runs(create_test_app())
+    print("Testes passaram!")
@@ -0,0 +1,55 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.kommo_api import KommoAPIService
+
+
+class PagedAPI(KommoAPIService):
+    """KommoAPIService com _make_request simulando uma listagem paginada"""
+
+    def __init__(self, total_items, embedded_key='custom_fields'):
+        super().__init__('paginacao', 'token')
+        self.total_items = total_items
+        self.embedded_key = embedded_key
+        self.requests = []
+
+    def _make_request(self, method, endpoint, data=None, params=None):
+        self.requests.append(dict(params or {}))
+        page, limit = params['page'], params['limit']
+        start = (page - 1) * limit
+        items = [{'id': i, 'name': f'Campo {i}'} for i in range(start, min(start + limit, self.total_items))]
+        if not items:
+            return {'success': True, 'status_code': 204}
+        response = {'_embedded': {self.embedded_key: items}, '_links': {'self': {'href': 'x'}}}
+        if start + limit < self.total_items:
+            response['_links']['next'] = {'href': 'x'}
+        return response
+
+
+def test_all_pages_are_read():
+    api = PagedAPI(620)
+    fields = api.get_custom_fields('leads')
+    assert [f['id'] for f in fields] == list(range(620))
+    assert len(api.requests) == 3
+    assert all(r['limit'] == 250 for r in api.requests)
+    assert api.requests[0]['with'] == 'required_statuses,enums'
+
+
+def test_limit_is_capped_and_iterator_is_lazy():
+    api = PagedAPI(120, embedded_key='users')
+    iterator = api.iter_users(limit=1000)
+    assert api.requests == []
+    assert next(iterator)['id'] == 0
+    assert api.requests[0]['limit'] == 250
+
+    api = PagedAPI(120, embedded_key='roles')
+    roles = list(api.iter_roles(limit=50, prefetch=True))
+    assert len(roles) == 120
+    assert [r['page'] for r in api.requests] == [1, 2, 3]
+
+
+if __name__ == "__main__":
+    test_all_pages_are_read()
+    test_limit_is_capped_and_iterator_is_lazy()
+    print("Testes passaram!")
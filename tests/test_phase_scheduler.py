@@ -0,0 +1,125 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+
+from src.services.kommo_api import KommoAPIService, KommoSyncService
+from src.services.phase_scheduler import Phase, run_phases
+
+
+def test_phases_respect_dependencies_and_run_independent_branches_together():
+    calls = []
+    lock = threading.Lock()
+    # pipelines e grupos só terminam quando os dois estiverem rodando ao mesmo tempo
+    both_running = threading.Barrier(3, timeout=5)
+
+    def phase(name, wait=False):
+        def run():
+            if wait:
+                both_running.wait()
+            with lock:
+                calls.append(name)
+            return name.upper()
+        return run
+
+    report = run_phases([
+        Phase('pipelines', phase('pipelines', wait=True)),
+        Phase('custom_field_groups', phase('custom_field_groups', wait=True)),
+        Phase('custom_fields', phase('custom_fields'), depends_on=('pipelines', 'custom_field_groups')),
+        Phase('task_types', phase('task_types', wait=True))
+    ], max_workers=3)
+
+    assert sorted(calls) == ['custom_field_groups', 'custom_fields', 'pipelines', 'task_types']
+    assert calls.count('custom_fields') == 1 and calls[-1] == 'custom_fields'
+    assert report.results['custom_fields'] == 'CUSTOM_FIELDS'
+    assert set(report.timings) == {'pipelines', 'custom_field_groups', 'custom_fields', 'task_types'}
+
+
+def test_failed_phase_skips_only_its_dependents():
+    def fail():
+        raise Exception('Erro 500 na escrava')
+
+    report = run_phases([
+        Phase('pipelines', fail),
+        Phase('custom_field_groups', lambda: 'ok'),
+        Phase('custom_fields', lambda: 'ok', depends_on=('pipelines', 'custom_field_groups')),
+        Phase('roles', lambda: 'ok', depends_on=('custom_fields',)),
+        Phase('task_types', lambda: 'ok')
+    ])
+
+    assert set(report.results) == {'custom_field_groups', 'task_types'}
+    assert str(report.errors['pipelines']) == 'Erro 500 na escrava'
+    assert set(report.skipped) == {'custom_fields', 'roles'}
+
+    # Interrompida: nenhuma fase nova começa
+    stopped = run_phases([Phase('pipelines', lambda: 'ok')], should_stop=lambda: True)
+    assert stopped.skipped == {'pipelines': 'interrompida'} and not stopped.results
+
+    try:
+        run_phases([Phase('a', lambda: 1, depends_on=('b',)), Phase('b', lambda: 2, depends_on=('a',))])
+        assert False, 'ciclo não detectado'
+    except ValueError:
+        pass
+
+
+class RecordingSyncService(KommoSyncService):
+    """sync_all_to_slave com fases simuladas que registram o que receberam"""
+
+    def __init__(self, stop_in_pipelines=False):
+        super().__init__(None, phase_workers=1)
+        self.stop_in_pipelines = stop_in_pipelines
+        self.calls = []
+
+    def sync_pipelines_to_slave(self, slave_api, master_config, mappings, progress_callback=None, *args, **kwargs):
+        self.calls.append('pipelines')
+        mappings['pipelines'][1] = 501
+        mappings['stages'][11] = 611
+        if self.stop_in_pipelines:
+            self.stop_sync()
+        return {'created': 1, 'updated': 0, 'skipped': 0, 'deleted': 0, 'errors': []}
+
+    def sync_custom_fields_to_slave(self, *args, **kwargs):
+        self.calls.append('custom_fields')
+        return {'created': 0, 'updated': 0, 'skipped': 0, 'deleted': 0, 'errors': []}
+
+    def sync_task_types_to_slave(self, *args, **kwargs):
+        self.calls.append('task_types')
+        return {'created': 0, 'updated': 0, 'skipped': 0, 'deleted': 0, 'errors': []}
+
+    def sync_roles_to_slave(self, slave_api, master_config, mappings, progress_callback=None):
+        self.calls.append(('roles', dict(mappings['pipelines']), dict(mappings['stages'])))
+        return {'created': 1, 'updated': 0, 'skipped': 0, 'deleted': 0, 'errors': []}
+
+
+MASTER_CONFIG = {'pipelines': [], 'custom_field_groups': {'leads': [], 'contacts': [], 'companies': []},
+                 'custom_fields': {'leads': [], 'contacts': [], 'companies': []},
+                 'task_types': {}, 'roles': [{'id': 5, 'name': 'Vendedor', 'rights': {}}]}
+
+
+def test_roles_phase_runs_after_pipelines_with_this_runs_mappings():
+    service = RecordingSyncService()
+    results = service.sync_all_to_slave(KommoAPIService('fases', 'token'), MASTER_CONFIG)
+
+    assert ('roles', {1: 501}, {11: 611}) in service.calls
+    assert service.calls.index('pipelines') < [i for i, call in enumerate(service.calls) if call[0] == 'roles'][0]
+    assert results['roles']['created'] == 1
+    assert 'roles' in results['summary']['phases']['timings']
+
+
+def test_stop_requested_during_a_phase_is_not_cleared_by_the_next_phase():
+    service = RecordingSyncService(stop_in_pipelines=True)
+    results = service.sync_all_to_slave(KommoAPIService('fases', 'token'), MASTER_CONFIG)
+
+    # A fase de grupos (real) começa depois do stop_sync() e não pode zerar a flag
+    assert results['summary']['interrupted']
+    assert 'custom_fields' not in service.calls
+    assert results['summary']['phases']['skipped'].get('custom_fields') == 'interrompida'
+
+
+if __name__ == "__main__":
+    test_phases_respect_dependencies_and_run_independent_branches_together()
+    test_failed_phase_skips_only_its_dependents()
+    test_roles_phase_runs_after_pipelines_with_this_runs_mappings()
+    test_stop_requested_during_a_phase_is_not_cleared_by_the_next_phase()
+    print("Testes passaram!")
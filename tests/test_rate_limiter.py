@@ -0,0 +1,40 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.rate_limiter import TokenBucket, RateLimiterRegistry
+
+
+def test_burst_is_served_without_waiting():
+    bucket = TokenBucket(rate=5, capacity=5)
+    waits = [bucket.reserve() for _ in range(5)]
+    assert all(w == 0 for w in waits)
+
+
+def test_reservations_beyond_capacity_are_spaced_by_rate():
+    bucket = TokenBucket(rate=10, capacity=1)
+    assert bucket.reserve() == 0
+    assert abs(bucket.reserve() - 0.1) < 0.02
+    assert abs(bucket.reserve() - 0.2) < 0.02
+
+
+def test_pause_delays_next_reservation():
+    bucket = TokenBucket(rate=100, capacity=10)
+    bucket.pause(2)
+    assert bucket.reserve() >= 1.9
+
+
+def test_registry_shares_bucket_per_subdomain():
+    registry = RateLimiterRegistry(rate=3, capacity=3)
+    assert registry.get('conta1') is registry.get('conta1')
+    assert registry.get('conta1') is not registry.get('conta2')
+    registry.configure(rate=1)
+    assert registry.get('conta1').rate == 1
+
+
+if __name__ == "__main__":
+    test_burst_is_served_without_waiting()
+    test_reservations_beyond_capacity_are_spaced_by_rate()
+    test_pause_delays_next_reservation()
+    test_registry_shares_bucket_per_subdomain()
+    print("Testes passaram!")
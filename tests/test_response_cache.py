@@ -0,0 +1,63 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+
+from src.services.kommo_api import KommoAPIService
+from src.services.response_cache import ResponseCache, is_cache_miss
+
+
+class CountingAPI(KommoAPIService):
+    """KommoAPIService que conta as requisições enviadas"""
+
+    def __init__(self):
+        super().__init__('cachetest', 'token')
+        self.sent = []
+
+    def _send_request(self, method, endpoint, data=None, params=None):
+        self.sent.append((method, endpoint))
+        if method == 'GET' and endpoint.endswith('/statuses'):
+            return {'_embedded': {'statuses': [{'id': 1, 'name': 'Novo'}]}}
+        if method == 'GET':
+            return {'_embedded': {'pipelines': [{'id': 5, 'name': 'Vendas', '_embedded': {'statuses': []}}]}}
+        return {'_embedded': {'statuses': [{'id': 2}]}}
+
+
+def test_repeated_gets_hit_cache_and_return_copies():
+    api = CountingAPI()
+    first = api.get_pipelines()
+    first[0]['name'] = 'alterado'
+    second = api.get_pipelines()
+    assert second[0]['name'] == 'Vendas'
+    assert api.sent == [('GET', '/leads/pipelines')]
+    assert api.cache.stats()['hits'] == 1
+
+
+def test_stage_write_invalidates_pipeline_and_statuses():
+    api = CountingAPI()
+    api.get_pipelines()
+    api.get_pipeline_stages(5)
+    api.create_pipeline_stage(5, {'name': 'Novo'})
+    api.get_pipelines()
+    api.get_pipeline_stages(5)
+    assert [m for m, _ in api.sent].count('GET') == 4
+
+
+def test_ttl_and_lru_bound():
+    cache = ResponseCache(ttl=0.05, max_entries=2)
+    cache.set('/a', None, 1)
+    cache.set('/b', {'x': 1}, 2)
+    cache.get('/a')
+    cache.set('/c', None, 3)
+    assert is_cache_miss(cache.get('/b', {'x': 1}))
+    assert cache.get('/a') == 1
+    time.sleep(0.06)
+    assert is_cache_miss(cache.get('/a'))
+
+
+if __name__ == "__main__":
+    test_repeated_gets_hit_cache_and_return_copies()
+    test_stage_write_invalidates_pipeline_and_statuses()
+    test_ttl_and_lru_bound()
+    print("Testes passaram!")
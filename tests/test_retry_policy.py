@@ -0,0 +1,112 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import requests
+
+from src.services.retry_policy import RetryPolicy
+from src.services.kommo_api import KommoAPIService
+
+
+class FakeResponse:
+    def __init__(self, status_code, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload if payload is not None else {}
+        self.headers = headers or {}
+        self.text = 'x'
+        self.content = b'x'
+        self.ok = status_code < 400
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def make_api(outcomes, policy):
+    api = KommoAPIService('retrytest', 'token', retry_policy=policy)
+    api.session = FakeSession(outcomes)
+    return api
+
+
+def test_classification():
+    policy = RetryPolicy()
+    assert policy.classify('GET', status_code=429) == 'transient'
+    assert policy.classify('GET', status_code=503) == 'transient'
+    assert policy.classify('GET', status_code=400) == 'permanent'
+    assert policy.classify('PATCH', status_code=422) == 'permanent'
+    assert policy.classify('GET', exception=requests.exceptions.ReadTimeout()) == 'transient'
+    # POST com timeout de leitura pode ter sido processado: não repetir
+    assert policy.classify('POST', exception=requests.exceptions.ReadTimeout()) == 'permanent'
+    assert policy.classify('POST', exception=requests.exceptions.ConnectTimeout()) == 'transient'
+
+
+def test_backoff_is_exponential_and_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=5, jitter=0)
+    assert policy.backoff(1) == 1
+    assert policy.backoff(3) == 4
+    assert policy.backoff(10) == 5
+    assert policy.backoff(2, retry_after=7) == 7
+
+
+def test_transient_errors_are_retried_until_success():
+    policy = RetryPolicy(max_attempts=4, base_delay=0, jitter=0)
+    api = make_api([requests.exceptions.ConnectionError(), FakeResponse(502), FakeResponse(200, {'ok': 1})], policy)
+    assert api._make_request('GET', '/leads/pipelines') == {'ok': 1}
+    assert api.session.calls == 3
+    stats = api.retry_stats.as_dict()
+    assert stats['retries'] == 2
+    assert stats['by_reason'] == {'ConnectionError': 1, 'http_502': 1}
+
+
+def test_retries_are_bounded_and_permanent_errors_fail_fast():
+    policy = RetryPolicy(max_attempts=2, base_delay=0, jitter=0)
+    api = make_api([FakeResponse(503), FakeResponse(503)], policy)
+    try:
+        api._make_request('GET', '/leads/pipelines')
+        assert False, "deveria ter lançado exceção"
+    except requests.exceptions.HTTPError:
+        pass
+    assert api.session.calls == 2
+    assert api.retry_stats.as_dict()['gave_up'] == 1
+
+    api = make_api([FakeResponse(422)], policy)
+    try:
+        api._make_request('POST', '/leads/custom_fields', data=[{}])
+        assert False, "deveria ter lançado exceção"
+    except requests.exceptions.HTTPError:
+        pass
+    assert api.session.calls == 1
+
+
+def test_endpoint_override_is_used():
+    default = RetryPolicy(max_attempts=5)
+    strict = RetryPolicy(max_attempts=1)
+    api = KommoAPIService('retrytest', 'token', retry_policy=default,
+                          endpoint_retry_policies={'POST /leads/custom_fields': strict})
+    assert api._get_retry_policy('POST', '/leads/custom_fields/groups') is strict
+    assert api._get_retry_policy('GET', '/leads/custom_fields') is default
+
+
+if __name__ == "__main__":
+    test_classification()
+    test_backoff_is_exponential_and_capped()
+    test_transient_errors_are_retried_until_success()
+    test_retries_are_bounded_and_permanent_errors_fail_fast()
+    test_endpoint_override_is_used()
+    print("Testes passaram!")
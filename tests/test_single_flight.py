@@ -0,0 +1,73 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+import time
+
+from src.services.kommo_api import KommoAPIService
+from src.services.single_flight import SingleFlight
+
+
+class SlowAPI(KommoAPIService):
+    """KommoAPIService com requisições lentas, para simular chamadas simultâneas"""
+
+    def __init__(self):
+        super().__init__('singleflight', 'token')
+        self.sent = 0
+        self._sent_lock = threading.Lock()
+
+    def _send_request(self, method, endpoint, data=None, params=None):
+        with self._sent_lock:
+            self.sent += 1
+        time.sleep(0.1)
+        return {'_embedded': {'statuses': [{'id': 1, 'name': 'Novo'}]}}
+
+
+def run_in_threads(func, count):
+    results = [None] * count
+
+    def worker(index):
+        results[index] = func()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_gets_in_flight_share_one_request():
+    api = SlowAPI()
+    api.cache.ttl = 0  # sem cache: apenas o single-flight deve evitar as repetições
+    results = run_in_threads(lambda: api.get_pipeline_stages(7), 5)
+    assert api.sent == 1
+    assert all(r == [{'id': 1, 'name': 'Novo'}] for r in results)
+    # Cada chamador recebe sua própria cópia
+    assert len({id(r) for r in results}) == 5
+    assert api.single_flight.coalesced == 4
+
+
+def test_errors_are_propagated_to_waiters():
+    flights = SingleFlight()
+    errors = []
+
+    def failing():
+        time.sleep(0.05)
+        raise ValueError('falhou')
+
+    def call():
+        try:
+            flights.do('chave', failing)
+        except ValueError as e:
+            errors.append(e)
+
+    run_in_threads(call, 3)
+    assert len(errors) == 3
+
+
+if __name__ == "__main__":
+    test_identical_gets_in_flight_share_one_request()
+    test_errors_are_propagated_to_waiters()
+    print("Testes passaram!")
@@ -0,0 +1,68 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+import time
+
+from flask import current_app
+
+from src.services.slave_fanout import SlaveAccountRef, fan_out_slaves
+
+
+def make_slaves(count):
+    return [SlaveAccountRef(i, f'escrava{i}', 'token', 1) for i in range(count)]
+
+
+def test_fan_out_respects_max_concurrent(app):
+    lock = threading.Lock()
+    running = [0]
+    peak = [0]
+    progress = []
+
+    def worker(slave):
+        assert current_app.name == app.name  # app context próprio na thread
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.2 if slave.id == 0 else 0.05)
+        with lock:
+            running[0] -= 1
+        return {'subdomain': slave.subdomain}
+
+    started = time.monotonic()
+    outcomes = fan_out_slaves(app, make_slaves(6), worker, max_concurrent=3,
+                              on_complete=lambda done, total: progress.append((done, total)))
+    elapsed = time.monotonic() - started
+
+    assert peak[0] == 3
+    # Tempo acompanha a escrava mais lenta, não a soma (0.2 + 5 * 0.05 em série)
+    assert elapsed < 0.4
+    assert [result['subdomain'] for _, result, _ in outcomes] == [f'escrava{i}' for i in range(6)]
+    assert sorted(progress) == [(i, 6) for i in range(1, 7)]
+
+
+def test_fan_out_captures_errors(app):
+
+    def worker(slave):
+        if slave.id == 1:
+            raise Exception('Falha na conexão')
+        return {'subdomain': slave.subdomain}
+
+    outcomes = fan_out_slaves(app, make_slaves(3), worker, max_concurrent=2)
+    assert [error is None for _, _, error in outcomes] == [True, False, True]
+    assert str(outcomes[1][2]) == 'Falha na conexão'
+
+    # stop_on_error: depois da falha nenhuma escrava nova é iniciada
+    outcomes = fan_out_slaves(app, make_slaves(3), worker, max_concurrent=1, stop_on_error=True)
+    assert outcomes[0][1] == {'subdomain': 'escrava0'}
+    assert outcomes[1][2] is not None
+    assert outcomes[2][1:] == (None, None)
+
+
+if __name__ == "__main__":
+    from conftest import create_test_app
+
+    test_fan_out_respects_max_concurrent(create_test_app())
+    test_fan_out_captures_errors(create_test_app())
+    print("Testes passaram!")
@@ -0,0 +1,83 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.services.kommo_api import KommoAPIService, KommoSyncService
+from src.services.slave_topology import SlaveTopology
+
+
+class FakeSlaveAPI(KommoAPIService):
+    """Conta escrava simulada que conta as leituras de pipelines e estágios"""
+
+    def __init__(self):
+        super().__init__('topology', 'token')
+        self.pipeline_gets = 0
+        self.stage_gets = 0
+        self.created_fields = []
+
+    def get_pipelines(self, with_descriptions=False, max_workers=1, use_cache=True):
+        self.pipeline_gets += 1
+        return [
+            {'id': 10, '_embedded': {'statuses': [{'id': 1000 + i} for i in range(10)] + [{'id': 142}]}},
+            {'id': 20}  # listado sem os estágios embutidos
+        ]
+
+    def get_pipeline_stages(self, pipeline_id, with_descriptions=False):
+        self.stage_gets += 1
+        return [{'id': 2000}] if pipeline_id == 20 else []
+
+    def get_custom_fields(self, entity_type):
+        return []
+
+    def create_custom_fields(self, entity_type, fields_data):
+        self.created_fields.extend(fields_data)
+        return [{'id': 500 + i, **field_data} for i, field_data in enumerate(fields_data)]
+
+
+def test_required_statuses_are_validated_against_one_topology_load():
+    slave_api = FakeSlaveAPI()
+    mappings = {'pipelines': {1: 10, 2: 20}, 'stages': {100 + i: 1000 + i for i in range(10)}}
+    mappings['stages'][300] = 2000
+    required = [{'pipeline_id': 1, 'status_id': 100 + i} for i in range(10)]
+    master_fields = [
+        {'id': 1, 'name': 'CPF', 'type': 'text', 'sort': 1, 'required_statuses': required},
+        {'id': 2, 'name': 'RG', 'type': 'text', 'sort': 2,
+         'required_statuses': required + [{'pipeline_id': 2, 'status_id': 300}, {'pipeline_id': 1, 'status_id': 142}]},
+    ]
+    # Estágio mapeado que não existe mais na escrava
+    mappings['stages'][109] = 9999
+
+    service = KommoSyncService(None)
+    results = service.sync_custom_fields_to_slave(
+        slave_api, {'custom_fields': {'leads': master_fields, 'contacts': [], 'companies': []}},
+        mappings, sync_groups=False
+    )
+
+    assert results['errors'] == [] and results['created'] == 2
+    # Uma listagem de pipelines e só uma busca de estágios (o pipeline listado sem estágios)
+    assert slave_api.pipeline_gets == 1 and slave_api.stage_gets == 1
+    cpf, rg = slave_api.created_fields
+    assert len(cpf['required_statuses']) == 9
+    assert {'pipeline_id': 20, 'status_id': 2000} in rg['required_statuses']
+    assert {'pipeline_id': 10, 'status_id': 142} in rg['required_statuses']
+
+
+def test_topology_follows_pipeline_and_stage_writes():
+    slave_api = FakeSlaveAPI()
+    topology = SlaveTopology(slave_api, slave_api.get_pipelines())
+
+    topology.add_pipeline(30, [3000, 142])
+    topology.add_stage(30, 3001)
+    topology.remove_stage(10, 1000)
+    topology.remove_pipeline(20)
+
+    assert topology.has_stage(30, 3001) and topology.has_stage(30, 142)
+    assert not topology.has_stage(10, 1000) and topology.has_stage(10, 1001)
+    assert not topology.has_pipeline(20) and topology.stage_ids(20) == set()
+    assert slave_api.stage_gets == 0
+
+
+if __name__ == "__main__":
+    test_required_statuses_are_validated_against_one_topology_load()
+    test_topology_follows_pipeline_and_stage_writes()
+    print("Testes passaram!")
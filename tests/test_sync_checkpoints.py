@@ -0,0 +1,101 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import threading
+
+from src.models.kommo_account import SyncCheckpoint
+from src.services.kommo_api import KommoSyncService
+from src.services.sync_checkpoints import SyncCheckpointStore
+
+
+MASTER_CONFIG = {'pipelines': [{'id': 1, 'name': 'Vendas'}, {'id': 2, 'name': 'Suporte'}, {'id': 3, 'name': 'Pós-venda'}]}
+
+
+def run_pipelines(store, fail_on=()):
+    """Processa os pipelines em lotes de 1 com checkpoint; retorna os ids efetivamente processados"""
+    service = KommoSyncService(None, batch_size=1)
+    checkpoint = store.open(7, 42, MASTER_CONFIG)
+    mappings = checkpoint.attach({'pipelines': {}, 'stages': {}})
+    service._checkpoint = checkpoint
+    processed = []
+
+    def process_pipeline(pipeline, results):
+        if pipeline['id'] in fail_on:
+            raise Exception('Erro 500 na escrava')
+        processed.append(pipeline['id'])
+        mappings['pipelines'][pipeline['id']] = pipeline['id'] * 100
+
+    service._process_in_batches(MASTER_CONFIG['pipelines'], process_pipeline, 'pipelines', {'errors': []})
+    return checkpoint, mappings, processed
+
+
+def test_resumed_run_skips_completed_batches(app):
+    with app.app_context():
+        store = SyncCheckpointStore()
+
+        checkpoint, _, processed = run_pipelines(store, fail_on={3})
+        assert processed == [1, 2] and not checkpoint.resumed
+        checkpoint.complete_phase('custom_field_groups')
+
+        # Nova execução: retoma do primeiro item incompleto, com os mapeamentos restaurados (chaves int)
+        checkpoint, mappings, processed = run_pipelines(store)
+        assert checkpoint.resumed and processed == [3]
+        assert mappings['pipelines'] == {1: 100, 2: 200, 3: 300}
+        assert checkpoint.phase_done('custom_field_groups') and not checkpoint.phase_done('pipelines')
+        assert checkpoint.summary() == {'phases_skipped': ['custom_field_groups'], 'items_skipped': 2}
+
+        store.clear(7, 42)
+        assert SyncCheckpoint.query.count() == 0
+
+
+def test_checkpoint_is_discarded_when_master_config_changes(app):
+    with app.app_context():
+        store = SyncCheckpointStore()
+        run_pipelines(store, fail_on={2})
+
+        checkpoint = store.open(7, 42, {**MASTER_CONFIG, 'task_types': {'1': 'Ligar'}})
+        assert not checkpoint.resumed and checkpoint.completed_items('pipelines') == set()
+        assert SyncCheckpoint.query.count() == 1
+
+        # Checkpoints expirados também não são reaproveitados
+        store.open(7, 42, MASTER_CONFIG).complete_phase('pipelines')
+        assert not SyncCheckpointStore(max_age=-1).open(7, 42, MASTER_CONFIG).resumed
+
+
+def test_mappings_written_by_concurrent_phases_are_saved_consistently(app):
+    with app.app_context():
+        store = SyncCheckpointStore()
+        checkpoint = store.open(7, 42, MASTER_CONFIG)
+        mappings = checkpoint.attach({'pipelines': {}, 'stages': {}})
+
+        # Duas "fases" escrevem nos mapeamentos enquanto o checkpoint é gravado várias vezes
+        def stages_phase():
+            for stage_id in range(2000):
+                mappings['stages'][stage_id] = stage_id + 1
+
+        def fields_phase():
+            for field_id in range(2000):
+                mappings.setdefault('custom_fields', {}).setdefault('leads', {})[field_id] = field_id + 1
+
+        writers = [threading.Thread(target=stages_phase), threading.Thread(target=fields_phase)]
+        for writer in writers:
+            writer.start()
+        for batch in range(50):
+            checkpoint.complete_items('pipelines', [str(batch)])
+        for writer in writers:
+            writer.join()
+        checkpoint.complete_phase('custom_fields')
+
+        restored = store.open(7, 42, MASTER_CONFIG).attach({})
+        assert len(restored['stages']) == 2000 and restored['stages'][1999] == 2000
+        assert len(restored['custom_fields']['leads']) == 2000
+
+
+if __name__ == "__main__":
+    from conftest import create_test_app
+
+    test_resumed_run_skips_completed_batches(create_test_app())
+    test_checkpoint_is_discarded_when_master_config_changes(create_test_app())
+    test_mappings_written_by_concurrent_phases_are_saved_consistently(create_test_app())
+    print("Testes passaram!")
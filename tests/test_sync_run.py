@@ -0,0 +1,78 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import copy
+import json
+import threading
+import time
+
+from src.services.sync_run import SyncRunCoordinator, freeze_config
+
+
+class FakeSyncService:
+    """Serviço que só conta quantas extrações da master foram feitas"""
+
+    def __init__(self):
+        self.extractions = 0
+        self.last_extraction_timings = {}
+        self._lock = threading.Lock()
+
+    def extract_master_configuration(self):
+        with self._lock:
+            self.extractions += 1
+            self.last_extraction_timings = {'pipelines': 0.05, 'extraction': self.extractions}
+        time.sleep(0.05)
+        return {'pipelines': [{'id': 1, 'name': 'Vendas', 'stages': []}], 'roles': []}
+
+
+def test_master_is_extracted_once_per_run():
+    run = SyncRunCoordinator()
+    service = FakeSyncService()
+    results = []
+
+    def group_sync():
+        results.append(run.get_master_config(service, 7))
+
+    threads = [threading.Thread(target=group_sync) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert service.extractions == 1
+    assert len({id(config) for config, _ in results}) == 1
+    assert sorted(info['shared_in_run'] for _, info in results) == [False, True, True, True]
+    assert run.stats()['reuses'] == 3
+    # Todos os grupos recebem os tempos da extração que realmente aconteceu
+    assert all(info['extraction_timings'] == {'pipelines': 0.05, 'extraction': 1} for _, info in results)
+
+    # Outra master na mesma execução é extraída separadamente
+    run.get_master_config(service, 8)
+    assert service.extractions == 2
+
+
+def test_frozen_config_is_read_only_but_copyable():
+    config = freeze_config({'pipelines': [{'id': 1, 'name': 'Vendas', 'stages': []}]})
+
+    for mutate in (lambda: config.update({}), lambda: config['pipelines'].append({}),
+                   lambda: config['pipelines'][0].__setitem__('name', 'Outro')):
+        try:
+            mutate()
+        except TypeError:
+            pass
+        else:
+            raise AssertionError('configuração congelada foi alterada')
+
+    assert isinstance(config['pipelines'], list)
+    assert json.loads(json.dumps(config)) == {'pipelines': [{'id': 1, 'name': 'Vendas', 'stages': []}]}
+    mutable = copy.deepcopy(config)
+    mutable['pipelines'][0]['name'] = 'Outro'
+    assert config['pipelines'][0]['name'] == 'Vendas'
+    assert type(config['pipelines'][0].copy()) is dict
+
+
+if __name__ == "__main__":
+    test_master_is_extracted_once_per_run()
+    test_frozen_config_is_read_only_but_copyable()
+    print("Testes passaram!")
@@ -0,0 +1,82 @@
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import json
+import time
+
+from src.database import db
+from src.models.kommo_account import SyncStatusEntry
+from src.services.sync_status import SyncStatusRegistry
+
+
+def stored(key):
+    entry = db.session.get(SyncStatusEntry, key)
+    db.session.expire_all()
+    return json.loads(entry.data) if entry else None
+
+
+def test_progress_writes_are_throttled_and_shared_between_workers(app):
+    with app.app_context():
+        worker_a = SyncStatusRegistry(write_interval=60)
+        worker_b = SyncStatusRegistry(write_interval=60)
+
+        worker_a.update('job1', job_id='job1', current_status='starting', is_running=True, sync_type='full')
+        assert stored('job1')['current_status'] == 'starting'
+
+        # Progresso sem mudança de estado: agrupado em memória até o próximo intervalo
+        for progress in (10, 20, 30):
+            worker_a.update('job1', job_id='job1', progress=progress)
+        assert stored('job1')['progress'] == 0
+        assert worker_a.get('job1')['progress'] == 30
+
+        worker_a.flush()
+        assert worker_b.get('job1')['progress'] == 30
+
+        # Sincronizações simultâneas não sobrescrevem o status uma da outra
+        worker_b.update('job2', job_id='job2', current_status='processing', is_running=True)
+        assert {status['job_id'] for status in worker_b.running()} == {'job1', 'job2'}
+        assert worker_a.get('job1')['current_status'] == 'starting'
+
+        # Finalização é gravada na hora
+        worker_a.update('job1', job_id='job1', current_status='completed', progress=100, is_running=False)
+        assert worker_b.get('job1')['current_status'] == 'completed'
+        assert worker_b.current()['job_id'] == 'job2'
+
+
+def test_throttled_update_is_written_after_the_interval(file_db_app):
+    # Banco em arquivo: a gravação agendada roda em outra thread, com a sua conexão
+    with file_db_app.app_context():
+        registry = SyncStatusRegistry(write_interval=0.2)
+        registry.update('job1', job_id='job1', current_status='processing', is_running=True)
+        registry.update('job1', job_id='job1', accounts_processed=2, current_operation='2/3 contas processadas')
+        assert stored('job1')['accounts_processed'] == 0
+
+        # Nenhuma outra atualização chega (a terceira escrava demora): o status pendente é gravado mesmo assim
+        deadline = time.monotonic() + 3
+        while stored('job1')['accounts_processed'] != 2 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert stored('job1')['current_operation'] == '2/3 contas processadas'
+        assert SyncStatusRegistry().get('job1')['accounts_processed'] == 2
+
+
+def test_interrupted_status_is_recovered(app):
+    with app.app_context():
+        db.session.add(SyncStatusEntry(key='old', is_running=True, worker='host-que-parou',
+                                       data=json.dumps({'current_status': 'processing', 'is_running': True})))
+        db.session.commit()
+        registry = SyncStatusRegistry()
+        registry.update('live', current_status='processing', is_running=True)
+
+        assert registry.recover_interrupted() == 1
+        assert registry.get('old')['current_status'] == 'failed'
+        assert [status['current_status'] for status in registry.running()] == ['processing']
+
+
+if __name__ == "__main__":
+    from conftest import create_test_app
+
+    test_progress_writes_are_throttled_and_shared_between_workers(create_test_app())
+    test_throttled_update_is_written_after_the_interval(create_test_app(file_db=True))
+    test_interrupted_status_is_recovered(create_test_app())
+    print("Testes passaram!")